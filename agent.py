@@ -1,16 +1,21 @@
 import os
 import sys
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple, Union
 from dotenv import load_dotenv
 import docker
 from autogen import AssistantAgent, UserProxyAgent
-from autogen.coding import DockerCommandLineCodeExecutor
+from exec_cache import EXEC_CACHE, CachingCodeExecutor
+from sandbox import PooledDockerCodeExecutor, SandboxPool, build_sandbox_image
 
 # Constants
 DOCKER_IMAGE = "python:3.9-slim"
 DOCKER_TIMEOUT = 60
 MODEL_NAME = "llama3-70b-8192"
+# With agent_llm=local, any OpenAI-compatible server, e.g.
+# python -m llama_cpp.server --model models/llama-3.1-8b-instruct-q4_k_m.gguf --port 8080
+LOCAL_LLM_URL = "http://localhost:8080/v1"
+LOCAL_MODEL_NAME = "local"
 
 class AgentSetup:
     @staticmethod
@@ -26,50 +31,61 @@ class AgentSetup:
         return work_dir, output_dir
 
     @staticmethod
-    def setup_docker() -> bool:
-        """Initialize Docker environment"""
+    def setup_docker() -> Optional[str]:
+        """Initialize Docker environment and return the sandbox image"""
         try:
             client = docker.from_env()
             client.ping()
-            
-            try:
-                client.images.pull(DOCKER_IMAGE)
-            except docker.errors.ImageNotFound:
-                client.images.get(DOCKER_IMAGE)
-                print("Using existing local image")
-            
-            return True
+
+            # Pulls the base image only if it is missing, and builds the image
+            # with the common packages only once
+            return build_sandbox_image(client, DOCKER_IMAGE)
         except Exception as e:
             print(f"Docker setup failed: {str(e)}")
-            return False
+            return None
 
 class AgentFactory:
     @staticmethod
     def create_system_message() -> str:
-        return """You are a helpful AI assistant that executes code in a Docker container.
+        message = """You are a helpful AI assistant that executes code in a Docker container.
         Only ask for user input when:
         1. You need an API key or credentials
         2. You have completed a task and need new instructions
         3. You need crucial information that cannot be inferred
         Always explain what you're doing before asking for input.
         Save all outputs to the /workspace/output directory."""
+        if EXEC_CACHE:
+            message += """
+        Identical code on identical files may return the output of an earlier run.
+        Add a "# no-cache" comment to code that reads the network, the clock or random numbers."""
+        return message
 
     @staticmethod
-    def create_agents(work_dir: Path, output_dir: Path) -> Tuple[AssistantAgent, UserProxyAgent, DockerCommandLineCodeExecutor]:
-        """Create and configure all necessary agents"""
-        # Configure LLM
-        config_list = [{
+    def create_config_list() -> list:
+        """Groq by default, or a local server with agent_llm=local (read after load_dotenv)"""
+        if os.getenv("agent_llm", "groq") == "local":
+            return [{
+                "model": os.getenv("local_model_name", LOCAL_MODEL_NAME),
+                "base_url": os.getenv("local_llm_url", LOCAL_LLM_URL),
+                "api_key": "local"
+            }]
+        return [{
             "model": MODEL_NAME,
             "api_key": os.getenv("api_key"),
             "api_type": "groq"
         }]
 
-        # Setup Docker executor
-        executor = DockerCommandLineCodeExecutor(
-            timeout=DOCKER_TIMEOUT,
-            work_dir=str(work_dir),
-            image=DOCKER_IMAGE
-        )
+    @staticmethod
+    def create_agents(work_dir: Path, output_dir: Path, pool: SandboxPool) -> Tuple[AssistantAgent, UserProxyAgent, Union[PooledDockerCodeExecutor, CachingCodeExecutor]]:
+        """Create and configure all necessary agents"""
+        # Configure LLM
+        config_list = AgentFactory.create_config_list()
+
+        # Setup Docker executor on a container that is already running
+        executor = PooledDockerCodeExecutor(pool, timeout=DOCKER_TIMEOUT)
+        if EXEC_CACHE:
+            # Identical code on identical files in the work dir isn't run again
+            executor = CachingCodeExecutor(executor, pool.client.images.get(pool.image).id)
         
         # Link output directory
         output_link = work_dir / "output"
@@ -98,12 +114,14 @@ def main():
     work_dir, output_dir = AgentSetup.setup_directories()
     
     # Verify Docker
-    if not AgentSetup.setup_docker():
+    image = AgentSetup.setup_docker()
+    if image is None:
         sys.exit(1)
 
+    pool = SandboxPool(docker.from_env(), image, work_dir)
     try:
         # Create and run agents
-        assistant, user_proxy, executor = AgentFactory.create_agents(work_dir, output_dir)
+        assistant, user_proxy, executor = AgentFactory.create_agents(work_dir, output_dir, pool)
         with executor:
             print("AI Assistant initialized. Starting conversation...")
             user_proxy.initiate_chat(
@@ -113,6 +131,8 @@ def main():
     except Exception as e:
         print(f"Error during execution: {str(e)}")
         sys.exit(1)
+    finally:
+        pool.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,16 +1,186 @@
-from fastapi import FastAPI
+import asyncio
+import base64
+from contextlib import asynccontextmanager
+import json
+import os
+from typing import List, Literal, Optional, Tuple
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
-import base64
-from io import BytesIO
-from PIL import Image
-from sdxl_onnx import generate_image
+from image_cache import ImageCache
+from image_io import MEDIA_TYPES, encode_image, save_image_bytes
+from inference import ExecutorBusy, InferenceExecutor
+from scheduler import BatchScheduler
+
+# Batching window for concurrent /generate requests
+MAX_BATCH_SIZE = int(os.getenv("max_batch_size", 4))
+MAX_BATCH_WAIT_MS = float(os.getenv("max_batch_wait_ms", 50))
+# Requests waiting beyond this are rejected with 429
+MAX_QUEUE = int(os.getenv("max_queue", 32))
+# Pipeline instances, defaults to one per NUMA node
+INFERENCE_WORKERS = int(os.getenv("inference_workers", 0)) or None
+# "onnx" runs on ONNX Runtime, "torch" on the diffusers pipeline
+SDXL_BACKEND = os.getenv("sdxl_backend", "onnx")
+# "int8" trades a bounded quality loss for lower latency and memory
+SDXL_QUANTIZATION = os.getenv("sdxl_quantization") or None
+# Requests without a seed get a random image and skip the cache. Setting
+# default_seed (e.g. to 0) makes them deterministic, so repeated prompts hit it.
+_default_seed = os.getenv("default_seed", "")
+DEFAULT_SEED = int(_default_seed) if _default_seed else None
+
+# Generation parameters, part of the cache key
+MODEL_ID = f"stabilityai/sdxl-turbo:{SDXL_BACKEND}:{SDXL_QUANTIZATION or 'fp32'}"
+IMAGE_WIDTH = 512
+IMAGE_HEIGHT = 512
+INFERENCE_STEPS = 1
+GUIDANCE_SCALE = 0.0
+
+# Encoding of the returned image
+PNG_COMPRESS_LEVEL = int(os.getenv("png_compress_level", 1))
+WEBP_QUALITY = int(os.getenv("webp_quality", 80))
+# Optionally keep a copy of every generated image, written after the response is sent
+SAVE_OUTPUTS = os.getenv("save_outputs", "0") == "1"
+OUTPUT_DIR = "output/sdxl_onnx"
+# Upper bound on images in one /generate/batch request
+MAX_IMAGES_PER_REQUEST = int(os.getenv("max_images_per_request", 8))
+# How often /generate/stream re-checks queue position and client disconnects
+STREAM_POLL_SECONDS = 0.25
 
 class GenerateRequest(BaseModel):
     prompt: str
+    seed: Optional[int] = None
+    format: Literal["png", "webp"] = "png"
+
+class BatchGenerateRequest(BaseModel):
+    prompts: List[str] = Field(min_length=1)
+    num_images_per_prompt: int = Field(1, ge=1)
+    # One seed per image, or a base seed that image i of each prompt offsets by i
+    seeds: Optional[List[int]] = None
+    seed: Optional[int] = None
+    format: Literal["png", "webp"] = "png"
+
+class GenerationCancelled(Exception):
+    """Raised between denoising steps once every request in the batch has gone away"""
+
+class GenerationProgress:
+    """Carries progress events from the worker thread to a streaming response.
+
+    ``publish`` is safe to call from any thread; events are delivered on the
+    event loop the object was created on. ``cancelled`` is set when the client
+    disconnects so the worker can stop early.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.events = asyncio.Queue()
+        self.cancelled = False
+
+    def publish(self, event: str, data: Optional[dict] = None):
+        self.loop.call_soon_threadsafe(self.events.put_nowait, (event, data))
+
+    def cancel(self):
+        self.cancelled = True
+
+def create_generator():
+    from sdxl_onnx import SDXLTurboOnnx
+    return SDXLTurboOnnx(backend=SDXL_BACKEND, quantization=SDXL_QUANTIZATION)
+
+def warmup_generator(generator):
+    generator.warmup()
+
+def is_cancelled(progress: Optional[GenerationProgress]) -> bool:
+    return progress is not None and progress.cancelled
+
+def preview_callback(items):
+    """Return a step callback that streams latent previews and stops once all requests are cancelled"""
+    from preview import latents_to_previews
+
+    def on_step_end(pipe, step, timestep, callback_kwargs):
+        if all(is_cancelled(progress) for _, _, _, progress in items):
+            raise GenerationCancelled()
+        # The last step's preview would arrive right before the image itself
+        if step + 1 >= INFERENCE_STEPS:
+            return callback_kwargs
+
+        previews = latents_to_previews(callback_kwargs["latents"])
+        offset = 0
+        for item_prompts, _, _, progress in items:
+            if progress is not None and not progress.cancelled:
+                progress.publish("preview", {
+                    "step": step + 1,
+                    "steps": INFERENCE_STEPS,
+                    "images": [
+                        base64.b64encode(encode_image(image, "png", PNG_COMPRESS_LEVEL)).decode()
+                        for image in previews[offset:offset + len(item_prompts)]
+                    ]
+                })
+            offset += len(item_prompts)
+        return callback_kwargs
+    return on_step_end
+
+def run_batch(generator, items):
+    """Run every image of every queued request in one pipeline call.
+
+    Each item is (prompts, seeds, image_format, progress) with one entry per
+    image; the result for each item is the list of its encoded images.
+    ``progress`` is None for requests that don't stream.
+    """
+    # Requests cancelled while queued get no images and cost no pipeline time
+    live = [item for item in items if not is_cancelled(item[3])]
+    if not live:
+        return [[] for _ in items]
+
+    for _, _, _, progress in live:
+        if progress is not None:
+            progress.publish("started")
+
+    streaming = any(progress is not None for _, _, _, progress in live)
+    prompts = [prompt for item_prompts, _, _, _ in live for prompt in item_prompts]
+    seeds = [seed for _, item_seeds, _, _ in live for seed in item_seeds]
+    images = generator.generate_images(
+        prompts,
+        seeds=seeds,
+        num_inference_steps=INFERENCE_STEPS,
+        guidance_scale=GUIDANCE_SCALE,
+        width=IMAGE_WIDTH,
+        height=IMAGE_HEIGHT,
+        callback_on_step_end=preview_callback(live) if streaming else None
+    )
+
+    # Encode on the worker thread so the event loop only moves bytes
+    encoded = {}
+    offset = 0
+    for item in live:
+        item_prompts, _, image_format, _ = item
+        item_images = images[offset:offset + len(item_prompts)]
+        encoded[id(item)] = [encode_image(image, image_format, PNG_COMPRESS_LEVEL, WEBP_QUALITY) for image in item_images]
+        offset += len(item_prompts)
+    return [encoded.get(id(item), []) for item in items]
+
+image_cache = ImageCache(
+    max_memory_bytes=int(os.getenv("image_cache_memory_mb", 256)) * 1024 * 1024,
+    max_disk_bytes=int(os.getenv("image_cache_disk_mb", 2048)) * 1024 * 1024
+)
+
+scheduler = BatchScheduler(
+    run_batch,
+    InferenceExecutor(create_generator, num_workers=INFERENCE_WORKERS, warmup=warmup_generator),
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_BATCH_WAIT_MS,
+    max_queue=MAX_QUEUE,
+    item_size=lambda item: len(item[0])
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers load and warm up their pipelines in the background, so the server binds immediately
+    await scheduler.start()
+    yield
+    await scheduler.stop()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -21,18 +191,192 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request: Request, exc: ExecutorBusy):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", **scheduler.stats(), "cache": image_cache.stats()}
+
+@app.get("/ready")
+async def ready():
+    readiness = scheduler.executor.readiness()
+    status_code = 200 if readiness["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=readiness)
+
+def cache_key(prompt: str, seed: Optional[int], image_format: str) -> Optional[str]:
+    """Return the image cache key, or None since only deterministic (seeded) images can be cached"""
+    if seed is None:
+        return None
+    return ImageCache.make_key(
+        MODEL_ID, prompt, None, IMAGE_WIDTH, IMAGE_HEIGHT, INFERENCE_STEPS, GUIDANCE_SCALE, seed,
+        image_format=image_format, png_compress_level=PNG_COMPRESS_LEVEL, webp_quality=WEBP_QUALITY
+    )
+
+async def generate_cached(
+    images: List[Tuple[str, Optional[int]]],
+    image_format: str,
+    background_tasks: BackgroundTasks
+) -> Tuple[List[bytes], int]:
+    """Return encoded images for (prompt, seed) pairs and how many came from the cache.
+
+    Cached images are served without touching the pipeline; the rest are
+    generated together as one scheduler item, batched with other requests.
+    """
+    results: List[Optional[bytes]] = [None] * len(images)
+    cache_keys: List[Optional[str]] = [None] * len(images)
+    for i, (prompt, seed) in enumerate(images):
+        cache_keys[i] = cache_key(prompt, seed, image_format)
+        if cache_keys[i] is not None:
+            results[i] = await asyncio.to_thread(image_cache.get, cache_keys[i])
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        generated = await scheduler.submit((
+            [images[i][0] for i in missing],
+            [images[i][1] for i in missing],
+            image_format,
+            None
+        ))
+        for i, image_bytes in zip(missing, generated):
+            results[i] = image_bytes
+            if cache_keys[i] is not None:
+                await asyncio.to_thread(image_cache.put, cache_keys[i], image_bytes)
+            if SAVE_OUTPUTS:
+                background_tasks.add_task(save_image_bytes, image_bytes, OUTPUT_DIR, images[i][0], image_format)
+
+    return results, len(images) - len(missing)
+
 @app.post("/generate")
-async def generate(request: GenerateRequest):
-    # Generate image using SDXL
-    image_path = generate_image(request.prompt)
-    
-    # Open and convert image to base64
-    with Image.open(image_path) as img:
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-    
-    return {"image": img_str}
+async def generate(request: GenerateRequest, background_tasks: BackgroundTasks):
+    seed = request.seed if request.seed is not None else DEFAULT_SEED
+    results, cached = await generate_cached([(request.prompt, seed)], request.format, background_tasks)
+    return Response(
+        content=results[0],
+        media_type=MEDIA_TYPES[request.format],
+        headers={"X-Cache": "hit" if cached else "miss"}
+    )
+
+@app.post("/generate/batch")
+async def generate_batch(request: BatchGenerateRequest, background_tasks: BackgroundTasks):
+    num_images = len(request.prompts) * request.num_images_per_prompt
+    if num_images > MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_REQUEST} images per request")
+
+    if request.seeds is not None:
+        if len(request.seeds) != num_images:
+            raise HTTPException(status_code=400, detail=f"Expected {num_images} seeds, got {len(request.seeds)}")
+        seeds = request.seeds
+    else:
+        base_seed = request.seed if request.seed is not None else DEFAULT_SEED
+        seeds = [
+            base_seed + i if base_seed is not None else None
+            for _ in request.prompts for i in range(request.num_images_per_prompt)
+        ]
+
+    prompts = [prompt for prompt in request.prompts for _ in range(request.num_images_per_prompt)]
+    results, cached = await generate_cached(list(zip(prompts, seeds)), request.format, background_tasks)
+
+    return {
+        "media_type": MEDIA_TYPES[request.format],
+        "cached": cached,
+        "images": [
+            {"prompt": prompt, "seed": seed, "image": base64.b64encode(image_bytes).decode()}
+            for prompt, seed, image_bytes in zip(prompts, seeds, results)
+        ]
+    }
+
+def sse(event: str, data: Optional[dict] = None) -> str:
+    return f"event: {event}\ndata: {json.dumps(data or {})}\n\n"
+
+@app.get("/generate/stream")
+async def generate_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    prompt: str,
+    seed: Optional[int] = None,
+    image_format: Literal["png", "webp"] = Query("png", alias="format")
+):
+    """Generate one image as Server-Sent Events.
+
+    Emits ``queued`` whenever the queue position changes, ``started`` when a
+    worker picks the request up, ``preview`` with low resolution latent
+    previews after each denoising step but the last and finally ``image`` (or
+    ``error``). Closing the connection cancels the request: a queued request
+    never starts, a running one stops at the next step if no one else shares
+    the batch. With the default single step there are no previews, and a
+    request that has started runs to the end.
+    """
+    seed = seed if seed is not None else DEFAULT_SEED
+    key = cache_key(prompt, seed, image_format)
+    cached = await asyncio.to_thread(image_cache.get, key) if key is not None else None
+
+    def image_event(image_bytes: bytes, cached: bool) -> str:
+        return sse("image", {
+            "image": base64.b64encode(image_bytes).decode(),
+            "media_type": MEDIA_TYPES[image_format],
+            "seed": seed,
+            "cached": cached
+        })
+
+    if cached is not None:
+        async def cached_events():
+            yield image_event(cached, True)
+        return StreamingResponse(cached_events(), media_type="text/event-stream")
+
+    # Enqueue before the response starts, so a full queue is still a plain 429
+    progress = GenerationProgress()
+    future = scheduler.enqueue(([prompt], [seed], image_format, progress))
+    future.add_done_callback(lambda _: progress.publish("done"))
+
+    async def events():
+        try:
+            position = None
+            while True:
+                current = scheduler.position(future)
+                if current is not None and current != position:
+                    position = current
+                    yield sse("queued", {"position": position})
+
+                try:
+                    event, data = await asyncio.wait_for(progress.events.get(), STREAM_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    continue
+
+                if event == "done":
+                    break
+                yield sse(event, data)
+
+            try:
+                image_bytes = future.result()[0]
+            except Exception as e:
+                yield sse("error", {"detail": str(e)})
+                return
+
+            if key is not None:
+                await asyncio.to_thread(image_cache.put, key, image_bytes)
+            if SAVE_OUTPUTS:
+                background_tasks.add_task(save_image_bytes, image_bytes, OUTPUT_DIR, prompt, image_format)
+            yield image_event(image_bytes, False)
+        finally:
+            # Client went away (or the stream was closed early): free the queue slot and the pipeline
+            if not future.done():
+                progress.cancel()
+                scheduler.cancel(future)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks
+    )
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,108 @@
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Constants
+MODULE = "sprachassistent"
+BUDGET_MS = 400
+# Fresh interpreters per measurement, the median is reported
+RUNS = 5
+# Must not be imported before they are used, each costs from tens of ms to seconds
+DEFERRED_MODULES = [
+    "crawl4ai",
+    "playwright",
+    "openai",
+    "httpx",
+    "gtts",
+    "speech_recognition",
+    "faster_whisper",
+    "vosk",
+    "piper",
+    "miniaudio",
+    "pyaudio",
+    "tiktoken",
+    "wikipedia",
+    "numpy",
+    "torch"
+]
+
+def measure_import(module: str = MODULE, runs: int = RUNS) -> Tuple[float, Dict[str, float]]:
+    """Import module in ``runs`` fresh interpreters and return the median run.
+
+    Every run is a cold interpreter start, nothing is imported yet; the median
+    keeps one unlucky run from failing the budget.
+    """
+    samples = sorted((_measure_once(module) for _ in range(runs)), key=lambda sample: sample[0])
+    return samples[len(samples) // 2]
+
+def _measure_once(module: str) -> Tuple[float, Dict[str, float]]:
+    """Import module in a fresh interpreter with -X importtime.
+
+    Returns the cumulative import time of the module in ms and the cumulative
+    time of every top-level package it pulled in, at any depth.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1]}")
+
+    packages = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by indentation, a package's own line includes its submodules
+        name = name.strip()
+        if name == module:
+            total = int(cumulative) / 1000
+        elif "." not in name:
+            packages[name] = int(cumulative) / 1000
+    return total, packages
+
+def check_startup(module: str = MODULE, budget_ms: float = BUDGET_MS, deferred: List[str] = DEFERRED_MODULES) -> List[str]:
+    """Return the startup budget violations, empty if the import is fast enough"""
+    total, packages = measure_import(module)
+    return startup_problems(module, total, packages, budget_ms, deferred)
+
+def startup_problems(
+    module: str,
+    total: float,
+    packages: Dict[str, float],
+    budget_ms: float = BUDGET_MS,
+    deferred: List[str] = DEFERRED_MODULES
+) -> List[str]:
+    problems = []
+    if total > budget_ms:
+        problems.append(f"import {module} took {total:.0f} ms, budget is {budget_ms:.0f} ms")
+    for name in deferred:
+        if name in packages:
+            problems.append(f"{name} is imported at startup ({packages[name]:.0f} ms), import it on first use")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Guard the startup import time of the voice assistant")
+    parser.add_argument("--module", default=MODULE)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=RUNS, help="Fresh interpreters to measure, the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="Show the slowest top-level imports")
+    args = parser.parse_args()
+
+    total, packages = measure_import(args.module, args.runs)
+    print(f"import {args.module}: {total:.0f} ms, median of {args.runs} (budget {args.budget_ms:.0f} ms)\n")
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<30} {ms:>8.1f} ms")
+
+    problems = startup_problems(args.module, total, packages, args.budget_ms)
+    if problems:
+        print()
+        for problem in problems:
+            print(problem)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import statistics
+from typing import List
+
+# Questions without tool calls, so only the model is measured
+PROMPTS = [
+    "Erkläre mir in zwei Sätzen, was ein Lebenslauf enthalten sollte.",
+    "Wie bereite ich mich auf ein Vorstellungsgespräch vor?",
+    "Was ist der Unterschied zwischen einem Anschreiben und einem Motivationsschreiben?",
+    "Nenne drei Fragen, die ich am Ende eines Bewerbungsgesprächs stellen kann."
+]
+
+def run_turns(client, model: str, system_prompt: str, turns: int) -> List[dict]:
+    """Ask the prompts in one conversation and return the metrics of every turn"""
+    from conversation import Conversation
+    from router import TurnMetrics
+    from sprachassistent import stream_ai_response
+
+    conversation = Conversation(client, model, system_prompt)
+    results = []
+    for turn in range(turns):
+        metrics = TurnMetrics()
+        for _ in stream_ai_response(client, PROMPTS[turn % len(PROMPTS)], conversation, metrics):
+            pass
+        results.append(metrics.as_dict())
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="First token and turn latency of the assistant's LLM backend")
+    parser.add_argument("--backend", default=None, help="remote or llama_cpp, defaults to llm_backend")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--stub", action="store_true", help="Run against stub_server.py instead of api_endpoint")
+    parser.add_argument("--stub-latency-ms", type=float, default=150, help="Time to first token of the stub")
+    parser.add_argument("--stub-token-latency-ms", type=float, default=20, help="Time per streamed word of the stub")
+    args = parser.parse_args()
+
+    if args.stub:
+        from stub_server import start_stub_server, stub_env
+
+        server, base_url = start_stub_server(latency=args.stub_latency_ms / 1000, token_latency=args.stub_token_latency_ms / 1000)
+        os.environ.update(stub_env(base_url))
+        args.backend = "remote"
+    if args.backend:
+        os.environ["llm_backend"] = args.backend
+
+    # Read the endpoint and backend only now, after the environment is set
+    from llm_backend import warm_up
+    from sprachassistent import MODEL, SYSTEM_PROMPT, init_openai_client
+    from tools import tools
+
+    client = init_openai_client()
+    warm_up(client, SYSTEM_PROMPT, tools)
+    results = run_turns(client, MODEL, SYSTEM_PROMPT, args.turns)
+
+    print(f"{'turn':>4} {'calls':>5} {'first token ms':>15} {'llm ms':>8} {'turn ms':>8}")
+    for turn, result in enumerate(results, 1):
+        print(f"{turn:>4} {result['llm_calls']:>5} {result['first_token_ms'] or 0:>15} {result['llm_ms']:>8} {result['turn_ms']:>8}")
+
+    # Later turns start from the cached system prompt and history
+    first_tokens = [result["first_token_ms"] for result in results if result["first_token_ms"] is not None]
+    if len(first_tokens) > 1:
+        print(f"\nFirst token: turn 1 {first_tokens[0]} ms, later turns {statistics.mean(first_tokens[1:]):.0f} ms mean")
+
+if __name__ == "__main__":
+    main()
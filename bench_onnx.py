@@ -0,0 +1,77 @@
+import argparse
+import gc
+import statistics
+import time
+import numpy as np
+import torch
+from sdxl_onnx import SDXLTurboOnnx
+
+# Fixed prompts so runs are comparable
+PROMPTS = [
+    "a cat in cyberpunk style",
+    "a lighthouse on a cliff at sunset, oil painting",
+    "a bowl of ramen, studio photo"
+]
+
+def run_backend(backend: str, runs: int, seed: int, width: int, height: int) -> dict:
+    """Load one backend, warm it up and time generation on the fixed prompts"""
+    started = time.perf_counter()
+    generator = SDXLTurboOnnx(backend=backend)
+    load_seconds = time.perf_counter() - started
+
+    generator.warmup(width=width, height=height)
+
+    latencies = []
+    images = []
+    for prompt in PROMPTS:
+        for _ in range(runs):
+            started = time.perf_counter()
+            output = generator.pipe(
+                prompt=prompt,
+                num_inference_steps=1,
+                guidance_scale=0.0,
+                width=width,
+                height=height,
+                generator=torch.Generator("cpu").manual_seed(seed)
+            )
+            latencies.append(time.perf_counter() - started)
+        images.append(np.asarray(output.images[0], dtype=np.float32))
+
+    del generator
+    gc.collect()
+
+    return {
+        "load_seconds": load_seconds,
+        "mean": statistics.mean(latencies),
+        "p50": statistics.median(latencies),
+        "min": min(latencies),
+        "images": images
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SDXL-Turbo latency on ONNX Runtime and PyTorch")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per prompt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    args = parser.parse_args()
+
+    # Load backends one after another so they don't compete for memory
+    results = {}
+    for backend in ("torch", "onnx"):
+        print(f"Benchmarking {backend}...")
+        results[backend] = run_backend(backend, args.runs, args.seed, args.width, args.height)
+
+    print(f"\n{'backend':<8} {'load s':>8} {'mean s':>8} {'p50 s':>8} {'min s':>8}")
+    for backend, result in results.items():
+        print(f"{backend:<8} {result['load_seconds']:>8.2f} {result['mean']:>8.3f} {result['p50']:>8.3f} {result['min']:>8.3f}")
+
+    speedup = results["torch"]["mean"] / results["onnx"]["mean"]
+    drift = statistics.mean(
+        float(np.abs(a - b).mean()) for a, b in zip(results["torch"]["images"], results["onnx"]["images"])
+    )
+    print(f"\nONNX Runtime speedup: {speedup:.2f}x")
+    print(f"Mean absolute pixel difference: {drift:.2f} / 255")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+from typing import List, Optional
+import numpy as np
+import torch
+
+# Fixed prompt set for the quality check
+PROMPTS = [
+    "a cat in cyberpunk style",
+    "a lighthouse on a cliff at sunset, oil painting",
+    "a bowl of ramen, studio photo",
+    "portrait of an old fisherman, dramatic lighting",
+    "a red sports car on a mountain road"
+]
+
+def run_variant(backend: str, quantization: Optional[str], seed: int, width: int, height: int) -> dict:
+    """Generate the prompt set with one variant. Runs in its own process so peak RSS is per variant."""
+    from sdxl_onnx import SDXLTurboOnnx
+
+    generator = SDXLTurboOnnx(backend=backend, quantization=quantization)
+    generator.warmup(width=width, height=height)
+
+    latencies = []
+    images = []
+    for prompt in PROMPTS:
+        started = time.perf_counter()
+        output = generator.pipe(
+            prompt=prompt,
+            num_inference_steps=1,
+            guidance_scale=0.0,
+            width=width,
+            height=height,
+            generator=torch.Generator("cpu").manual_seed(seed)
+        )
+        latencies.append(time.perf_counter() - started)
+        images.append(np.asarray(output.images[0]))
+
+    return {
+        "latency": statistics.mean(latencies),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "images": images
+    }
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def clip_scores(images: List[np.ndarray]) -> List[float]:
+    """Cosine similarity between each image and its prompt in CLIP space"""
+    from transformers import CLIPModel, CLIPProcessor
+
+    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    inputs = processor(text=PROMPTS, images=images, return_tensors="pt", padding=True)
+    with torch.no_grad():
+        outputs = model(**inputs)
+    image_embeds = outputs.image_embeds / outputs.image_embeds.norm(dim=-1, keepdim=True)
+    text_embeds = outputs.text_embeds / outputs.text_embeds.norm(dim=-1, keepdim=True)
+    return (image_embeds * text_embeds).sum(dim=-1).tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure latency, memory and quality drift of INT8 quantization")
+    parser.add_argument("--backend", choices=["onnx", "torch"], default="onnx")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--min-psnr", type=float, default=18.0, help="Fail if mean PSNR against fp32 drops below this")
+    parser.add_argument("--clip", action="store_true", help="Also compare CLIP scores")
+    parser.add_argument("--max-clip-drop", type=float, default=0.02, help="Fail if mean CLIP score drops by more than this")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for quantization in (None, "int8"):
+        name = quantization or "fp32"
+        print(f"Running {args.backend} {name}...")
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(run_variant, (args.backend, quantization, args.seed, args.width, args.height))
+
+    fp32, int8 = results["fp32"], results["int8"]
+    drift = [float(np.abs(a.astype(np.float32) - b.astype(np.float32)).mean()) for a, b in zip(fp32["images"], int8["images"])]
+    scores = [psnr(a, b) for a, b in zip(fp32["images"], int8["images"])]
+
+    print(f"\n{'variant':<8} {'latency s':>10} {'peak RSS MB':>12}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['latency']:>10.3f} {result['peak_rss_mb']:>12.0f}")
+    print(f"\nSpeedup: {fp32['latency'] / int8['latency']:.2f}x")
+    print(f"Mean absolute pixel difference: {statistics.mean(drift):.2f} / 255")
+    print(f"Mean PSNR against fp32: {statistics.mean(scores):.2f} dB")
+
+    failed = statistics.mean(scores) < args.min_psnr
+
+    if args.clip:
+        clip_fp32 = statistics.mean(clip_scores(fp32["images"]))
+        clip_int8 = statistics.mean(clip_scores(int8["images"]))
+        print(f"Mean CLIP score: fp32 {clip_fp32:.4f}, int8 {clip_int8:.4f}")
+        failed = failed or clip_fp32 - clip_int8 > args.max_clip_drop
+
+    if failed:
+        print("Quantized model is outside the accepted quality drift")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import List
+import websockets
+from stt import FRAME_BYTES, FRAME_MS, WavFileSource
+
+# Seconds to wait for the next message of an answer before the turn counts as failed
+TURN_TIMEOUT = 60.0
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction + 0.5) - 1)]
+
+async def run_session(url: str, recordings: List[bytes], turns: int, realtime: bool, turn_timeout: float = TURN_TIMEOUT) -> List[dict]:
+    """Replay recordings as one client and return client-side timings per turn"""
+    results = []
+    async with websockets.connect(url, max_size=2 ** 22) as websocket:
+        await websocket.recv()  # session id
+        for turn in range(turns):
+            pcm = recordings[turn % len(recordings)]
+            for offset in range(0, len(pcm), FRAME_BYTES):
+                await websocket.send(pcm[offset:offset + FRAME_BYTES])
+                if realtime:
+                    await asyncio.sleep(FRAME_MS / 1000)
+            await websocket.send(json.dumps({"type": "end"}))
+            speech_ended = time.perf_counter()
+
+            first_audio = None
+            while True:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), turn_timeout)
+                except asyncio.TimeoutError:
+                    # The session is in an unknown state, give up on its remaining turns
+                    results.append({"error": f"No answer within {turn_timeout:.0f}s"})
+                    return results
+                if isinstance(message, bytes):
+                    if first_audio is None:
+                        first_audio = time.perf_counter() - speech_ended
+                    continue
+                event = json.loads(message)
+                if event["type"] == "done":
+                    results.append({"first_audio": first_audio, "total": time.perf_counter() - speech_ended, "server": event})
+                    break
+                if event["type"] == "error":
+                    results.append({"error": event["detail"]})
+                    break
+                if event["type"] == "no_speech":
+                    results.append({"error": "No speech recognized"})
+                    break
+    return results
+
+async def run_level(url: str, sessions: int, recordings: List[bytes], turns: int, realtime: bool, turn_timeout: float = TURN_TIMEOUT) -> dict:
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(run_session(url, recordings, turns, realtime, turn_timeout) for _ in range(sessions)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+
+    results = [result for outcome in outcomes if isinstance(outcome, list) for result in outcome]
+    errors = sum(1 for outcome in outcomes if isinstance(outcome, BaseException)) + sum(1 for result in results if "error" in result)
+    first_audio = [result["first_audio"] for result in results if result.get("first_audio") is not None]
+    return {
+        "sessions": sessions,
+        "turns": len(results),
+        "errors": errors,
+        "turns_per_second": len(results) / elapsed,
+        "first_audio_mean": statistics.mean(first_audio) if first_audio else float("nan"),
+        "first_audio_p95": percentile(first_audio, 0.95) if first_audio else float("nan")
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test voice_server.py by replaying recorded utterances from many concurrent sessions")
+    parser.add_argument("wavs", nargs="+", help="Recordings with one utterance each, replayed in turn")
+    parser.add_argument("--url", default="ws://localhost:8770")
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="Comma separated concurrency levels")
+    parser.add_argument("--turns", type=int, default=2, help="Turns per session")
+    parser.add_argument("--fast", action="store_true", help="Send audio as fast as possible instead of in real time")
+    parser.add_argument("--max-first-audio-ms", type=float, default=1500, help="p95 latency from end of speech to first audio that still counts as served")
+    parser.add_argument("--turn-timeout", type=float, default=TURN_TIMEOUT, help="Seconds without a message from the server before a turn counts as failed")
+    parser.add_argument("--server-cores", type=int, default=os.cpu_count(), help="Cores of the server, for sessions per core")
+    args = parser.parse_args()
+
+    recordings = [WavFileSource(path, trailing_silence_ms=0).pcm for path in args.wavs]
+    levels = [int(level) for level in args.sessions.split(",")]
+
+    print(f"{'sessions':>8} {'turns':>6} {'errors':>6} {'turns/s':>8} {'first audio ms':>15} {'p95 ms':>8}")
+    best = 0
+    for sessions in levels:
+        result = asyncio.run(run_level(args.url, sessions, recordings, args.turns, not args.fast, args.turn_timeout))
+        print(f"{result['sessions']:>8} {result['turns']:>6} {result['errors']:>6} {result['turns_per_second']:>8.2f} "
+              f"{result['first_audio_mean'] * 1000:>15.0f} {result['first_audio_p95'] * 1000:>8.0f}")
+        if result["errors"] == 0 and result["first_audio_p95"] * 1000 <= args.max_first_audio_ms:
+            best = sessions
+
+    print(f"\nConcurrent sessions within {args.max_first_audio_ms:.0f} ms p95: {best} "
+          f"({best / args.server_cores:.2f} per core on {args.server_cores} cores)")
+
+if __name__ == "__main__":
+    main()
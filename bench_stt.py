@@ -0,0 +1,40 @@
+import argparse
+import statistics
+import time
+from stt import STT_BACKENDS, NoSpeechRecognized, SpeechRecognizer, WavFileSource, create_backend
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure speech recognition latency on WAV files, without a microphone")
+    parser.add_argument("wavs", nargs="+", help="Recordings with one utterance each")
+    parser.add_argument("--backend", choices=list(STT_BACKENDS), action="append", help="Backend to measure, repeatable (default: all)")
+    parser.add_argument("--realtime", action="store_true", help="Feed audio at microphone speed, so partial decoding overlaps speech")
+    args = parser.parse_args()
+
+    for name in args.backend or list(STT_BACKENDS):
+        try:
+            backend = create_backend(name)
+        except Exception as e:
+            print(f"Skipping {name}: {str(e)}")
+            continue
+
+        latencies = []
+        print(f"\n{name}")
+        for path in args.wavs:
+            source = WavFileSource(path, realtime=args.realtime)
+            recognizer = SpeechRecognizer(backend, source)
+            started = time.perf_counter()
+            try:
+                text = recognizer.listen()
+            except NoSpeechRecognized as e:
+                print(f"  {path}: {str(e)}")
+                continue
+            total = time.perf_counter() - started
+            latencies.append(recognizer.last_latency)
+            print(f"  {path}: {recognizer.last_latency * 1000:.0f} ms after end of speech, {total:.2f} s total ({source.duration:.1f} s audio)")
+            print(f"    {text}")
+
+        if latencies:
+            print(f"  mean latency after end of speech: {statistics.mean(latencies) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Awaitable, Callable, List
+from stub_server import start_stub_server, stub_env
+
+def summarize(name: str, latencies: List[float]):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{name:<28} {statistics.mean(latencies) * 1000:>9.1f} {p95 * 1000:>9.1f}")
+
+async def measure(rounds: int, call: Callable[[], Awaitable]) -> List[float]:
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+async def run(rounds: int):
+    # Imported here so the endpoint overrides from the environment are picked up
+    import tools
+    from http_client import HTTP2, close_client, create_client, get_json
+    from tool_cache import clear_caches
+
+    urls = [
+        (tools.WEATHER_API_URL, {"latitude": 52.52, "longitude": 13.405, "current": "temperature_2m"}),
+        (tools.IPIFY_URL, {"format": "json"}),
+        (tools.DUCKDUCKGO_API_URL, {"q": "Berlin", "format": "json"})
+    ]
+
+    async def fresh_connections():
+        # What bare requests.get() did: a new connection (and TLS handshake) per call
+        for url, params in urls:
+            async with create_client() as client:
+                await get_json(url, params, client=client)
+
+    async def pooled_sequential():
+        for url, params in urls:
+            await get_json(url, params)
+
+    async def pooled_concurrent():
+        await asyncio.gather(*(get_json(url, params) for url, params in urls))
+
+    async def tools_concurrent():
+        # Measure the HTTP path, not the result caches filled by the previous round
+        clear_caches()
+        await asyncio.gather(tools.get_weather(52.52, 13.405), tools.location(), tools.search_duckduckgo("Berlin"))
+
+    print(f"HTTP/2: {'enabled' if HTTP2 else 'unavailable (pip install httpx[http2])'}")
+    print(f"\n{'variant':<28} {'mean ms':>9} {'p95 ms':>9}")
+    # Warm up the pool and DNS before measuring
+    await pooled_concurrent()
+    summarize("fresh connection per call", await measure(rounds, fresh_connections))
+    summarize("pooled, sequential", await measure(rounds, pooled_sequential))
+    summarize("pooled, concurrent", await measure(rounds, pooled_concurrent))
+    summarize("tools, concurrent", await measure(rounds, tools_concurrent))
+    await close_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call connections with the pooled HTTP client used by tools.py")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--live", action="store_true", help="Hit the real APIs instead of the local stub server")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated server latency of the stub")
+    args = parser.parse_args()
+
+    if not args.live:
+        _, base_url = start_stub_server(latency=args.latency_ms / 1000)
+        os.environ.update(stub_env(base_url))
+        print(f"Using stub server at {base_url}")
+
+    asyncio.run(run(args.rounds))
+
+if __name__ == "__main__":
+    main()
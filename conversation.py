@@ -0,0 +1,146 @@
+import functools
+import importlib.util
+import os
+import threading
+from typing import List, Optional
+
+# Constants
+# Token budget for the summary plus past turns, the system prompt and current input come on top
+MAX_HISTORY_TOKENS = int(os.getenv("conversation_max_tokens", 2000))
+# Most recent turns that are always kept verbatim
+KEEP_RECENT_TURNS = 2
+SUMMARY_MAX_TOKENS = 200
+SUMMARY_PROMPT = ("Fasse das folgende Gespräch zwischen Nutzer und Assistent in wenigen Sätzen auf Deutsch zusammen. "
+                  "Behalte Fakten, Namen, Zahlen, Vorlieben des Nutzers und offene Fragen. Antworte nur mit der Zusammenfassung.")
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding():
+    """Load tiktoken on first use, or None if it isn't installed"""
+    if importlib.util.find_spec("tiktoken") is None:
+        return None
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        # About four characters per token for typical German and English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+def count_message_tokens(messages: List[dict]) -> int:
+    # A few tokens of overhead per message for role and separators
+    return sum(count_tokens(message.get("content") or "") + 4 for message in messages)
+
+class Conversation:
+    """Multi-turn memory whose prompt size stays bounded however long the session runs.
+
+    Every request starts with the same system message, so providers can reuse
+    their cached prefix. Past turns follow as plain user/assistant pairs (tool
+    traffic is dropped once the answer exists). When they exceed
+    ``max_history_tokens``, the oldest turns are folded into a rolling summary
+    by the model, in the background so the next answer isn't delayed.
+
+    A local model (``client.local``) serves one request at a time, so a
+    summary would hold it during the next turn. Old turns are then dropped
+    without summarizing, unless ``summarize`` says otherwise.
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        system_prompt: str,
+        max_history_tokens: int = MAX_HISTORY_TOKENS,
+        keep_recent_turns: int = KEEP_RECENT_TURNS,
+        summarize: Optional[bool] = None
+    ):
+        self.client = client
+        self.model = model
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.max_history_tokens = max_history_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.summarize = not getattr(client, "local", False) if summarize is None else summarize
+        self.summary: Optional[str] = None
+        self.turns: List[List[dict]] = []
+        self._lock = threading.Lock()
+        self._summarizing = False
+
+    def messages(self, user_input: str) -> List[dict]:
+        """Return the prompt for a new user input: system prefix, summary, past turns, input"""
+        with self._lock:
+            messages = [self.system_message]
+            if self.summary:
+                messages.append({"role": "system", "content": f"Zusammenfassung des bisherigen Gesprächs: {self.summary}"})
+            for turn in self.turns:
+                messages.extend(turn)
+        messages.append({"role": "user", "content": user_input})
+        return messages
+
+    def history_tokens(self) -> int:
+        with self._lock:
+            summary_tokens = count_tokens(self.summary) if self.summary else 0
+            return summary_tokens + sum(count_message_tokens(turn) for turn in self.turns)
+
+    def add_turn(self, user_input: str, answer: str):
+        """Record a finished turn and compact the history if it is over budget"""
+        with self._lock:
+            self.turns.append([
+                {"role": "user", "content": user_input},
+                {"role": "assistant", "content": answer}
+            ])
+            if self._summarizing:
+                return
+            self._summarizing = True
+        threading.Thread(target=self._compact, name="conversation-summary", daemon=True).start()
+
+    def _compact(self):
+        try:
+            while self.history_tokens() > self.max_history_tokens:
+                with self._lock:
+                    # The latest turn stays verbatim even if it alone is over budget
+                    if len(self.turns) <= 1:
+                        break
+                    # Fold everything but the recent turns, or at least the oldest one
+                    old_turns = self.turns[:max(1, len(self.turns) - self.keep_recent_turns)]
+                    previous_summary = self.summary
+
+                summary = previous_summary
+                if self.summarize:
+                    try:
+                        summary = self._summarize(previous_summary, old_turns)
+                    except Exception as e:
+                        print(f"Error summarizing conversation, dropping old turns: {str(e)}")
+
+                with self._lock:
+                    # Turns added meanwhile stay, only the summarized ones are replaced
+                    self.turns = self.turns[len(old_turns):]
+                    self.summary = summary
+        finally:
+            with self._lock:
+                self._summarizing = False
+
+    def _summarize(self, previous_summary: Optional[str], turns: List[List[dict]]) -> str:
+        transcript = []
+        if previous_summary:
+            transcript.append(f"Bisherige Zusammenfassung: {previous_summary}")
+        for turn in turns:
+            for message in turn:
+                speaker = "Nutzer" if message["role"] == "user" else "Assistent"
+                transcript.append(f"{speaker}: {message['content']}")
+
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n".join(transcript)}
+            ],
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content.strip()
+
+    def clear(self):
+        with self._lock:
+            self.summary = None
+            self.turns = []
@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+from typing import List, Optional
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+
+# Constants
+MAX_PAGES = int(os.getenv("crawler_max_pages", 4))
+# Close the browser after this many seconds without crawls
+IDLE_TIMEOUT = float(os.getenv("crawler_idle_timeout", 300))
+
+class CrawlerPool:
+    """One long-lived headless browser shared by all crawls.
+
+    The browser starts on the first crawl and closes after ``idle_timeout``
+    seconds without use. At most ``max_pages`` pages are open at once; each
+    crawl reuses an idle page (a crawl4ai session) instead of opening a new
+    one. Must be used from a single event loop, e.g. the tool dispatcher's.
+    """
+
+    def __init__(self, max_pages: int = MAX_PAGES, idle_timeout: float = IDLE_TIMEOUT, browser_config: Optional[BrowserConfig] = None):
+        self.max_pages = max_pages
+        self.idle_timeout = idle_timeout
+        self.browser_config = browser_config or BrowserConfig(headless=True, verbose=False)
+        self._crawler = None
+        self._lock = asyncio.Lock()
+        self._pages = asyncio.Semaphore(max_pages)
+        self._idle_sessions: List[str] = []
+        self._session_ids = itertools.count()
+        self._active = 0
+        self._last_used = time.monotonic()
+        self._idle_task = None
+
+    async def _get_crawler(self) -> AsyncWebCrawler:
+        async with self._lock:
+            if self._crawler is None:
+                print("Starting headless browser for crawl4ai...")
+                crawler = AsyncWebCrawler(config=self.browser_config)
+                await crawler.start()
+                self._crawler = crawler
+            return self._crawler
+
+    async def crawl(self, url: str) -> dict:
+        """Crawl one page and return its content as markdown"""
+        async with self._pages:
+            self._active += 1
+            try:
+                crawler = await self._get_crawler()
+                session_id = self._idle_sessions.pop() if self._idle_sessions else f"page-{next(self._session_ids)}"
+                run_config = CrawlerRunConfig(cache_mode=CacheMode.ENABLED, session_id=session_id, verbose=False)
+                try:
+                    result = await crawler.arun(url=url, config=run_config)
+                except BaseException:
+                    # Don't hand a page in an unknown state to the next crawl. This
+                    # includes cancellation by a tool timeout, or the page would stay
+                    # open outside max_pages for the life of the pool.
+                    try:
+                        await asyncio.shield(crawler.crawler_strategy.kill_session(session_id))
+                    except Exception as e:
+                        print(f"Error closing crawler page {session_id}: {str(e)}")
+                    raise
+                self._idle_sessions.append(session_id)
+
+                if not result.success:
+                    return {"error": result.error_message}
+                return {"content": result.markdown}
+            except Exception as e:
+                return {"error": str(e)}
+            finally:
+                self._active -= 1
+                self._last_used = time.monotonic()
+                self._schedule_idle_close()
+
+    async def crawl_many(self, urls: List[str]) -> List[dict]:
+        """Crawl several pages in parallel, bounded by max_pages"""
+        return await asyncio.gather(*(self.crawl(url) for url in urls))
+
+    def _schedule_idle_close(self):
+        if self._idle_task is None or self._idle_task.done():
+            self._idle_task = asyncio.get_running_loop().create_task(self._close_when_idle())
+
+    async def _close_when_idle(self):
+        while self._crawler is not None:
+            remaining = self._last_used + self.idle_timeout - time.monotonic()
+            if remaining <= 0 and self._active == 0:
+                async with self._lock:
+                    # A crawl may have started while we waited for the lock
+                    if self._active == 0 and time.monotonic() - self._last_used >= self.idle_timeout:
+                        await self._close_locked()
+                        print("Closed idle headless browser")
+                return
+            await asyncio.sleep(max(remaining, 1.0))
+
+    async def _close_locked(self):
+        crawler, self._crawler = self._crawler, None
+        self._idle_sessions.clear()
+        if crawler is not None:
+            await crawler.close()
+
+    async def close(self):
+        """Close the browser now, e.g. on shutdown"""
+        async with self._lock:
+            await self._close_locked()
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_crawler_pool() -> CrawlerPool:
+    """Return the shared crawler pool, created on first use"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = CrawlerPool()
+        return _default_pool
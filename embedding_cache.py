@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Tuple
+import numpy as np
+import torch
+
+# Constants
+MAX_ENTRIES = 1024
+
+def encode_with_pipeline(pipe) -> Callable[[List[str]], Tuple[torch.Tensor, torch.Tensor]]:
+    """Return an encode function for a diffusers SDXL pipeline"""
+    def encode(prompts: List[str]) -> Tuple[torch.Tensor, torch.Tensor]:
+        with torch.no_grad():
+            prompt_embeds, _, pooled_prompt_embeds, _ = pipe.encode_prompt(
+                prompt=prompts,
+                device=pipe.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False
+            )
+        return prompt_embeds, pooled_prompt_embeds
+    return encode
+
+def _stack(rows: List[Any]) -> Any:
+    if isinstance(rows[0], np.ndarray):
+        return np.stack(rows)
+    return torch.stack(rows)
+
+class PromptEmbeddingCache:
+    """Bounded LRU of text encoder outputs keyed by the tokenized prompt.
+
+    ``encode(prompts)`` must return ``(prompt_embeds, pooled_prompt_embeds)``
+    with one row per prompt, as numpy arrays or torch tensors. Prompts that
+    tokenize identically (e.g. differ only in whitespace or in text past the
+    token limit) share one entry.
+    """
+
+    def __init__(self, tokenizers: list, encode: Callable[[List[str]], Tuple[Any, Any]], max_entries: int = MAX_ENTRIES):
+        self.tokenizers = tokenizers
+        self.encode_fn = encode
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, prompt: str) -> tuple:
+        return tuple(
+            tuple(tokenizer(prompt, truncation=True, max_length=tokenizer.model_max_length).input_ids)
+            for tokenizer in self.tokenizers
+        )
+
+    def encode(self, prompts: List[str]) -> Tuple[Any, Any]:
+        """Return stacked embeddings for prompts, encoding all misses in one batch"""
+        keys = [self.key(prompt) for prompt in prompts]
+
+        found = {}
+        missing = {}
+        with self._lock:
+            for key, prompt in zip(keys, prompts):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                    self.hits += 1
+                elif key not in missing:
+                    missing[key] = prompt
+                    self.misses += 1
+
+        if missing:
+            prompt_embeds, pooled_prompt_embeds = self.encode_fn(list(missing.values()))
+            with self._lock:
+                for i, key in enumerate(missing):
+                    found[key] = (prompt_embeds[i], pooled_prompt_embeds[i])
+                    self._entries[key] = found[key]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        rows = [found[key] for key in keys]
+        return _stack([row[0] for row in rows]), _stack([row[1] for row in rows])
+
+    def pre_encode(self, prompts: List[str]):
+        """Encode prompts ahead of time, e.g. popular suggestions at startup"""
+        if prompts:
+            self.encode(prompts)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from autogen.coding import CodeBlock
+from autogen.coding.base import CommandLineCodeResult
+
+# Constants
+CACHE_DIR = str(Path(__file__).parent / "output" / "cache" / "executions")
+# Runs remembered per code, e.g. the same script on different input files
+MAX_RUNS_PER_CODE = 8
+# Entries not stored or hit for this long are deleted, e.g. those of an image that was rebuilt
+MAX_ENTRY_AGE = float(os.getenv("exec_cache_max_age_days", 30)) * 86400
+# Opt-in: replaying a run is only right for code whose result depends on nothing but its files
+EXEC_CACHE = os.getenv("exec_cache", "0") == "1"
+# Code containing this is always executed, e.g. when it fetches live data
+NO_CACHE_MARKER = "# no-cache"
+# Shell blocks and package installs change the container, replaying their output changes nothing
+UNCACHEABLE_LANGUAGES = {"bash", "shell", "sh"}
+INSTALL_PATTERN = re.compile(r"\b(?:pip3?|apt(?:-get)?|conda|mamba)\b.*\binstall\b")
+# Written by the executor for every block, not inputs
+CODE_FILE_PREFIX = "tmp_code_"
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class CachingCodeExecutor:
+    """Returns the recorded result when the same code runs again on the same inputs.
+
+    A run is identified by the code blocks, the sandbox image id, the blocks
+    that changed the container's environment earlier in the session and the
+    content of every file in the work directory. Successful runs store their
+    output and the files they created or changed; a hit restores those files
+    and returns the output without starting the code. Files that a previous
+    run created don't count as inputs, so a re-run after it still hits.
+
+    Shell blocks, package installs and kernel mode are never cached, skipping
+    them would skip the state they leave behind. A container whose
+    environment was changed isn't given back to the pool, so every session
+    starts from the image.
+    """
+
+    def __init__(self, executor, image_id: str, cache_dir: str = CACHE_DIR, max_runs: int = MAX_RUNS_PER_CODE):
+        self.executor = executor
+        self.image_id = image_id
+        self.work_dir = Path(executor.work_dir)
+        self.cache_dir = cache_dir
+        self.max_runs = max_runs
+        # path -> (size, mtime, digest), so unchanged files aren't hashed again
+        self._file_digests: Dict[str, tuple] = {}
+        # Blocks that installed packages or ran shell commands in this session's container
+        self._environment: List[List[List[str]]] = []
+        self.hits = 0
+        self.misses = 0
+        try:
+            self.collect_garbage()
+        except OSError as e:
+            print(f"Error cleaning up the execution cache: {str(e)}")
+
+    @property
+    def code_extractor(self):
+        return self.executor.code_extractor
+
+    def _code_key(self, code_blocks: List[CodeBlock]) -> str:
+        payload = json.dumps([
+            self.image_id,
+            self._environment,
+            [[block.language, block.code] for block in code_blocks]
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def snapshot(self) -> Dict[str, str]:
+        """Content hash of every file in the work directory, by relative path"""
+        files = {}
+        for root, dirs, names in os.walk(self.work_dir):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in names:
+                path = os.path.join(root, name)
+                if name.startswith((".", CODE_FILE_PREFIX)) or os.path.islink(path):
+                    continue
+                stat = os.stat(path)
+                cached = self._file_digests.get(path)
+                if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+                    cached = (stat.st_size, stat.st_mtime_ns, hash_file(path))
+                    self._file_digests[path] = cached
+                files[os.path.relpath(path, self.work_dir)] = cached[2]
+        return files
+
+    def _index_path(self, code_key: str) -> str:
+        return os.path.join(self.cache_dir, code_key[:2], f"{code_key}.json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", digest[:2], digest)
+
+    def _load_runs(self, code_key: str) -> List[dict]:
+        try:
+            with open(self._index_path(code_key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable execution cache entry: {str(e)}")
+            return []
+
+    @staticmethod
+    def _matches(run: dict, files: Dict[str, str]) -> bool:
+        created = {path for path in run["artifacts"] if path not in run["inputs"]}
+        # Files the run created may be there from an earlier run, with the same content
+        for path in created:
+            if files.get(path, run["artifacts"][path]) != run["artifacts"][path]:
+                return False
+        return {path: digest for path, digest in files.items() if path not in created} == run["inputs"]
+
+    def _find(self, code_key: str, files: Dict[str, str]) -> Optional[dict]:
+        for run in self._load_runs(code_key):
+            if self._matches(run, files):
+                # Keeps entries in use from expiring
+                os.utime(self._index_path(code_key))
+                return run
+        return None
+
+    def _restore(self, run: dict, files: Dict[str, str]):
+        for path, digest in run["artifacts"].items():
+            if files.get(path) == digest:
+                continue
+            target = self.work_dir / path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(self._blob_path(digest), target)
+
+    def _store(self, code_key: str, inputs: Dict[str, str], result: CommandLineCodeResult):
+        files = self.snapshot()
+        artifacts = {path: digest for path, digest in files.items() if inputs.get(path) != digest}
+        for path, digest in artifacts.items():
+            blob = self._blob_path(digest)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                shutil.copyfile(self.work_dir / path, blob)
+
+        run = {"inputs": inputs, "artifacts": artifacts, "output": result.output, "code_file": result.code_file}
+        runs = [run, *self._load_runs(code_key)][:self.max_runs]
+        index_path = self._index_path(code_key)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(runs, f)
+
+    def collect_garbage(self, max_age: float = MAX_ENTRY_AGE):
+        """Delete expired entries and the stored files no remaining entry refers to"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        expires = time.time() - max_age
+        referenced = set()
+        for root, dirs, names in os.walk(self.cache_dir):
+            dirs[:] = [name for name in dirs if name != "blobs"]
+            for name in names:
+                path = os.path.join(root, name)
+                if not name.endswith(".json"):
+                    continue
+                if os.path.getmtime(path) < expires:
+                    os.remove(path)
+                    continue
+                for run in self._load_runs(name[:-5]):
+                    referenced.update(run["artifacts"].values())
+
+        removed = 0
+        for root, _, names in os.walk(os.path.join(self.cache_dir, "blobs")):
+            for name in names:
+                if name not in referenced:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        if removed:
+            print(f"Removed {removed} unused file(s) from the execution cache")
+
+    @staticmethod
+    def changes_environment(code_blocks: List[CodeBlock]) -> bool:
+        return any(
+            block.language.lower() in UNCACHEABLE_LANGUAGES or INSTALL_PATTERN.search(block.code)
+            for block in code_blocks
+        )
+
+    @staticmethod
+    def is_cacheable(code_blocks: List[CodeBlock]) -> bool:
+        return not any(
+            block.language.lower() in UNCACHEABLE_LANGUAGES
+            or NO_CACHE_MARKER in block.code
+            or INSTALL_PATTERN.search(block.code)
+            for block in code_blocks
+        )
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        if getattr(self.executor, "kernel", False) or not self.is_cacheable(code_blocks):
+            if self.changes_environment(code_blocks):
+                # Later runs in this container start from a different environment
+                self._environment.append([[block.language, block.code] for block in code_blocks])
+            return self.executor.execute_code_blocks(code_blocks)
+
+        code_key = self._code_key(code_blocks)
+        inputs = self.snapshot()
+        run = self._find(code_key, inputs)
+        if run is not None:
+            try:
+                self._restore(run, inputs)
+                self.hits += 1
+                print("Reusing the result of an identical earlier run")
+                return CommandLineCodeResult(exit_code=0, output=run["output"], code_file=run["code_file"])
+            except OSError as e:
+                # E.g. a stored file removed by another process's cleanup, run the code instead
+                print(f"Error restoring cached execution result: {str(e)}")
+
+        self.misses += 1
+        result = self.executor.execute_code_blocks(code_blocks)
+        # Failures are worth retrying, e.g. after a timeout or a flaky download
+        if result.exit_code == 0:
+            try:
+                self._store(code_key, inputs, result)
+            except OSError as e:
+                print(f"Error caching execution result: {str(e)}")
+        return result
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def restart(self):
+        self.executor.restart()
+        self._environment = []
+
+    def stop(self):
+        # Only containers in the image's state go back to the pool
+        if self._environment:
+            self.executor.restart()
+            self._environment = []
+        self.executor.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,62 @@
+import asyncio
+import importlib.util
+import os
+import random
+import weakref
+from typing import Optional
+import httpx
+
+# Constants
+TIMEOUT = httpx.Timeout(float(os.getenv("http_timeout", 10)), connect=float(os.getenv("http_connect_timeout", 5)))
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+RETRIES = int(os.getenv("http_retries", 2))
+RETRY_BACKOFF = 0.25  # seconds, doubled after every attempt
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# One client per event loop, since httpx connections can't move between loops
+_clients = weakref.WeakKeyDictionary()
+
+def create_client(**kwargs) -> httpx.AsyncClient:
+    options = {"http2": HTTP2, "timeout": TIMEOUT, "limits": LIMITS, "follow_redirects": True}
+    options.update(kwargs)
+    return httpx.AsyncClient(**options)
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared keep-alive client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = create_client()
+    return client
+
+async def close_client():
+    """Close the shared client of the running event loop, e.g. on shutdown"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+async def get_json(
+    url: str,
+    params: Optional[dict] = None,
+    retries: int = RETRIES,
+    client: Optional[httpx.AsyncClient] = None
+):
+    """GET a JSON document over the shared connection pool.
+
+    Connection errors, timeouts and 429/5xx responses are retried with
+    exponential backoff; other HTTP errors are raised immediately.
+    """
+    client = client or get_client()
+    for attempt in range(retries + 1):
+        try:
+            response = await client.get(url, params=params)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                response.raise_for_status()
+                return response.json()
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        # Jitter keeps concurrent callers from retrying in lockstep
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * (0.5 + random.random()))
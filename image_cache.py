@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Constants
+CACHE_DIR = "output/cache/images"
+MAX_MEMORY_BYTES = 256 * 1024 * 1024
+MAX_DISK_BYTES = 2 * 1024 * 1024 * 1024
+
+class ImageCache:
+    """Content-addressed cache of encoded images with an in-memory LRU and an on-disk tier.
+
+    Keys are hashes of every parameter that affects the output, so a hit is
+    only possible for deterministic generations (fixed seed). Both tiers evict
+    least recently used entries once their byte budget is exceeded.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = CACHE_DIR,
+        max_memory_bytes: int = MAX_MEMORY_BYTES,
+        max_disk_bytes: int = MAX_DISK_BYTES
+    ):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._load_disk_index()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: str,
+        negative_prompt: Optional[str],
+        width: int,
+        height: int,
+        steps: int,
+        guidance: float,
+        seed: int,
+        image_format: str = "png",
+        png_compress_level: Optional[int] = None,
+        webp_quality: Optional[int] = None
+    ) -> str:
+        """Hash the generation parameters, output format and encoder settings into a cache key"""
+        # Only the setting of the requested format changes its bytes
+        encoder_setting = png_compress_level if image_format == "png" else webp_quality
+        payload = json.dumps([model, prompt, negative_prompt, width, height, steps, guidance, seed, image_format, encoder_setting])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        # Shard by prefix so no single directory grows too large
+        return os.path.join(self.cache_dir, key[:2], f"{key}.bin")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU order from file modification times"""
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".bin"):
+                        continue
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes, promoting disk hits into memory"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                # Keep the disk order in step, or hot entries are the first to leave the disk
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.hits_memory += 1
+                return data
+
+            if key not in self._disk:
+                self.misses += 1
+                return None
+
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._put_memory(key, data)
+            self.hits_disk += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store bytes in both tiers"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._put_memory(key, data)
+            self._forget_disk(key)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and tier sizes"""
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes
+        }
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from PIL import Image
+
+# Constants
+MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp"
+}
+PNG_COMPRESS_LEVEL = 1  # 0-9, higher is smaller but slower
+WEBP_QUALITY = 80  # 0-100, 100 with lossless=True is lossless
+
+def encode_image(
+    image: Image.Image,
+    image_format: str = "png",
+    png_compress_level: int = PNG_COMPRESS_LEVEL,
+    webp_quality: int = WEBP_QUALITY
+) -> bytes:
+    """Encode a PIL image in memory"""
+    if image_format not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported image format '{image_format}', expected one of {list(MEDIA_TYPES)}")
+
+    buffered = BytesIO()
+    if image_format == "png":
+        image.save(buffered, format="PNG", compress_level=png_compress_level)
+    else:
+        image.save(buffered, format="WEBP", quality=webp_quality, method=4)
+    return buffered.getvalue()
+
+def safe_filename(prompt: str, max_length: int = 50) -> str:
+    """Clean prompt for filename"""
+    return "".join(x for x in prompt if x.isalnum() or x in " -_")[:max_length]
+
+def image_path(data: bytes, output_dir: str, prompt: str, extension: str = "png") -> str:
+    """Return the content-addressed path for image bytes.
+
+    Files are named after a hash of their content and sharded into two levels
+    of subdirectories, e.g. ``output_dir/3f/a2/3fa2..._a cat.png``, so naming
+    never has to list the directory and no directory grows unbounded.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    filename = f"{digest}_{safe_filename(prompt)}.{extension}"
+    return os.path.join(output_dir, digest[:2], digest[2:4], filename)
+
+def save_image_bytes(data: bytes, output_dir: str, prompt: str, extension: str = "png") -> str:
+    """Write already encoded image bytes under their content-addressed path"""
+    filepath = image_path(data, output_dir, prompt, extension)
+    shard_dir = os.path.dirname(filepath)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    # Identical bytes map to the same file, which is already complete if it exists
+    if os.path.exists(filepath):
+        return filepath
+
+    # Write to a unique temp file and rename, so concurrent writers never see partial files
+    fd, tmp_path = tempfile.mkstemp(dir=shard_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return filepath
@@ -0,0 +1,184 @@
+import glob
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Any, Callable, List, Optional
+
+NUMA_NODE_DIR = "/sys/devices/system/node"
+
+class ExecutorBusy(Exception):
+    """Raised when the admission queue is full"""
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ExecutorUnavailable(ExecutorBusy):
+    """Raised when no worker can accept requests"""
+    status_code = 503
+
+def _parse_cpulist(cpulist: str) -> List[int]:
+    """Parse a kernel cpulist such as '0-3,8-11'"""
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def get_numa_cpus() -> List[List[int]]:
+    """Return the CPUs of each NUMA node, or a single group with all CPUs"""
+    nodes = []
+    for path in sorted(glob.glob(os.path.join(NUMA_NODE_DIR, "node[0-9]*", "cpulist"))):
+        try:
+            with open(path) as f:
+                cpus = _parse_cpulist(f.read())
+        except OSError:
+            continue
+        if cpus:
+            nodes.append(cpus)
+
+    if not nodes:
+        nodes = [list(range(os.cpu_count() or 1))]
+    return nodes
+
+class InferenceExecutor:
+    """Pool of worker threads that each own a pipeline instance.
+
+    Every worker builds its own pipeline with ``factory`` and is pinned to one
+    group of CPUs (one NUMA node by default), so workers don't fight over cores
+    or memory bandwidth. Pipelines are loaded in the background after ``start``
+    and optionally warmed up with ``warmup(pipeline)``; ``status`` reports
+    loading, ready or failed. Jobs are called as ``fn(pipeline, *args)``.
+
+    Until one pipeline has loaded, workers call ``factory`` one at a time: the
+    first load may export, optimize or quantize the model into files that all
+    workers share.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        num_workers: Optional[int] = None,
+        warmup: Optional[Callable[[Any], None]] = None
+    ):
+        self.factory = factory
+        self.warmup = warmup
+        cpu_groups = get_numa_cpus()
+        self.num_workers = num_workers or len(cpu_groups)
+        self._cpu_groups = self._split_cpus(cpu_groups, self.num_workers)
+        self._jobs = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._states = ["loading"] * self.num_workers
+        self._errors = {}
+        self._load_lock = threading.Lock()
+        self._loaded_once = False
+
+    @staticmethod
+    def _split_cpus(cpu_groups: List[List[int]], num_workers: int) -> List[List[int]]:
+        """Assign NUMA nodes to workers, or split the cores evenly if there are more workers than nodes"""
+        if num_workers <= len(cpu_groups):
+            return [sum(cpu_groups[i::num_workers], []) for i in range(num_workers)]
+
+        cpus = sum(cpu_groups, [])
+        per_worker = max(1, len(cpus) // num_workers)
+        return [cpus[i * per_worker:(i + 1) * per_worker] or cpus for i in range(num_workers)]
+
+    @property
+    def busy_workers(self) -> int:
+        return self._busy
+
+    @property
+    def status(self) -> str:
+        """'ready' once any worker can serve, 'failed' if none can, else 'loading'"""
+        if "ready" in self._states:
+            return "ready"
+        if "loading" in self._states:
+            return "loading"
+        return "failed"
+
+    def readiness(self) -> dict:
+        """Return the overall status plus each worker's state and load errors"""
+        return {
+            "status": self.status,
+            "workers": list(self._states),
+            "errors": {str(worker_id): error for worker_id, error in self._errors.items()}
+        }
+
+    def start(self):
+        """Start the worker threads"""
+        for worker_id in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker,
+                args=(worker_id,),
+                name=f"inference-{worker_id}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self):
+        """Stop the workers once they finish their current job"""
+        for _ in self._threads:
+            self._jobs.put(None)
+        self._threads = []
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Run ``fn(pipeline, *args)`` on the next free worker"""
+        future = Future()
+        self._jobs.put((fn, args, future))
+        return future
+
+    def _worker(self, worker_id: int):
+        # Pin before building the pipeline so its thread pools inherit the affinity
+        cpus = self._cpu_groups[worker_id]
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, cpus)
+            except OSError as e:
+                print(f"Worker {worker_id}: could not pin to CPUs {cpus}: {str(e)}")
+
+        try:
+            started = time.perf_counter()
+            with self._load_lock if not self._loaded_once else nullcontext():
+                pipeline = self.factory()
+                self._loaded_once = True
+            if self.warmup is not None:
+                self.warmup(pipeline)
+        except Exception as e:
+            self._states[worker_id] = "failed"
+            self._errors[worker_id] = str(e)
+            print(f"Worker {worker_id} failed to load: {str(e)}")
+            return
+
+        self._states[worker_id] = "ready"
+        print(f"Worker {worker_id} ready on {len(cpus)} CPUs after {time.perf_counter() - started:.1f}s")
+
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            fn, args, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            with self._lock:
+                self._busy += 1
+            try:
+                future.set_result(fn(pipeline, *args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._busy -= 1
@@ -0,0 +1,102 @@
+import functools
+import os
+import threading
+from typing import Iterator, List, Optional
+
+# Constants
+# "remote" (any OpenAI-compatible endpoint, default) or "llama_cpp" (GGUF model on the CPU, in process)
+LLM_BACKEND = os.getenv("llm_backend", "remote")
+LLAMA_MODEL_PATH = os.getenv("llama_model_path", "models/llama-3.1-8b-instruct-q4_k_m.gguf")
+LLAMA_CONTEXT = int(os.getenv("llama_context", 4096))
+LLAMA_THREADS = int(os.getenv("llama_threads", os.cpu_count() or 1))
+# Understands the OpenAI tools format and answers with tool calls
+LLAMA_CHAT_FORMAT = os.getenv("llama_chat_format", "chatml-function-calling")
+# Evaluated prompt prefixes kept in RAM, e.g. one per voice session
+LLAMA_CACHE_BYTES = int(os.getenv("llama_cache_mb", 1024)) * 2 ** 20
+
+@functools.lru_cache(maxsize=None)
+def load_llama_model(model_path: str, n_ctx: int, n_threads: int, chat_format: str):
+    """Load a GGUF model once per process, with a prompt state cache"""
+    from llama_cpp import Llama, LlamaRAMCache
+
+    print(f"Loading llama.cpp model from {model_path}...")
+    model = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, chat_format=chat_format, verbose=False)
+    # llama.cpp already reuses the common prefix with the previous prompt. The
+    # RAM cache also keeps the states of other prefixes, so sessions taking
+    # turns don't evict each other's evaluated history.
+    model.set_cache(LlamaRAMCache(capacity_bytes=LLAMA_CACHE_BYTES))
+    return model
+
+def _as_dict(message) -> dict:
+    # Assistant messages from a previous response come back as OpenAI objects
+    if hasattr(message, "model_dump"):
+        return message.model_dump(exclude_none=True)
+    return message
+
+class LlamaCppCompletions:
+    """``chat.completions`` of an OpenAI client, answered by a local llama.cpp model.
+
+    Responses are parsed into the openai package's types, so callers can't tell
+    the difference. The model evaluates one prompt at a time; concurrent
+    requests wait for the lock, streams hold it until they are consumed.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+
+    def create(self, messages: List[dict], model: Optional[str] = None, stream: bool = False, **kwargs):
+        from openai.types.chat import ChatCompletion
+
+        messages = [_as_dict(message) for message in messages]
+        if stream:
+            return self._stream(messages, kwargs)
+        with self._lock:
+            response = self.model.create_chat_completion(messages=messages, **kwargs)
+        return ChatCompletion.model_validate(response)
+
+    def _stream(self, messages: List[dict], kwargs: dict) -> Iterator:
+        from openai.types.chat import ChatCompletionChunk
+
+        with self._lock:
+            for chunk in self.model.create_chat_completion(messages=messages, stream=True, **kwargs):
+                yield ChatCompletionChunk.model_validate(chunk)
+
+class LlamaCppClient:
+    """Drop-in for ``openai.OpenAI`` backed by an in-process GGUF model"""
+
+    # Tells Conversation not to summarize in the background, the model runs one request at a time
+    local = True
+
+    def __init__(
+        self,
+        model_path: str = LLAMA_MODEL_PATH,
+        n_ctx: int = LLAMA_CONTEXT,
+        n_threads: int = LLAMA_THREADS,
+        chat_format: str = LLAMA_CHAT_FORMAT
+    ):
+        self.model = load_llama_model(model_path, n_ctx, n_threads, chat_format)
+        self.completions = LlamaCppCompletions(self.model)
+        self.chat = self
+
+    def warm_up(self, messages: List[dict], tools: Optional[List[dict]] = None):
+        """Evaluate the static prompt prefix (system prompt and tools) before the first turn"""
+        self.completions.create(messages=messages, tools=tools, max_tokens=1)
+
+def create_llm_client(name: str = LLM_BACKEND, base_url: Optional[str] = None, api_key: Optional[str] = None):
+    if name == "remote":
+        from openai import OpenAI
+
+        return OpenAI(base_url=base_url, api_key=api_key)
+    if name == "llama_cpp":
+        return LlamaCppClient()
+    raise ValueError(f"Unknown LLM backend '{name}', expected 'remote' or 'llama_cpp'")
+
+def warm_up(client, system_prompt: str, tools: Optional[List[dict]] = None):
+    """Get the system prompt into the KV cache of a local model, no-op for remote APIs"""
+    if not hasattr(client, "warm_up"):
+        return
+    try:
+        client.warm_up([{"role": "system", "content": system_prompt}, {"role": "user", "content": ""}], tools)
+    except Exception as e:
+        print(f"Error warming up the model: {str(e)}")
@@ -0,0 +1,266 @@
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
+from PIL import Image
+import torch
+import diffusers
+from diffusers.pipelines.stable_diffusion_xl import StableDiffusionXLPipelineOutput
+from diffusers.utils.torch_utils import randn_tensor
+import onnxruntime as ort
+from transformers import CLIPTokenizer
+
+# Constants
+OPTIMIZED_MODEL_NAME = "model.optimized.onnx"
+DEFAULT_VAE_SCALING_FACTOR = 0.13025  # SDXL VAE
+ORT_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(int32)": np.int32,
+    "tensor(int64)": np.int64
+}
+
+_env_allocator_registered = False
+
+def register_env_allocator() -> bool:
+    """Register one shared CPU arena so all sessions reuse the same memory pool"""
+    global _env_allocator_registered
+
+    if _env_allocator_registered:
+        return True
+    try:
+        memory_info = ort.OrtMemoryInfo("Cpu", ort.OrtAllocatorType.ORT_ARENA_ALLOCATOR, 0, ort.OrtMemType.DEFAULT)
+        # No size limit, grow by what is requested instead of the next power of two
+        arena_cfg = ort.OrtArenaCfg(0, 1, -1, -1)
+        ort.create_and_register_allocator(memory_info, arena_cfg)
+        _env_allocator_registered = True
+    except Exception as e:
+        print(f"Could not register shared ONNX Runtime allocator: {str(e)}")
+    return _env_allocator_registered
+
+def default_intra_op_threads() -> int:
+    """Use every CPU this thread is allowed to run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+class OrtSDXLPipeline:
+    """SDXL text-to-image pipeline running the exported models with ONNX Runtime.
+
+    Expects the layout written by optimum's exporter: one folder per component
+    with a ``model.onnx``. Tokenization, noise sampling and the scheduler stay
+    in Python; the text encoders, UNet and VAE decoder run as CPU inference
+    sessions. ``unet_component`` selects an alternative UNet folder, such as a
+    quantized one. The call signature mirrors ``StableDiffusionXLPipeline`` so
+    both can be used interchangeably.
+    """
+
+    def __init__(
+        self,
+        onnx_dir: str,
+        tokenizer: CLIPTokenizer,
+        tokenizer_2: CLIPTokenizer,
+        scheduler,
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: int = 1,
+        providers: Optional[List[str]] = None,
+        unet_component: str = "unet"
+    ):
+        self.onnx_dir = onnx_dir
+        self.tokenizer = tokenizer
+        self.tokenizer_2 = tokenizer_2
+        self.scheduler = scheduler
+        self.intra_op_threads = intra_op_threads or default_intra_op_threads()
+        self.inter_op_threads = inter_op_threads
+        self.providers = providers or ['CPUExecutionProvider']
+        self.use_env_allocator = register_env_allocator()
+
+        self.text_encoder = self._load_session("text_encoder")
+        self.text_encoder_2 = self._load_session("text_encoder_2")
+        self.unet = self._load_session(unet_component)
+        self.vae_decoder = self._load_session("vae_decoder")
+
+        self.unet_inputs = {i.name: ORT_DTYPES.get(i.type, np.float32) for i in self.unet.get_inputs()}
+        self.vae_scaling_factor = self._read_config("vae_decoder/config.json").get("scaling_factor", DEFAULT_VAE_SCALING_FACTOR)
+        self.force_zeros_for_empty_prompt = self._read_config("model_index.json").get("force_zeros_for_empty_prompt", True)
+
+    @classmethod
+    def from_pretrained(cls, onnx_dir: str, model_path: str, **kwargs) -> "OrtSDXLPipeline":
+        """Load the sessions from onnx_dir and the tokenizers and scheduler from the original model"""
+        tokenizer = CLIPTokenizer.from_pretrained(model_path, subfolder="tokenizer")
+        tokenizer_2 = CLIPTokenizer.from_pretrained(model_path, subfolder="tokenizer_2")
+        scheduler_config = diffusers.EulerAncestralDiscreteScheduler.load_config(model_path, subfolder="scheduler")
+        scheduler = getattr(diffusers, scheduler_config["_class_name"]).from_config(scheduler_config)
+        return cls(onnx_dir, tokenizer, tokenizer_2, scheduler, **kwargs)
+
+    def _read_config(self, name: str) -> dict:
+        path = os.path.join(self.onnx_dir, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _session_options(self) -> ort.SessionOptions:
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.enable_cpu_mem_arena = True
+        options.enable_mem_pattern = True
+        options.enable_mem_reuse = True
+        if self.use_env_allocator:
+            options.add_session_config_entry("session.use_env_allocators", "1")
+        return options
+
+    def _load_session(self, component: str) -> ort.InferenceSession:
+        """Create a session, persisting the optimized graph on first load"""
+        component_dir = os.path.join(self.onnx_dir, component)
+        optimized_path = os.path.join(component_dir, OPTIMIZED_MODEL_NAME)
+        options = self._session_options()
+
+        if os.path.exists(optimized_path):
+            # Already optimized for this machine, skip the graph rewrites on load
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return ort.InferenceSession(optimized_path, sess_options=options, providers=self.providers)
+
+        # ENABLE_ALL includes hardware specific layouts, which is fine for a local cache
+        print(f"Optimizing {component} with ONNX Runtime")
+        tmp_path = optimized_path + ".tmp"
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.optimized_model_filepath = tmp_path
+        # The UNet is larger than the 2GB protobuf limit, so weights go to a side file
+        options.add_session_config_entry("session.optimized_model_external_initializers_file_name", OPTIMIZED_MODEL_NAME + ".data")
+        options.add_session_config_entry("session.optimized_model_external_initializers_min_size_in_bytes", "1024")
+
+        session = ort.InferenceSession(os.path.join(component_dir, "model.onnx"), sess_options=options, providers=self.providers)
+        os.replace(tmp_path, optimized_path)
+        return session
+
+    def _encode(self, session: ort.InferenceSession, tokenizer: CLIPTokenizer, prompts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the penultimate hidden states and the pooled output of one text encoder"""
+        input_ids = tokenizer(
+            prompts,
+            padding="max_length",
+            max_length=tokenizer.model_max_length,
+            truncation=True,
+            return_tensors="np"
+        ).input_ids
+
+        input_meta = session.get_inputs()[0]
+        outputs = session.run(None, {input_meta.name: input_ids.astype(ORT_DTYPES[input_meta.type])})
+        named = dict(zip([o.name for o in session.get_outputs()], outputs))
+
+        hidden_states = sorted(
+            (name for name in named if name.startswith("hidden_states.")),
+            key=lambda name: int(name.split(".")[1])
+        )
+        if len(hidden_states) < 2:
+            raise RuntimeError("Text encoder was exported without hidden states")
+
+        # SDXL conditions on the second to last layer
+        return named[hidden_states[-2]], named.get("text_embeds", outputs[0])
+
+    def encode_prompt(
+        self,
+        prompts: Optional[List[str]],
+        negative_prompt: Optional[Union[str, List[str]]] = None,
+        do_classifier_free_guidance: bool = False,
+        prompt_embeds: Optional[np.ndarray] = None,
+        pooled_prompt_embeds: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        """Encode prompts with both text encoders, like StableDiffusionXLPipeline.encode_prompt.
+
+        Precomputed ``prompt_embeds``/``pooled_prompt_embeds`` skip the text encoders for the prompts.
+        """
+        if prompt_embeds is None:
+            hidden, _ = self._encode(self.text_encoder, self.tokenizer, prompts)
+            hidden_2, pooled_prompt_embeds = self._encode(self.text_encoder_2, self.tokenizer_2, prompts)
+            prompt_embeds = np.concatenate([hidden, hidden_2], axis=-1)
+        elif pooled_prompt_embeds is None:
+            raise ValueError("pooled_prompt_embeds are required when passing prompt_embeds")
+
+        negative_prompt_embeds = None
+        negative_pooled_prompt_embeds = None
+        if do_classifier_free_guidance:
+            if negative_prompt is None and self.force_zeros_for_empty_prompt:
+                negative_prompt_embeds = np.zeros_like(prompt_embeds)
+                negative_pooled_prompt_embeds = np.zeros_like(pooled_prompt_embeds)
+            else:
+                negative_prompt = negative_prompt or ""
+                negative_prompts = [negative_prompt] * len(prompt_embeds) if isinstance(negative_prompt, str) else negative_prompt
+                negative_hidden, _ = self._encode(self.text_encoder, self.tokenizer, negative_prompts)
+                negative_hidden_2, negative_pooled_prompt_embeds = self._encode(self.text_encoder_2, self.tokenizer_2, negative_prompts)
+                negative_prompt_embeds = np.concatenate([negative_hidden, negative_hidden_2], axis=-1)
+
+        return prompt_embeds, pooled_prompt_embeds, negative_prompt_embeds, negative_pooled_prompt_embeds
+
+    def decode_latents(self, latents: np.ndarray) -> List[Image.Image]:
+        """Decode latents to PIL images one at a time to bound peak memory"""
+        input_name = self.vae_decoder.get_inputs()[0].name
+        latents = latents / self.vae_scaling_factor
+
+        images = []
+        for latent in latents:
+            sample = self.vae_decoder.run(None, {input_name: latent[None]})[0]
+            sample = np.clip(sample[0] / 2 + 0.5, 0, 1).transpose(1, 2, 0)
+            images.append(Image.fromarray((sample * 255).round().astype(np.uint8)))
+        return images
+
+    def __call__(
+        self,
+        prompt: Optional[Union[str, List[str]]] = None,
+        negative_prompt: Optional[Union[str, List[str]]] = None,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        generator: Optional[Union[torch.Generator, List[torch.Generator]]] = None,
+        prompt_embeds: Optional[np.ndarray] = None,
+        pooled_prompt_embeds: Optional[np.ndarray] = None,
+        callback_on_step_end: Optional[Callable[["OrtSDXLPipeline", int, Any, Dict[str, Any]], Dict[str, Any]]] = None
+    ) -> StableDiffusionXLPipelineOutput:
+        prompts = [prompt] if isinstance(prompt, str) else prompt
+        do_classifier_free_guidance = guidance_scale > 1.0
+
+        prompt_embeds, pooled_prompt_embeds, negative_prompt_embeds, negative_pooled_prompt_embeds = self.encode_prompt(
+            prompts, negative_prompt, do_classifier_free_guidance, prompt_embeds, pooled_prompt_embeds
+        )
+        batch_size = len(prompt_embeds)
+        # original size, crop offset and target size
+        time_ids = np.array([[height, width, 0, 0, height, width]] * batch_size, dtype=np.float32)
+
+        if do_classifier_free_guidance:
+            prompt_embeds = np.concatenate([negative_prompt_embeds, prompt_embeds])
+            pooled_prompt_embeds = np.concatenate([negative_pooled_prompt_embeds, pooled_prompt_embeds])
+            time_ids = np.concatenate([time_ids, time_ids])
+
+        # Sample noise with torch so seeds give the same images as the torch pipeline
+        self.scheduler.set_timesteps(num_inference_steps)
+        latents = randn_tensor((batch_size, 4, height // 8, width // 8), generator=generator, dtype=torch.float32)
+        latents = latents * self.scheduler.init_noise_sigma
+
+        for i, t in enumerate(self.scheduler.timesteps):
+            latent_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
+            latent_input = self.scheduler.scale_model_input(latent_input, t)
+
+            noise_pred = self.unet.run(None, {
+                "sample": latent_input.numpy().astype(self.unet_inputs["sample"]),
+                "timestep": np.array([float(t)], dtype=self.unet_inputs["timestep"]),
+                "encoder_hidden_states": prompt_embeds.astype(self.unet_inputs["encoder_hidden_states"]),
+                "text_embeds": pooled_prompt_embeds.astype(self.unet_inputs["text_embeds"]),
+                "time_ids": time_ids.astype(self.unet_inputs["time_ids"])
+            })[0]
+            noise_pred = torch.from_numpy(noise_pred).float()
+
+            if do_classifier_free_guidance:
+                noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+
+            latents = self.scheduler.step(noise_pred, t, latents, generator=generator).prev_sample
+
+            # Same contract as diffusers: the callback may inspect or replace the latents
+            if callback_on_step_end is not None:
+                outputs = callback_on_step_end(self, i, t, {"latents": latents})
+                latents = outputs.pop("latents", latents)
+
+        return StableDiffusionXLPipelineOutput(images=self.decode_latents(latents.numpy()))
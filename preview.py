@@ -0,0 +1,21 @@
+from typing import List
+from PIL import Image
+import torch
+
+# Linear approximation of the SDXL VAE decoder, mapping the 4 latent channels to RGB
+SDXL_LATENT_RGB_FACTORS = [
+    [0.3651, 0.4232, 0.4341],
+    [-0.2533, -0.0042, 0.1068],
+    [0.1076, 0.1111, -0.0362],
+    [-0.3165, -0.2492, -0.2188]
+]
+SDXL_LATENT_RGB_BIAS = [0.1084, -0.0175, -0.0011]
+
+def latents_to_previews(latents: torch.Tensor) -> List[Image.Image]:
+    """Turn a batch of SDXL latents into low resolution (1/8 size) RGB previews without the VAE"""
+    factors = torch.tensor(SDXL_LATENT_RGB_FACTORS, dtype=torch.float32, device=latents.device)
+    bias = torch.tensor(SDXL_LATENT_RGB_BIAS, dtype=torch.float32, device=latents.device)
+
+    rgb = torch.einsum("bchw,cr->bhwr", latents.float(), factors) + bias
+    rgb = ((rgb + 1) / 2).clamp(0, 1).mul(255).round().to(torch.uint8).cpu().numpy()
+    return [Image.fromarray(image) for image in rgb]
@@ -0,0 +1,68 @@
+import os
+import shutil
+from typing import Optional
+import torch
+
+# Supported quantization modes, None keeps fp32
+QUANTIZATION_MODES = (None, "int8")
+
+def check_quantization(quantization: Optional[str]):
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_MODES}")
+
+def quantize_onnx_component(onnx_dir: str, component: str = "unet") -> str:
+    """Quantize an exported component to dynamic INT8 and return the name of the cached component.
+
+    Only MatMul/Gemm weights are quantized: they dominate the UNet's
+    transformer blocks, while INT8 convolutions are slower than fp32 on
+    most CPUs with ONNX Runtime.
+    """
+    quantized_component = f"{component}-int8"
+    output_dir = os.path.join(onnx_dir, quantized_component)
+    if os.path.exists(output_dir):
+        return quantized_component
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"Quantizing {component} to INT8 in {output_dir}")
+    tmp_dir = output_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        quantize_dynamic(
+            model_input=os.path.join(onnx_dir, component, "model.onnx"),
+            model_output=os.path.join(tmp_dir, "model.onnx"),
+            op_types_to_quantize=["MatMul", "Gemm"],
+            per_channel=True,
+            weight_type=QuantType.QInt8,
+            use_external_data_format=True,
+            extra_options={"MatMulConstBOnly": True}
+        )
+        # Keep the component config (e.g. VAE scaling factor) next to the model
+        config_path = os.path.join(onnx_dir, component, "config.json")
+        if os.path.exists(config_path):
+            shutil.copy(config_path, tmp_dir)
+        os.replace(tmp_dir, output_dir)
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise RuntimeError(f"Failed to quantize {component}: {str(e)}")
+
+    return quantized_component
+
+def load_quantized_unet(cache_path: str) -> Optional[torch.nn.Module]:
+    """Load a cached dynamically quantized UNet, or None if there is none yet"""
+    if not os.path.exists(cache_path):
+        return None
+    return torch.load(cache_path, weights_only=False)
+
+def quantize_torch_unet(unet: torch.nn.Module, cache_path: str) -> torch.nn.Module:
+    """Apply dynamic INT8 quantization to the UNet's linear layers and cache the result"""
+    print(f"Quantizing UNet linear layers to INT8, caching in {cache_path}")
+    quantized = torch.ao.quantization.quantize_dynamic(unet, {torch.nn.Linear}, dtype=torch.qint8)
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    torch.save(quantized, tmp_path)
+    os.replace(tmp_path, cache_path)
+    return quantized
@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Callable, Iterator, NamedTuple, Optional
+
+# Constants
+# Answer simple questions (time, date, IP, location) from templates without the model
+ROUTER_ENABLED = os.getenv("router_enabled", "1") == "1"
+WEEKDAYS = {
+    "Monday": "Montag",
+    "Tuesday": "Dienstag",
+    "Wednesday": "Mittwoch",
+    "Thursday": "Donnerstag",
+    "Friday": "Freitag",
+    "Saturday": "Samstag",
+    "Sunday": "Sonntag"
+}
+MONTHS = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober", "November", "Dezember"]
+# Politeness around the question, e.g. "Hey, sag mir bitte wie spät es ist"
+PREFIX = r"(?:(?:hallo|hey|hi|okay|ok)\s+)?(?:(?:sag|sage|verrate)\s+(?:du\s+)?mir\s+)?(?:bitte\s+|mal\s+|doch\s+)*"
+SUFFIX = r"(?:\s+(?:bitte|denn|gerade|jetzt|eigentlich))*"
+
+def format_time(result: dict) -> str:
+    hour, minute, _ = result["time"].split(":")
+    return f"Es ist {int(hour)}:{minute} Uhr."
+
+def format_date(result: dict) -> str:
+    date = datetime.strptime(result["date"], "%Y-%m-%d")
+    weekday = WEEKDAYS.get(result["weekday"], result["weekday"])
+    return f"Heute ist {weekday}, der {date.day}. {MONTHS[date.month - 1]} {date.year}."
+
+def format_ip(result: dict) -> str:
+    return f"Ihre öffentliche IP-Adresse ist {result['public_ip']}, Ihre lokale IP-Adresse ist {result['local_ip']}."
+
+def format_location(result: dict) -> str:
+    place = ", ".join(part for part in (result.get("city"), result.get("region"), result.get("country")) if part)
+    if not place:
+        raise ValueError("Location without a place name")
+    return f"Sie befinden sich ungefähr in {place}."
+
+class Intent(NamedTuple):
+    """A question pattern answered by one tool and a German template"""
+    name: str
+    pattern: re.Pattern
+    tool: str
+    template: Callable[[dict], str]
+
+def intent(name: str, questions: str, tool: str, template: Callable[[dict], str]) -> Intent:
+    return Intent(name, re.compile(f"{PREFIX}(?:{questions}){SUFFIX}"), tool, template)
+
+# Only whole utterances match, so "Wie viele Tage sind es bis Weihnachten?" still goes to the model
+INTENTS = [
+    intent("time", r"wie spät ist es|wie spät es ist|wie spät|wie ?viel uhr ist es|wie ?viel uhr es ist|welche uhrzeit (?:haben wir|ist es)|uhrzeit",
+           "get_current_date", format_time),
+    intent("date", r"welcher tag ist heute|welcher tag heute ist|welches datum (?:haben wir|ist heute)(?: heute)?|welcher wochentag ist heute|"
+                   r"was ist heute für ein tag|der wievielte ist heute|den wievielten haben wir heute|datum", "get_current_date", format_date),
+    intent("ip", r"(?:wie|was) ist meine (?:öffentliche )?ip(?: adresse)?|meine ip(?: adresse)?", "get_ip", format_ip),
+    intent("location", r"wo bin ich|wo ich bin|wo befinde ich mich|in welcher stadt bin ich", "location", format_location)
+]
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("-", " ")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def match_intent(user_input: str) -> Optional[Intent]:
+    text = normalize(user_input)
+    for candidate in INTENTS:
+        if candidate.pattern.fullmatch(text):
+            return candidate
+    return None
+
+def route(user_input: str, metrics: Optional["TurnMetrics"] = None, dispatcher=None) -> Optional[str]:
+    """Answer the input from a template if it is a simple question, else None for the model.
+
+    The tool runs on the dispatcher like any model-requested call, so it shares
+    its caches and timeouts. If it fails, the model gets the question instead.
+    """
+    if not ROUTER_ENABLED:
+        return None
+    matched = match_intent(user_input)
+    if matched is None:
+        return None
+
+    if dispatcher is None:
+        from tool_dispatcher import get_tool_dispatcher
+
+        dispatcher = get_tool_dispatcher()
+    result = dispatcher.run(dispatcher.call(matched.tool, {}))
+    if metrics is not None:
+        metrics.tool_calls += 1
+    if "error" in result:
+        return None
+    try:
+        answer = matched.template(result)
+    except (KeyError, ValueError) as e:
+        print(f"Error filling template for '{matched.name}': {str(e)}")
+        return None
+    if metrics is not None:
+        metrics.route = f"template:{matched.name}"
+    return answer
+
+def current_context() -> dict:
+    """Date and time as a message after the history, so the model needn't call get_current_date"""
+    now = datetime.now()
+    weekday = WEEKDAYS[now.strftime("%A")]
+    return {"role": "system", "content": f"Aktuell: {weekday}, {now.strftime('%Y-%m-%d %H:%M')} Uhr (Ortszeit)."}
+
+class TurnMetrics:
+    """How many LLM requests a turn needed and how long they took"""
+
+    def __init__(self):
+        self.route = "llm"
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.first_token_seconds = None
+        self.tool_calls = 0
+        self.started = time.perf_counter()
+
+    def completion(self, client, **kwargs):
+        """Create a chat completion and count it, the whole request for non-streaming calls"""
+        self.llm_calls += 1
+        started = time.perf_counter()
+        response = client.chat.completions.create(**kwargs)
+        self.llm_seconds += time.perf_counter() - started
+        if kwargs.get("stream"):
+            return self._timed(response)
+        return response
+
+    def _timed(self, stream) -> Iterator:
+        # Only time spent waiting for chunks counts, not the caller's work in between
+        chunks = iter(stream)
+        while True:
+            waited = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                self.llm_seconds += time.perf_counter() - waited
+                return
+            self.llm_seconds += time.perf_counter() - waited
+            if self.first_token_seconds is None and chunk.choices and chunk.choices[0].delta.content:
+                self.first_token_seconds = time.perf_counter() - self.started
+            yield chunk
+
+    def as_dict(self) -> dict:
+        return {
+            "route": self.route,
+            "llm_calls": self.llm_calls,
+            "llm_ms": round(self.llm_seconds * 1000),
+            "first_token_ms": round(self.first_token_seconds * 1000) if self.first_token_seconds is not None else None,
+            "tool_calls": self.tool_calls,
+            "turn_ms": round((time.perf_counter() - self.started) * 1000)
+        }
+
+    def __str__(self) -> str:
+        return json.dumps(self.as_dict())
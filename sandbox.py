@@ -0,0 +1,435 @@
+import hashlib
+import io
+import json
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+import docker
+from autogen.coding import CodeBlock, MarkdownCodeExtractor
+from autogen.coding.base import CommandLineCodeResult
+
+# Constants
+# Preinstalled in the sandbox image, so code blocks rarely start with pip install
+SANDBOX_PACKAGES = os.getenv("sandbox_packages", "numpy,pandas,matplotlib,requests,beautifulsoup4").split(",")
+SANDBOX_IMAGE_REPOSITORY = "agent-sandbox"
+# Containers kept started and waiting for the next session
+POOL_SIZE = int(os.getenv("sandbox_pool_size", 2))
+# Recycle a container after this many sessions or seconds, whichever comes first
+MAX_USES = int(os.getenv("sandbox_max_uses", 20))
+MAX_AGE = float(os.getenv("sandbox_max_age", 3600))
+# Leave idle containers running on exit, the next run adopts them
+KEEP_WARM = os.getenv("sandbox_keep_warm", "1") == "1"
+# Volume shared by all sandboxes and runs, packages installed at runtime are downloaded once
+PIP_CACHE_VOLUME = "agent-pip-cache"
+PIP_CACHE_DIR = "/root/.cache/pip"
+WORKSPACE = "/workspace"
+LABEL = "agent-sandbox"
+STARTED_LABEL = f"{LABEL}.started"
+TIMEOUT_EXIT_CODE = 124
+LANGUAGE_COMMANDS = {
+    "python": "python",
+    "py": "python",
+    "bash": "sh",
+    "shell": "sh",
+    "sh": "sh"
+}
+LANGUAGE_EXTENSIONS = {"python": "py", "sh": "sh"}
+# Run Python blocks in one long-lived interpreter per session, so later blocks see earlier variables
+KERNEL_MODE = os.getenv("sandbox_kernel", "0") == "1"
+KERNEL_START_TIMEOUT = 10.0
+
+# Runs inside the sandbox: executes one JSON request per stdin line in a shared
+# namespace and answers with one JSON line on the original stdout. The cell's
+# stdout and stderr, including those of subprocesses, go to a temporary file.
+KERNEL_SOURCE = r"""
+import json, os, sys, tempfile, traceback
+protocol = os.fdopen(os.dup(1), "w")
+namespace = {"__name__": "__main__"}
+protocol.write(json.dumps({"pid": os.getpid()}) + "\n")
+protocol.flush()
+for line in sys.stdin:
+    code = json.loads(line)["code"]
+    exit_code = 0
+    with tempfile.TemporaryFile() as capture:
+        saved = os.dup(1), os.dup(2)
+        os.dup2(capture.fileno(), 1)
+        os.dup2(capture.fileno(), 2)
+        try:
+            exec(compile(code, "<cell>", "exec"), namespace)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+        capture.seek(0)
+        output = capture.read().decode("utf-8", "replace")
+    protocol.write(json.dumps({"exit_code": exit_code, "output": output}) + "\n")
+    protocol.flush()
+"""
+
+def ensure_image(client: docker.DockerClient, image: str):
+    """Return the local image, pulling it only if it isn't there yet"""
+    try:
+        return client.images.get(image)
+    except docker.errors.ImageNotFound:
+        print(f"Pulling {image}...")
+        return client.images.pull(image)
+
+def build_sandbox_image(client: docker.DockerClient, base_image: str, packages: List[str] = SANDBOX_PACKAGES) -> str:
+    """Build the base image with the common packages on top, once per base image and package list.
+
+    The tag is derived from both, so changing either builds a new image and an
+    unchanged setup never rebuilds.
+    """
+    packages = sorted(package.strip() for package in packages if package.strip())
+    digest = hashlib.sha256("\n".join([base_image, *packages]).encode("utf-8")).hexdigest()[:12]
+    tag = f"{SANDBOX_IMAGE_REPOSITORY}:{digest}"
+    try:
+        client.images.get(tag)
+        return tag
+    except docker.errors.ImageNotFound:
+        pass
+
+    ensure_image(client, base_image)
+    dockerfile = "\n".join([
+        f"FROM {base_image}",
+        "ENV PIP_DISABLE_PIP_VERSION_CHECK=1",
+        f"ENV PIP_CACHE_DIR={PIP_CACHE_DIR}",
+        f"RUN pip install --no-cache-dir {' '.join(packages)}" if packages else "",
+        f"WORKDIR {WORKSPACE}"
+    ])
+    print(f"Building sandbox image {tag} with {', '.join(packages) or 'no extra packages'}...")
+    client.images.build(fileobj=io.BytesIO(dockerfile.encode("utf-8")), tag=tag, rm=True)
+    return tag
+
+class Sandbox:
+    """One long-running container with the work directory mounted at /workspace"""
+
+    def __init__(self, container):
+        self.container = container
+        # Kept in a label, so the age of containers adopted from an earlier run is right
+        self.started = float(container.labels.get(STARTED_LABEL, time.time()))
+        self.uses = 0
+
+    @property
+    def id(self) -> str:
+        return self.container.short_id
+
+    def is_running(self) -> bool:
+        try:
+            self.container.reload()
+            return self.container.status == "running"
+        except docker.errors.NotFound:
+            return False
+
+    def run(self, command: List[str], timeout: float) -> Tuple[int, str]:
+        """Run a command with a timeout, return its exit code and combined output"""
+        exit_code, output = self.container.exec_run(
+            ["timeout", str(int(timeout)), *command],
+            workdir=WORKSPACE
+        )
+        return exit_code, output.decode("utf-8", errors="replace")
+
+    def remove(self):
+        try:
+            self.container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+
+class SandboxPool:
+    """Keeps sandbox containers started ahead of time and hands them out per session.
+
+    A released sandbox goes back to the pool until it has served ``max_uses``
+    sessions or is older than ``max_age`` seconds, then it is replaced by a
+    fresh one in the background. Containers are labelled with the image and
+    work directory, so with ``keep_warm`` the next run adopts them instead of
+    starting new ones.
+    """
+
+    def __init__(
+        self,
+        client: docker.DockerClient,
+        image: str,
+        work_dir: Path,
+        size: int = POOL_SIZE,
+        max_uses: int = MAX_USES,
+        max_age: float = MAX_AGE,
+        keep_warm: bool = KEEP_WARM
+    ):
+        self.client = client
+        self.image = image
+        self.work_dir = Path(work_dir).resolve()
+        self.size = size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.keep_warm = keep_warm
+        self.labels = {LABEL: image, f"{LABEL}.work_dir": str(self.work_dir)}
+        self._idle: List[Sandbox] = []
+        self._lock = threading.Lock()
+        self._warming = 0
+
+        self._adopt()
+        self._fill()
+
+    def _adopt(self):
+        """Take over running containers a previous run left warm"""
+        filters = {"label": [f"{key}={value}" for key, value in self.labels.items()], "status": "running"}
+        for container in self.client.containers.list(filters=filters):
+            if len(self._idle) < self.size:
+                self._idle.append(Sandbox(container))
+            else:
+                container.remove(force=True)
+        if self._idle:
+            print(f"Reusing {len(self._idle)} warm sandbox container(s)")
+
+    def _start(self) -> Sandbox:
+        container = self.client.containers.run(
+            self.image,
+            command=["sleep", "infinity"],
+            detach=True,
+            working_dir=WORKSPACE,
+            labels={**self.labels, STARTED_LABEL: str(time.time())},
+            volumes={
+                str(self.work_dir): {"bind": WORKSPACE, "mode": "rw"},
+                PIP_CACHE_VOLUME: {"bind": PIP_CACHE_DIR, "mode": "rw"}
+            }
+        )
+        return Sandbox(container)
+
+    def _fill(self):
+        """Start containers in the background until the pool is full again"""
+        with self._lock:
+            missing = self.size - len(self._idle) - self._warming
+            self._warming += max(0, missing)
+        for _ in range(max(0, missing)):
+            threading.Thread(target=self._warm_one, name="sandbox-warm", daemon=True).start()
+
+    def _warm_one(self):
+        try:
+            sandbox = self._start()
+        except Exception as e:
+            print(f"Error starting sandbox container: {str(e)}")
+            sandbox = None
+        with self._lock:
+            self._warming -= 1
+            # Released sandboxes may have filled the pool meanwhile
+            keep = sandbox is not None and len(self._idle) < self.size
+            if keep:
+                self._idle.append(sandbox)
+        if sandbox is not None and not keep:
+            sandbox.remove()
+
+    def acquire(self) -> Sandbox:
+        """Return a running sandbox, started on the spot only if none is warm"""
+        while True:
+            with self._lock:
+                sandbox = self._idle.pop() if self._idle else None
+            if sandbox is None:
+                sandbox = self._start()
+            elif not sandbox.is_running():
+                sandbox.remove()
+                continue
+            self._fill()
+            sandbox.uses += 1
+            return sandbox
+
+    def release(self, sandbox: Sandbox):
+        """Give a sandbox back, or recycle it if it is worn out"""
+        worn_out = sandbox.uses >= self.max_uses or time.time() - sandbox.started > self.max_age
+        with self._lock:
+            keep = not worn_out and len(self._idle) < self.size
+            if keep:
+                self._idle.append(sandbox)
+        if not keep:
+            self.discard(sandbox)
+
+    def discard(self, sandbox: Sandbox):
+        sandbox.remove()
+        self._fill()
+
+    def close(self):
+        """Stop the idle sandboxes, unless they are kept warm for the next run"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        if not self.keep_warm:
+            for sandbox in idle:
+                sandbox.remove()
+
+class SandboxKernel:
+    """A persistent Python interpreter in a sandbox, talked to over an attached exec socket"""
+
+    def __init__(self, sandbox: Sandbox):
+        self.sandbox = sandbox
+        api = sandbox.container.client.api
+        exec_id = api.exec_create(
+            sandbox.container.id,
+            ["python", "-u", "-c", KERNEL_SOURCE],
+            stdin=True,
+            workdir=WORKSPACE
+        )["Id"]
+        self._socket = api.exec_start(exec_id, socket=True)._sock
+        self._buffer = b""
+        self.pid = self._read_message(KERNEL_START_TIMEOUT)["pid"]
+
+    def _read_frame(self, deadline: float) -> Tuple[int, bytes]:
+        # Without a TTY, Docker prefixes every chunk with its stream and length
+        header = self._read_exactly(8, deadline)
+        stream, length = struct.unpack(">BxxxL", header)
+        return stream, self._read_exactly(length, deadline)
+
+    def _read_exactly(self, size: int, deadline: float) -> bytes:
+        data = b""
+        while len(data) < size:
+            self._socket.settimeout(max(0.01, deadline - time.monotonic()))
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Kernel exited")
+            data += chunk
+        return data
+
+    def _read_message(self, timeout: float) -> dict:
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            stream, data = self._read_frame(deadline)
+            if stream == 1:
+                self._buffer += data
+            else:
+                # Only the kernel itself writes to stderr, e.g. when it crashes
+                print(f"Kernel: {data.decode('utf-8', errors='replace').rstrip()}")
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def execute(self, code: str, timeout: float) -> Tuple[int, str]:
+        """Run code in the kernel's namespace, raise TimeoutError if it takes too long"""
+        self._socket.sendall((json.dumps({"code": code}) + "\n").encode("utf-8"))
+        try:
+            result = self._read_message(timeout)
+        except socket.timeout:
+            raise TimeoutError(f"Code execution exceeded {timeout} seconds")
+        return result["exit_code"], result["output"]
+
+    def close(self):
+        self.sandbox.run(["kill", "-9", str(self.pid)], timeout=5)
+        self._socket.close()
+
+def _file_name(code: str, extension: str) -> str:
+    # Same convention as autogen's executors: a "# filename: ..." first line names the file
+    match = re.match(r"^\s*#\s*filename:\s*([\w./-]+)", code)
+    if match and ".." not in match.group(1) and not match.group(1).startswith("/"):
+        return match.group(1)
+    return f"tmp_code_{hashlib.md5(code.encode('utf-8')).hexdigest()}.{extension}"
+
+class PooledDockerCodeExecutor:
+    """Code executor for autogen agents that runs in a sandbox from a SandboxPool.
+
+    Behaves like DockerCommandLineCodeExecutor (files in the work directory,
+    per-block timeout, stop at the first failing block), but the container is
+    taken from the pool on first use and given back on stop, so a session
+    doesn't wait for a container to start.
+
+    With ``kernel`` Python blocks run in one interpreter that lives as long as
+    the session, like notebook cells: data loaded by one block is still there
+    for the next. A timeout restarts the kernel and its state is lost.
+    """
+
+    def __init__(self, pool: SandboxPool, timeout: int, kernel: bool = KERNEL_MODE):
+        self.pool = pool
+        self.timeout = timeout
+        self.kernel = kernel
+        self.work_dir = pool.work_dir
+        self._sandbox: Optional[Sandbox] = None
+        self._kernel: Optional[SandboxKernel] = None
+
+    @property
+    def code_extractor(self) -> MarkdownCodeExtractor:
+        return MarkdownCodeExtractor()
+
+    @property
+    def sandbox(self) -> Sandbox:
+        if self._sandbox is None:
+            self._sandbox = self.pool.acquire()
+        return self._sandbox
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CommandLineCodeResult:
+        outputs = []
+        files = []
+        exit_code = 0
+        for code_block in code_blocks:
+            language = code_block.language.lower()
+            command = LANGUAGE_COMMANDS.get(language)
+            if command is None:
+                outputs.append(f"Unsupported language {language}")
+                exit_code = 1
+                break
+
+            file_name = _file_name(code_block.code, LANGUAGE_EXTENSIONS[command])
+            path = self.work_dir / file_name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(code_block.code, encoding="utf-8")
+            files.append(path)
+
+            if self.kernel and command == "python":
+                exit_code, output = self._run_in_kernel(code_block.code)
+            else:
+                exit_code, output = self.sandbox.run([command, file_name], self.timeout)
+            outputs.append(output)
+            if exit_code == TIMEOUT_EXIT_CODE:
+                outputs.append(f"Timeout: code execution exceeded {self.timeout} seconds")
+            if exit_code != 0:
+                break
+
+        return CommandLineCodeResult(
+            exit_code=exit_code,
+            output="".join(outputs),
+            code_file=str(files[-1]) if files else None
+        )
+
+    def _run_in_kernel(self, code: str) -> Tuple[int, str]:
+        if self._kernel is None:
+            self._kernel = SandboxKernel(self.sandbox)
+        try:
+            return self._kernel.execute(code, self.timeout)
+        except (TimeoutError, ConnectionError) as e:
+            self._close_kernel()
+            if isinstance(e, TimeoutError):
+                return TIMEOUT_EXIT_CODE, "Kernel restarted, variables from earlier blocks are lost\n"
+            return 1, f"Kernel died: {str(e)}, variables from earlier blocks are lost\n"
+
+    def _close_kernel(self):
+        if self._kernel is not None:
+            try:
+                self._kernel.close()
+            except Exception as e:
+                print(f"Error stopping kernel: {str(e)}")
+            self._kernel = None
+
+    def restart(self):
+        """Swap the sandbox for a fresh one, e.g. after the agent broke its environment"""
+        self._close_kernel()
+        if self._sandbox is not None:
+            self.pool.discard(self._sandbox)
+            self._sandbox = None
+
+    def stop(self):
+        # The kernel's state belongs to this session, the container can be reused
+        self._close_kernel()
+        if self._sandbox is not None:
+            self.pool.release(self._sandbox)
+            self._sandbox = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
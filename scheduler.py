@@ -0,0 +1,195 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Callable, List, Optional
+from inference import ExecutorBusy, ExecutorUnavailable, InferenceExecutor
+
+# Constants
+MAX_BATCH_SIZE = 4
+MAX_WAIT_MS = 50
+MAX_QUEUE = 32
+
+class BatchScheduler:
+    """Collect concurrent requests into batches and run them on an inference executor.
+
+    At most one batch per worker is in flight. Requests that arrive while all
+    workers are busy wait in a bounded queue and are admitted into the next
+    batch; once the queue is full, ``submit`` raises ``ExecutorBusy``.
+    ``item_size`` weighs requests that carry several images, so a batch holds
+    at most ``max_batch_size`` images; a single larger request runs alone.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[Any, List[Any]], List[Any]],
+        executor: InferenceExecutor,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        max_queue: int = MAX_QUEUE,
+        item_size: Callable[[Any], int] = lambda item: 1
+    ):
+        if max_queue < max_batch_size:
+            # Admission counts every pending request, a smaller queue could never fill a batch
+            raise ValueError(f"max_queue ({max_queue}) must be at least max_batch_size ({max_batch_size})")
+        self.run_batch = run_batch
+        self.item_size = item_size
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self._pending = deque()
+        self._in_flight = 0
+        self._batch_seconds = 1.0  # Moving average of batch latency, used for Retry-After
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        """Return queue and worker metrics"""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "workers": self.executor.num_workers,
+            "busy_workers": self.executor.busy_workers,
+            "avg_batch_seconds": round(self._batch_seconds, 3)
+        }
+
+    def retry_after(self) -> int:
+        """Estimate in seconds until the queue has drained enough to admit a new request"""
+        batches_ahead = math.ceil((self.queue_depth + 1) / self.max_batch_size)
+        rounds = math.ceil(batches_ahead / self.executor.num_workers)
+        return max(1, math.ceil(rounds * self._batch_seconds))
+
+    async def start(self):
+        """Start the executor and the dispatch loop on the running event loop"""
+        self.executor.start()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.executor.num_workers)
+        self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        """Stop dispatching and fail all requests that are still waiting"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(ExecutorUnavailable("Scheduler stopped"))
+
+        self.executor.shutdown()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue a single request and wait for its result"""
+        return await self.enqueue(item)
+
+    def enqueue(self, item: Any) -> asyncio.Future:
+        """Queue a single request and return the future for its result"""
+        if self._task is None:
+            raise ExecutorUnavailable("Scheduler is not running")
+        status = self.executor.status
+        if status != "ready":
+            raise ExecutorUnavailable(f"Model is {status}", retry_after=10)
+        if len(self._pending) >= self.max_queue:
+            raise ExecutorBusy("Too many queued requests", retry_after=self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self._wakeup.set()
+        return future
+
+    def position(self, future: asyncio.Future) -> Optional[int]:
+        """Return how many requests are ahead of this one, or None once it left the queue"""
+        for i, (_, pending) in enumerate(self._pending):
+            if pending is future:
+                return i
+        return None
+
+    def cancel(self, future: asyncio.Future):
+        """Drop a request, removing it from the queue if it hasn't been dispatched yet"""
+        for entry in self._pending:
+            if entry[1] is future:
+                self._pending.remove(entry)
+                break
+        future.cancel()
+
+    async def _wait_for_wakeup(self, timeout: Optional[float] = None) -> bool:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _next_batch(self) -> list:
+        """Wait for the first request, then collect more until the batch is full or the window closes"""
+        while not self._pending:
+            await self._wait_for_wakeup()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while sum(self.item_size(item) for item, _ in self._pending) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await self._wait_for_wakeup(remaining):
+                break
+
+        batch = []
+        batch_size = 0
+        while self._pending:
+            item, future = self._pending[0]
+            size = self.item_size(item)
+            if batch and batch_size + size > self.max_batch_size:
+                break
+            self._pending.popleft()
+            # Skip requests whose caller has already gone away
+            if not future.done():
+                batch.append((item, future))
+                batch_size += size
+        return batch
+
+    async def _dispatch_loop(self):
+        while True:
+            # Only form a batch once a worker is free, so requests keep queueing into it meanwhile
+            await self._slots.acquire()
+            batch = await self._next_batch()
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._run(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run(self, batch: list):
+        items = [item for item, _ in batch]
+        self._in_flight += len(items)
+        started = time.perf_counter()
+        try:
+            results = await asyncio.wrap_future(self.executor.submit(self.run_batch, items))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= len(items)
+            self._slots.release()
+
+        self._batch_seconds = 0.8 * self._batch_seconds + 0.2 * (time.perf_counter() - started)
+
+        # Fan the results back out to the waiting requests
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -1,10 +1,12 @@
 from datetime import datetime
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from PIL import Image
 from diffusers import AutoPipelineForText2Image
 import torch
+from embedding_cache import PromptEmbeddingCache, encode_with_pipeline
+from quantization import check_quantization, load_quantized_unet, quantize_torch_unet
 
 # Constants
 DEFAULT_WIDTH = 1024
@@ -13,9 +15,14 @@ DEFAULT_STEPS = 1
 DEFAULT_GUIDANCE = 0.0
 OUTPUT_DIR = "output/generated_images/sdxl-turbo"
 MODEL_CACHE_DIR = "models/sdxl-turbo"
+# "int8" quantizes the UNet's linear layers when running on CPU
+QUANTIZATION = os.getenv("sdxl_quantization") or None
+QUANTIZED_UNET_PATH = os.path.join(MODEL_CACHE_DIR, "quantized", "unet-int8-dynamic.pt")
 
 # Global pipeline variable
 pipeline = None
+# Text encoder outputs of recent prompts, created with the pipeline
+embedding_cache = None
 
 def get_best_device():
     try:
@@ -34,6 +41,19 @@ def get_best_device():
     print("Using CPU backend")
     return "cpu", torch.float32
 
+def quantize_pipeline(pipeline, quantization: Optional[str] = QUANTIZATION):
+    """Swap in a dynamically quantized UNet, reusing the cached one if present."""
+    check_quantization(quantization)
+    if quantization != "int8":
+        return pipeline
+
+    quantized_unet = load_quantized_unet(QUANTIZED_UNET_PATH)
+    if quantized_unet is None:
+        quantized_unet = quantize_torch_unet(pipeline.unet, QUANTIZED_UNET_PATH)
+    pipeline.unet = quantized_unet
+    print("Using INT8 quantized UNet")
+    return pipeline
+
 def initialize_pipeline() -> "StableDiffusionPipeline":
     """Initialize the SDXL Turbo pipeline."""
     device, dtype = get_best_device()
@@ -46,6 +66,9 @@ def initialize_pipeline() -> "StableDiffusionPipeline":
             cache_dir=MODEL_CACHE_DIR
         )
         pipeline.to(device)
+        if device == "cpu":
+            # Dynamic quantization only has CPU kernels
+            pipeline = quantize_pipeline(pipeline)
         print(f"Pipeline initialized on {device}")
         return pipeline
     except Exception as e:
@@ -57,42 +80,88 @@ def initialize_pipeline() -> "StableDiffusionPipeline":
             cache_dir=MODEL_CACHE_DIR
         )
         pipeline.to("cpu")
-        return pipeline
+        return quantize_pipeline(pipeline)
 
 def sanitize_filename(prompt: str, max_length: int = 50) -> str:
     """Create a safe filename from the prompt."""
     safe_prompt = "".join(x for x in prompt if x.isalnum() or x.isspace())
     return safe_prompt[:max_length].strip()
 
+def get_pipeline():
+    """Return the pipeline, initializing it and the embedding cache on first use."""
+    global pipeline, embedding_cache
+
+    if pipeline is None:
+        pipeline = initialize_pipeline()
+        embedding_cache = PromptEmbeddingCache(
+            [pipeline.tokenizer, pipeline.tokenizer_2],
+            encode_with_pipeline(pipeline)
+        )
+    return pipeline
+
+def pre_encode_prompts(prompts: List[str]):
+    """Encode prompts into the embedding cache in one batch."""
+    get_pipeline()
+    embedding_cache.pre_encode(prompts)
+
 def generate_image(prompt: str, output_dir: str = OUTPUT_DIR) -> str:
     """Generate an image from a text prompt."""
-    global pipeline
-    
+    return generate_images([prompt], output_dir=output_dir)[0]
+
+def generate_images(
+    prompts: List[str],
+    num_images_per_prompt: int = 1,
+    seeds: Optional[List[int]] = None,
+    output_dir: str = OUTPUT_DIR
+) -> List[str]:
+    """Generate num_images_per_prompt images for every prompt in one batched pipeline call.
+
+    Images are returned grouped by prompt. seeds, if given, holds one seed per image.
+    """
     try:
-        if pipeline is None:
-            pipeline = initialize_pipeline()
+        get_pipeline()
             
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
+
+        image_prompts = [prompt for prompt in prompts for _ in range(num_images_per_prompt)]
+        generator = None
+        if seeds is not None:
+            if len(seeds) != len(image_prompts):
+                raise ValueError(f"Expected {len(image_prompts)} seeds, got {len(seeds)}")
+            # CPU generators give the same images on every device
+            generator = [torch.Generator("cpu").manual_seed(seed) for seed in seeds]
         
-        # Generate the image
-        output = pipeline(prompt, num_inference_steps=DEFAULT_STEPS, guidance_scale=DEFAULT_GUIDANCE)
+        # Generate the images, reusing cached text embeddings for repeated prompts
+        prompt_embeds, pooled_prompt_embeds = embedding_cache.encode(image_prompts)
+        output = pipeline(
+            prompt_embeds=prompt_embeds,
+            pooled_prompt_embeds=pooled_prompt_embeds,
+            num_inference_steps=DEFAULT_STEPS,
+            guidance_scale=DEFAULT_GUIDANCE,
+            generator=generator
+        )
         
-        # Save the image
+        # Save the images
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        safe_prompt = sanitize_filename(prompt)
-        filename = f"{safe_prompt}_{timestamp}.png"
-        filepath = os.path.join(output_dir, filename)
-        
-        output.images[0].save(filepath)
-        print(f"\nImage saved to: {filepath}")
-        return filepath
+        filepaths = []
+        for i, (image, prompt) in enumerate(zip(output.images, image_prompts)):
+            safe_prompt = sanitize_filename(prompt)
+            suffix = f"_{i}" if len(image_prompts) > 1 else ""
+            filename = f"{safe_prompt}_{timestamp}{suffix}.png"
+            filepath = os.path.join(output_dir, filename)
+            
+            image.save(filepath)
+            print(f"\nImage saved to: {filepath}")
+            filepaths.append(filepath)
+        return filepaths
         
     except Exception as e:
         if "cuda" in str(e).lower() and pipeline is not None:
             print("CUDA error detected, falling back to CPU")
             pipeline.to("cpu")
-            return generate_image(prompt, output_dir)  # Retry on CPU
+            embedding_cache.clear()  # Cached embeddings live on the old device
+            return generate_images(prompts, num_images_per_prompt, seeds, output_dir)  # Retry on CPU
         raise RuntimeError(f"Failed to generate image: {str(e)}")
 
 if __name__ == "__main__":
@@ -5,43 +5,109 @@ import torch
 from diffusers import StableDiffusionXLPipeline
 import onnxruntime as ort
 from transformers import CLIPTokenizer
-from typing import Optional, Union, List
+from typing import Callable, Optional, Union, List
 import shutil
+import threading
+from embedding_cache import PromptEmbeddingCache, encode_with_pipeline
+from image_io import encode_image, save_image_bytes
+from ort_pipeline import OrtSDXLPipeline
+from quantization import check_quantization, load_quantized_unet, quantize_onnx_component, quantize_torch_unet
+
+BACKENDS = ("onnx", "torch")
 
 class SDXLTurboOnnx:
-    def __init__(self, model_path: str = "stabilityai/sdxl-turbo", cache_dir: str = "models/sdxl-turbo"):
+    def __init__(
+        self,
+        model_path: str = "stabilityai/sdxl-turbo",
+        cache_dir: str = "models/sdxl-turbo",
+        backend: str = "onnx",
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: int = 1,
+        quantization: Optional[str] = None,
+        embedding_cache_size: int = 1024
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+        check_quantization(quantization)
+
         self.model_path = model_path
         self.cache_dir = cache_dir
+        self.backend = backend
+        self.quantization = quantization
         self.onnx_dir = os.path.join(self.cache_dir, "onnx")
         self.providers = ['CPUExecutionProvider']  # Only use CPU provider
         
         # Create cache directory if it doesn't exist
         os.makedirs(self.cache_dir, exist_ok=True)
         
-        # Initialize pipeline
-        self.pipe = StableDiffusionXLPipeline.from_pretrained(
-            self.model_path,
-            torch_dtype=torch.float32,  # Use float32 for CPU
-            use_safetensors=True
+        if self.backend == "onnx":
+            # Export to ONNX if not exists
+            if not os.path.exists(self.onnx_dir):
+                self._export_to_onnx()
+
+            unet_component = "unet"
+            if self.quantization == "int8":
+                unet_component = quantize_onnx_component(self.onnx_dir, "unet")
+
+            # Run text encoders, UNet and VAE decoder with ONNX Runtime
+            self.pipe = OrtSDXLPipeline.from_pretrained(
+                self.onnx_dir,
+                self.model_path,
+                intra_op_threads=intra_op_threads,
+                inter_op_threads=inter_op_threads,
+                providers=self.providers,
+                unet_component=unet_component
+            )
+        else:
+            # A cached quantized UNet replaces the fp32 one, so it is never loaded
+            quantized_unet_path = os.path.join(self.cache_dir, "quantized", "unet-int8-dynamic.pt")
+            components = {}
+            if self.quantization == "int8":
+                quantized_unet = load_quantized_unet(quantized_unet_path)
+                if quantized_unet is not None:
+                    components["unet"] = quantized_unet
+
+            # Initialize pipeline
+            self.pipe = StableDiffusionXLPipeline.from_pretrained(
+                self.model_path,
+                torch_dtype=torch.float32,  # Use float32 for CPU
+                use_safetensors=True,
+                **components
+            )
+            
+            # Move to CPU
+            self.pipe.to("cpu")
+
+            if self.quantization == "int8" and "unet" not in components:
+                self.pipe.unet = quantize_torch_unet(self.pipe.unet, quantized_unet_path)
+
+        # Reuse text encoder outputs for repeated prompts
+        if self.backend == "onnx":
+            encode = lambda prompts: self.pipe.encode_prompt(prompts)[:2]
+        else:
+            encode = encode_with_pipeline(self.pipe)
+        self.embedding_cache = PromptEmbeddingCache(
+            [self.pipe.tokenizer, self.pipe.tokenizer_2],
+            encode,
+            max_entries=embedding_cache_size
         )
-        
-        # Move to CPU
-        self.pipe.to("cpu")
-        
-        # Export to ONNX if not exists
-        if not os.path.exists(self.onnx_dir):
-            self._export_to_onnx()
     
     def _export_to_onnx(self):
         """Export pipeline to ONNX format"""
+        from optimum.exporters.onnx import main_export
+
         print(f"Exporting model to ONNX format in {self.onnx_dir}")
+        tmp_dir = self.onnx_dir + ".tmp"
         
         try:
-            # Export the pipeline to ONNX
-            self.pipe.export_to_onnx(self.onnx_dir)
+            # Export every component, then move into place so a crash never leaves a partial export
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            main_export(self.model_path, output=tmp_dir, task="text-to-image", library_name="diffusers")
+            os.replace(tmp_dir, self.onnx_dir)
             print("Model export complete")
             
         except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
             raise RuntimeError(f"Failed to export model to ONNX: {str(e)}")
     
     def generate(
@@ -56,43 +122,141 @@ class SDXLTurboOnnx:
         output_dir: str = "output/sdxl_onnx"
     ) -> str:
         """Generate image using the pipeline"""
-        if seed is not None:
+        prompts = [prompt] if isinstance(prompt, str) else prompt
+        return self.generate_batch(
+            prompts,
+            negative_prompt=negative_prompt,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            width=width,
+            height=height,
+            seed=seed,
+            output_dir=output_dir
+        )[0]
+
+    def generate_batch(
+        self,
+        prompts: List[str],
+        negative_prompt: Optional[Union[str, List[str]]] = None,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        seed: Optional[int] = None,
+        output_dir: str = "output/sdxl_onnx",
+        seeds: Optional[List[Optional[int]]] = None,
+        num_images_per_prompt: int = 1
+    ) -> List[str]:
+        """Generate images for all prompts in a single pipeline call and save them"""
+        images = self.generate_images(
+            prompts,
+            negative_prompt=negative_prompt,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            width=width,
+            height=height,
+            seed=seed,
+            seeds=seeds,
+            num_images_per_prompt=num_images_per_prompt
+        )
+        image_prompts = [prompt for prompt in prompts for _ in range(num_images_per_prompt)]
+        return [self._save_image(image, prompt, output_dir) for image, prompt in zip(images, image_prompts)]
+
+    def generate_images(
+        self,
+        prompts: List[str],
+        negative_prompt: Optional[Union[str, List[str]]] = None,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        seed: Optional[int] = None,
+        seeds: Optional[List[Optional[int]]] = None,
+        num_images_per_prompt: int = 1,
+        callback_on_step_end: Optional[Callable] = None
+    ) -> List[Image.Image]:
+        """Generate images for all prompts in a single pipeline call, without touching the disk.
+
+        Returns ``num_images_per_prompt`` images per prompt, grouped by prompt.
+        ``seeds`` gives each image its own seed (None for random), so every
+        image is reproducible independently of what it was batched with. A
+        single ``seed`` with several images per prompt seeds them seed, seed+1, ...
+        ``callback_on_step_end`` is forwarded to the pipeline, e.g. for previews.
+        """
+        image_prompts = [prompt for prompt in prompts for _ in range(num_images_per_prompt)]
+        if isinstance(negative_prompt, list):
+            negative_prompt = [p for p in negative_prompt for _ in range(num_images_per_prompt)]
+
+        if seeds is not None:
+            if len(seeds) != len(image_prompts):
+                raise ValueError(f"Expected {len(image_prompts)} seeds, got {len(seeds)}")
+            generator = [self._make_generator(s) for s in seeds]
+        elif seed is not None and num_images_per_prompt > 1:
+            generator = [self._make_generator(seed + i) for _ in prompts for i in range(num_images_per_prompt)]
+        elif seed is not None:
             generator = torch.Generator("cpu").manual_seed(seed)  # Use CPU generator
         else:
             generator = None
 
-        # Generate image using the pipeline
+        # Repeated prompts share one cache entry, so they are only encoded once
+        prompt_embeds, pooled_prompt_embeds = self.embedding_cache.encode(image_prompts)
+
+        # Generate all images in one batched pipeline call
         output = self.pipe(
-            prompt=prompt,
+            prompt_embeds=prompt_embeds,
+            pooled_prompt_embeds=pooled_prompt_embeds,
             negative_prompt=negative_prompt,
             num_inference_steps=num_inference_steps,
             guidance_scale=guidance_scale,
             width=width,
             height=height,
-            generator=generator
+            generator=generator,
+            callback_on_step_end=callback_on_step_end
         )
-        
-        image = output.images[0]
-        
-        # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Find next available number
-        existing_files = os.listdir(output_dir)
-        next_num = len(existing_files) + 1
-        
-        # Create filename with number and prompt
-        safe_prompt = "".join(x for x in prompt if x.isalnum() or x in " -_")[:50]  # Clean prompt for filename
-        filename = f"{next_num:04d}_{safe_prompt}.png"
-        filepath = os.path.join(output_dir, filename)
-        
-        # Save image
-        image.save(filepath)
-        return filepath
+        return output.images
+
+    def pre_encode(self, prompts: List[str]):
+        """Encode prompts into the embedding cache in one batch, e.g. popular suggestions"""
+        self.embedding_cache.pre_encode(prompts)
+
+    @staticmethod
+    def _make_generator(seed: Optional[int]) -> torch.Generator:
+        generator = torch.Generator("cpu")  # Use CPU generator
+        if seed is None:
+            generator.seed()
+        else:
+            generator.manual_seed(seed)
+        return generator
+
+    def warmup(self, prompt: str = "warmup", width: int = 512, height: int = 512):
+        """Run a throwaway generation so the first real request doesn't pay allocation costs"""
+        self.pipe(
+            prompt=prompt,
+            num_inference_steps=1,
+            guidance_scale=0.0,
+            width=width,
+            height=height
+        )
+
+    def _save_image(self, image: Image.Image, prompt: str, output_dir: str) -> str:
+        """Save an image with a filename derived from the prompt"""
+        return save_image_bytes(encode_image(image, "png"), output_dir, prompt, "png")
+
+# Default instance for simple usage, created on first use
+_default_generator = None
+_default_generator_lock = threading.Lock()
+
+def get_default_generator() -> SDXLTurboOnnx:
+    """Return the shared generator, loading the pipeline on first call"""
+    global _default_generator
+
+    with _default_generator_lock:
+        if _default_generator is None:
+            _default_generator = SDXLTurboOnnx()
+    return _default_generator
 
-# Create default instance for simple usage
-default_generator = SDXLTurboOnnx()
-generate_image = lambda prompt: default_generator.generate(prompt)
+def generate_image(prompt: str) -> str:
+    return get_default_generator().generate(prompt)
 
 if __name__ == "__main__":
     try:
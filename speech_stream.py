@@ -0,0 +1,150 @@
+import queue
+import re
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+# Constants
+# Shorter fragments are merged with the next sentence, single words sound choppy
+MIN_SENTENCE_CHARS = 20
+# Split long runs without sentence end at a comma so audio can start early
+MAX_SENTENCE_CHARS = 200
+# Sentences synthesized ahead of the one that is playing
+LOOKAHEAD = 2
+
+# Sentence end followed by whitespace, allowing closing quotes and brackets
+SENTENCE_END = re.compile(r"[.!?…:;]+[\"'»“”)\]]*\s+|\n+")
+# German abbreviations that end in a period but don't end a sentence
+ABBREVIATIONS = {
+    "z.b.", "bzw.", "d.h.", "ca.", "dr.", "nr.", "usw.", "u.a.", "evtl.", "ggf.", "inkl.",
+    "str.", "st.", "prof.", "mio.", "mrd.", "vgl.", "bspw.", "etc.", "sog.", "jh."
+}
+# A number with a period before these is an ordinal date, "am 3. Mai"
+MONTH_NAMES = {
+    "januar", "februar", "märz", "april", "mai", "juni", "juli", "august", "september", "oktober", "november", "dezember",
+    "jan", "feb", "mär", "apr", "jun", "jul", "aug", "sep", "sept", "okt", "nov", "dez"
+}
+
+class SentenceSplitter:
+    """Cut streamed text into sentences as soon as they are complete"""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS, max_chars: int = MAX_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def _is_sentence_end(self, match: re.Match) -> bool:
+        if "\n" in match.group():
+            return True
+        words = self.buffer[:match.start() + 1].split()
+        last_word = words[-1].lower() if words else ""
+        if not last_word.endswith("."):
+            return True
+        if last_word in ABBREVIATIONS:
+            return False
+        if not last_word[:-1].isdigit():
+            return True
+        # "der 3. Mai" or "der 3. große Tag" is an ordinal, "im Jahr 2024. Das" ends a sentence
+        following = self.buffer[match.end():].split(maxsplit=1)
+        if not following or (len(following) == 1 and not self.buffer[-1].isspace()):
+            # Decided once the next word is complete, or by flush()
+            return False
+        next_word = following[0].strip(".,;:!?").lower()
+        return not (following[0][:1].islower() or next_word in MONTH_NAMES)
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return the sentences it completed"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if not self._is_sentence_end(match):
+                continue
+            sentence = self.buffer[start:match.end()].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = match.end()
+
+        self.buffer = self.buffer[start:]
+        if len(self.buffer) > self.max_chars:
+            cut = self.buffer.rfind(", ", 0, self.max_chars)
+            if cut == -1:
+                cut = self.buffer.rfind(" ", 0, self.max_chars)
+            if cut > 0:
+                sentences.append(self.buffer[:cut + 1].strip())
+                self.buffer = self.buffer[cut + 1:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever is left once the stream has ended"""
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+def split_sentences(chunks: Iterable[str]) -> Iterator[str]:
+    """Turn a stream of text chunks into a stream of sentences"""
+    splitter = SentenceSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.flush()
+
+class SpeechPlayer:
+    """Speaks sentences in order while later ones are still being generated.
+
+    One thread synthesizes, another plays, so the next sentence is usually
+    ready by the time the current one finishes. ``synthesize`` turns text
+    into audio, ``play`` consumes that audio and blocks until it has played,
+    e.g. ``CachingTTS.synthesize`` and ``AudioOutput.play`` from tts.py.
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Any],
+        play: Callable[[Any], None],
+        lookahead: int = LOOKAHEAD
+    ):
+        self.synthesize = synthesize
+        self.play = play
+        self._texts = queue.Queue()
+        self._audio = queue.Queue(maxsize=lookahead)
+        self._synthesizer = threading.Thread(target=self._synthesize_loop, name="tts-synthesize", daemon=True)
+        self._player = threading.Thread(target=self._play_loop, name="tts-play", daemon=True)
+        self._synthesizer.start()
+        self._player.start()
+
+    def say(self, text: str):
+        """Queue a sentence, returns immediately"""
+        self._texts.put(text)
+
+    def wait(self):
+        """Block until everything queued so far has been spoken"""
+        self._texts.join()
+        self._audio.join()
+
+    def close(self):
+        self._texts.put(None)
+        self._synthesizer.join()
+        self._player.join()
+
+    def _synthesize_loop(self):
+        while True:
+            text = self._texts.get()
+            try:
+                if text is None:
+                    self._audio.put(None)
+                    return
+                self._audio.put(self.synthesize(text))
+            except Exception as e:
+                print(f"Error synthesizing speech: {str(e)}")
+            finally:
+                self._texts.task_done()
+
+    def _play_loop(self):
+        while True:
+            audio = self._audio.get()
+            try:
+                if audio is None:
+                    return
+                self.play(audio)
+            except Exception as e:
+                print(f"Error playing speech: {str(e)}")
+            finally:
+                self._audio.task_done()
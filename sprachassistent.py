@@ -1,39 +1,66 @@
 import dotenv
-from openai import OpenAI
-import dotenv
-from gtts import gTTS
-import speech_recognition as sr
 import os
-import json
-import asyncio
-from tools import tools, get_current_date, get_weather, get_ip, location, crawl4ai, search_duckduckgo, search_wikipedia
+import threading
+import time
+from typing import Iterator
+from tools import tools
+from tool_dispatcher import get_tool_dispatcher
+from speech_stream import SpeechPlayer, split_sentences
+from stt import NoSpeechRecognized, create_recognizer
+from tts import COMMON_PHRASES, AudioOutput, create_tts
+from conversation import Conversation
+from llm_backend import LLM_BACKEND, create_llm_client, warm_up
+from router import TurnMetrics, current_context, route
 
 # Load environment variables
 dotenv.load_dotenv()
 api_key = os.getenv('api_key')
 api_endpoint = os.getenv('api_endpoint')
 
+MODEL = os.getenv("llm_model", "mixtral-8x7b-32768")
+SYSTEM_PROMPT = ("Du bist ein hilfsbereiter Assistent. Antworte stets auf Deutsch. "
+                 "Halte dich bitte immer so kurz und präzise wie möglich. Bitte nutze keine Emojis. Gebe immer genaue Informationen, es geht um die Kariere des Nutzers."
+                 "Nutze die verfügbaren Funktionen für Datum/Uhrzeit, Wetterabfragen, IP-Adressen und Standortinformationen.")
+
 def init_openai_client():
-    return OpenAI(base_url=api_endpoint, api_key=api_key)
-
-def record_audio():
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Bitte sprechen Sie jetzt...")
-        return r.listen(source)
-
-def get_ai_response(client, user_input):
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[
-            {
-                "role": "system",
-                "content": "Du bist ein hilfsbereiter Assistent. Antworte stets auf Deutsch. "
-                          "Halte dich bitte immer so kurz und präzise wie möglich. Bitte nutze keine Emojis. Gebe immer genaue Informationen, es geht um die Kariere des Nutzers."
-                          "Nutze die verfügbaren Funktionen für Datum/Uhrzeit, Wetterabfragen, IP-Adressen und Standortinformationen."
-            },
+    """OpenAI client for api_endpoint, or a local model with llm_backend=llama_cpp"""
+    return create_llm_client(LLM_BACKEND, base_url=api_endpoint, api_key=api_key)
+
+def build_messages(user_input, conversation=None):
+    """Prompt for a new input, with the session history if there is one.
+
+    The current date and time go right before the input, after the cacheable
+    prefix, so date questions don't need a get_current_date round trip.
+    """
+    if conversation is not None:
+        messages = conversation.messages(user_input)
+    else:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_input}
-        ],
+        ]
+    messages.insert(-1, current_context())
+    return messages
+
+def get_ai_response(client, user_input, conversation=None, metrics=None):
+    """Answer with one completion, or two if the model calls tools.
+
+    Returns the answer text. Pass a TurnMetrics to get the LLM calls and
+    latency of the turn.
+    """
+    metrics = metrics or TurnMetrics()
+    # Simple questions are answered from a template without the model
+    answer = route(user_input, metrics)
+    if answer is not None:
+        if conversation is not None:
+            conversation.add_turn(user_input, answer)
+        return answer
+
+    messages = build_messages(user_input, conversation)
+    response = metrics.completion(
+        client,
+        model=MODEL,
+        messages=messages,
         tools=tools,
         tool_choice="auto"
     )
@@ -42,90 +69,140 @@ def get_ai_response(client, user_input):
 
     # Check if the model wants to call functions
     if message.tool_calls:
-        # Create a list to store function responses
-        function_messages = []
-        
-        for tool_call in message.tool_calls:
-            function_name = tool_call.function.name
-            try:
-                function_args = json.loads(tool_call.function.arguments)
-            except:
-                function_args = {}
-
-            try:
-                # Execute the function
-                if function_name == "get_current_date":
-                    result = get_current_date()
-                elif function_name == "get_weather":
-                    result = get_weather(**function_args)
-                elif function_name == "get_ip":
-                    result = get_ip()
-                elif function_name == "location":
-                    result = location()
-                elif function_name == "crawl4ai":
-                    if 'url' not in function_args:
-                        result = {"error": "URL parameter is required"}
-                    else:
-                        result = asyncio.run(crawl4ai(function_args['url']))
-                elif function_name == "search_duckduckgo":
-                    result = search_duckduckgo(**function_args)
-                elif function_name == "search_wikipedia":
-                    result = search_wikipedia(**function_args)
-                else:
-                    continue
-            except Exception as e:
-                result = {"error": str(e)}
-
-            function_messages.append({
-                "tool_call_id": tool_call.id,
-                "role": "tool",
-                "name": function_name,
-                "content": json.dumps(result)
-            })
-
-        # Get the final response
-        second_response = client.chat.completions.create(
-            model="mixtral-8x7b-32768",
+        # Run all requested tools concurrently, each with its own timeout
+        function_messages = get_tool_dispatcher().dispatch(message.tool_calls)
+        metrics.route = "tools"
+        metrics.tool_calls += len(message.tool_calls)
+
+        # Get the final response. Same system prompt, history and tools as the first
+        # call, so the provider can reuse the cached prompt prefix.
+        response = metrics.completion(
+            client,
+            model=MODEL,
+            messages=[*messages, message, *function_messages],
+            tools=tools,
+            tool_choice="none"
+        )
+
+    answer = response.choices[0].message.content or ""
+    if conversation is not None:
+        conversation.add_turn(user_input, answer)
+    return answer
+
+def stream_ai_response(client, user_input, conversation=None, metrics=None) -> Iterator[str]:
+    """Yield the answer text as the model generates it, running requested tools in between"""
+    metrics = metrics or TurnMetrics()
+    answer = route(user_input, metrics)
+    if answer is not None:
+        yield answer
+        if conversation is not None:
+            conversation.add_turn(user_input, answer)
+        return
+
+    messages = build_messages(user_input, conversation)
+    stream = metrics.completion(
+        client,
+        model=MODEL,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        stream=True
+    )
+
+    answer = []
+    # Tool calls arrive in fragments, keyed by their index
+    tool_call_parts = {}
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            answer.append(delta.content)
+            yield delta.content
+        for part in delta.tool_calls or []:
+            call = tool_call_parts.setdefault(part.index, {"id": "", "name": "", "arguments": ""})
+            call["id"] = part.id or call["id"]
+            if part.function:
+                call["name"] += part.function.name or ""
+                call["arguments"] += part.function.arguments or ""
+
+    if tool_call_parts:
+        from openai.types.chat import ChatCompletionMessageToolCall
+
+        tool_calls = [
+            ChatCompletionMessageToolCall(
+                id=call["id"],
+                type="function",
+                function={"name": call["name"], "arguments": call["arguments"]}
+            )
+            for _, call in sorted(tool_call_parts.items())
+        ]
+        function_messages = get_tool_dispatcher().dispatch(tool_calls)
+        metrics.route = "tools"
+        metrics.tool_calls += len(tool_calls)
+
+        # Same prefix as the first call, see get_ai_response
+        second_stream = metrics.completion(
+            client,
+            model=MODEL,
             messages=[
-                {
-                    "role": "system",
-                    "content": "Du bist ein hilfsbereiter Assistent. Antworte stets auf Deutsch. "
-                              "Halte dich bitte immer so kurz und präzise wie möglich. Bitte nutze keine Emojis."
-                },
-                {"role": "user", "content": user_input},
-                message,
+                *messages,
+                {"role": "assistant", "content": None, "tool_calls": [call.model_dump() for call in tool_calls]},
                 *function_messages
-            ]
+            ],
+            tools=tools,
+            tool_choice="none",
+            stream=True
         )
-        return second_response
-
-    return response
+        for chunk in second_stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                answer.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
 
-def text_to_speech(text):
-    tts = gTTS(text=text, lang='de')
-    tts.save("output/response.mp3")
-    os.system("mpg321 output/response.mp3")
+    if conversation is not None:
+        conversation.add_turn(user_input, "".join(answer))
 
 def main():
     client = init_openai_client()
+    # A local model evaluates the system prompt once, every turn starts from that cached prefix
+    threading.Thread(target=warm_up, args=(client, SYSTEM_PROMPT, tools), daemon=True).start()
+    # Speech is synthesized and played in memory through one open output stream
+    tts = create_tts()
+    threading.Thread(target=tts.pre_synthesize, args=(COMMON_PHRASES,), daemon=True).start()
+    player = SpeechPlayer(tts.synthesize, AudioOutput().play)
+    # Microphone, VAD and STT model are set up once and reused for every turn
+    recognizer = create_recognizer()
+    # Multi-turn memory, bounded by a token budget
+    conversation = Conversation(client, MODEL, SYSTEM_PROMPT)
 
     while True:
         print("Ich höre zu...")
 
         try:
-            audio = record_audio()
-            r = sr.Recognizer()
-            user_input = r.recognize_google(audio, language='de-DE')
+            print("Bitte sprechen Sie jetzt...")
+            user_input = recognizer.listen(on_partial=lambda text: print(f"... {text}"))
             print("Sie sagten: " + user_input)
 
-            response = get_ai_response(client, user_input)
-            response_text = response.choices[0].message.content
-            print(response_text)
-
-            text_to_speech(response_text)
-
-        except sr.UnknownValueError:
-            print("Entschuldigung, ich konnte Sie nicht verstehen")
+            # Speak each sentence as soon as it is complete instead of waiting for the whole answer
+            started = time.perf_counter()
+            first_sentence = True
+            metrics = TurnMetrics()
+            for sentence in split_sentences(stream_ai_response(client, user_input, conversation, metrics)):
+                if first_sentence:
+                    print(f"(erster Satz nach {time.perf_counter() - started:.2f}s)")
+                    first_sentence = False
+                print(sentence)
+                player.say(sentence)
+
+            print(f"(LLM-Aufrufe: {metrics.llm_calls}, {metrics.llm_seconds:.2f}s, Weg: {metrics.route})")
+
+            # Don't listen while still speaking, the microphone would pick it up
+            player.wait()
+
+        except NoSpeechRecognized:
+            print(COMMON_PHRASES[0])
+            player.say(COMMON_PHRASES[0])
+            player.wait()
 
         print("Bereit für die nächste Eingabe...")
 
@@ -0,0 +1,395 @@
+import collections
+import functools
+import importlib.util
+import json
+import os
+import queue
+import threading
+import time
+import wave
+from typing import Callable, Iterator, Optional
+
+# Constants
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+FRAME_BYTES = FRAME_SAMPLES * 2  # 16-bit mono PCM
+# Speech before the VAD triggers, kept so the first syllable isn't cut off
+PRE_ROLL_MS = 300
+# Consecutive speech frames that start an utterance
+START_FRAMES = 3
+# Silence that ends an utterance
+END_SILENCE_MS = int(os.getenv("stt_end_silence_ms", 700))
+MAX_UTTERANCE_SECONDS = 30
+# How often a partial transcript is decoded while the user is still speaking
+PARTIAL_INTERVAL_SECONDS = 1.0
+
+# "google" (online, default), "whisper" (faster-whisper on CPU) or "vosk"
+STT_BACKEND = os.getenv("stt_backend", "google")
+STT_LANGUAGE = "de"
+WHISPER_MODEL = os.getenv("whisper_model", "small")
+# Parallel decodes on one shared Whisper model, e.g. for several server sessions
+WHISPER_WORKERS = int(os.getenv("whisper_workers", 1))
+VOSK_MODEL_PATH = os.getenv("vosk_model_path", "models/vosk-model-small-de-0.15")
+
+class NoSpeechRecognized(Exception):
+    """Raised when an utterance contained no recognizable words"""
+
+# Audio sources, yielding FRAME_BYTES of 16 kHz mono 16-bit PCM per frame
+
+class MicrophoneSource:
+    """Microphone input through one PyAudio stream that stays open across turns"""
+
+    def __init__(self, device_index: Optional[int] = None):
+        import pyaudio
+
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=SAMPLE_RATE,
+            input=True,
+            input_device_index=device_index,
+            frames_per_buffer=FRAME_SAMPLES,
+            start=False
+        )
+
+    def frames(self) -> Iterator[bytes]:
+        # Only capture while listening, so the assistant's own speech isn't buffered
+        self._stream.start_stream()
+        try:
+            while True:
+                yield self._stream.read(FRAME_SAMPLES, exception_on_overflow=False)
+        finally:
+            self._stream.stop_stream()
+
+    def close(self):
+        self._stream.close()
+        self._audio.terminate()
+
+class WavFileSource:
+    """Audio from a WAV file, for tests and benchmarks without a microphone.
+
+    The file is converted to 16 kHz mono once. With ``realtime`` frames are
+    paced like a live microphone, and silence is appended so the last
+    utterance ends.
+    """
+
+    def __init__(self, path: str, realtime: bool = False, trailing_silence_ms: int = 1000):
+        import numpy as np
+
+        self.path = path
+        self.realtime = realtime
+        with wave.open(path, "rb") as f:
+            if f.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit PCM, got {8 * f.getsampwidth()}-bit")
+            samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+            channels, rate = f.getnchannels(), f.getframerate()
+
+        samples = samples.reshape(-1, channels).mean(axis=1)
+        if rate != SAMPLE_RATE:
+            positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(len(samples)), samples)
+        samples = np.concatenate([samples, np.zeros(SAMPLE_RATE * trailing_silence_ms // 1000)])
+        self.pcm = samples.astype(np.int16).tobytes()
+        self.duration = len(samples) / SAMPLE_RATE
+
+    def frames(self) -> Iterator[bytes]:
+        started = time.perf_counter()
+        for i, offset in enumerate(range(0, len(self.pcm) - FRAME_BYTES + 1, FRAME_BYTES)):
+            if self.realtime:
+                time.sleep(max(0.0, started + i * FRAME_MS / 1000 - time.perf_counter()))
+            yield self.pcm[offset:offset + FRAME_BYTES]
+
+    def close(self):
+        pass
+
+class QueueSource:
+    """Audio pushed in from elsewhere, e.g. a network connection.
+
+    ``feed`` accepts PCM chunks of any size, ``end_utterance`` appends enough
+    silence for the VAD to end the current utterance, and ``close`` ends the
+    stream. After an ``end_utterance`` the current read stops, so a listener
+    that heard no speech gives up instead of waiting for the next utterance.
+    """
+
+    # Queued after the silence of end_utterance, ends one frames() iteration
+    UTTERANCE_END = object()
+
+    def __init__(self):
+        self._chunks = queue.Queue()
+        self._buffer = bytearray()
+
+    def feed(self, pcm: bytes):
+        self._chunks.put(pcm)
+
+    def end_utterance(self):
+        self.feed(bytes(FRAME_BYTES * (END_SILENCE_MS // FRAME_MS + 1)))
+        self._chunks.put(self.UTTERANCE_END)
+
+    def clear(self):
+        """Drop audio that hasn't been read yet, call only while no one is reading"""
+        self._buffer = bytearray()
+        try:
+            while True:
+                if self._chunks.get_nowait() is None:
+                    self._chunks.put(None)
+                    break
+        except queue.Empty:
+            pass
+
+    def frames(self) -> Iterator[bytes]:
+        while True:
+            while len(self._buffer) < FRAME_BYTES:
+                chunk = self._chunks.get()
+                if chunk is None:
+                    # Keep the end marker for later readers
+                    self._chunks.put(None)
+                    return
+                if chunk is self.UTTERANCE_END:
+                    return
+                self._buffer += chunk
+            frame = bytes(self._buffer[:FRAME_BYTES])
+            del self._buffer[:FRAME_BYTES]
+            yield frame
+
+    def close(self):
+        self._chunks.put(None)
+
+# Voice activity detection
+
+class EnergyVAD:
+    """Speech detection by loudness relative to an adaptive noise floor"""
+
+    def __init__(self, ratio: float = 3.0, min_rms: float = 300.0):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.noise_floor = min_rms / ratio
+
+    def is_speech(self, frame: bytes) -> bool:
+        import numpy as np
+
+        rms = float(np.sqrt(np.mean(np.frombuffer(frame, dtype=np.int16).astype(np.float32) ** 2)))
+        speech = rms > max(self.min_rms, self.noise_floor * self.ratio)
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return speech
+
+class WebRtcVAD:
+    """Speech detection with the WebRTC VAD, more robust against background noise"""
+
+    def __init__(self, aggressiveness: int = 2):
+        import webrtcvad
+
+        self._vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame: bytes) -> bool:
+        return self._vad.is_speech(frame, SAMPLE_RATE)
+
+def create_vad():
+    """Use the WebRTC VAD if installed, the energy VAD otherwise"""
+    if importlib.util.find_spec("webrtcvad") is not None:
+        return WebRtcVAD()
+    return EnergyVAD()
+
+@functools.lru_cache(maxsize=None)
+def load_whisper_model(model: str, compute_type: str):
+    """Load a Whisper model once per process, it is shared by all backends"""
+    from faster_whisper import WhisperModel
+
+    print(f"Loading Whisper model '{model}'...")
+    return WhisperModel(model, device="cpu", compute_type=compute_type, num_workers=WHISPER_WORKERS)
+
+@functools.lru_cache(maxsize=None)
+def load_vosk_model(model_path: str):
+    """Load a Vosk model once per process, it is shared by all recognizers"""
+    from vosk import Model, SetLogLevel
+
+    SetLogLevel(-1)
+    print(f"Loading Vosk model from {model_path}...")
+    return Model(model_path)
+
+# Recognition backends. Each is created once and reused for every utterance:
+# start() begins an utterance, accept() feeds frames while the user speaks and
+# may return a partial transcript, finish() returns the final transcript.
+
+class GoogleBackend:
+    """Google Web Speech API through SpeechRecognition, decoded after the utterance ends"""
+
+    def __init__(self, language: str = "de-DE"):
+        import speech_recognition as sr
+
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+        self.language = language
+        self._audio = bytearray()
+
+    def start(self):
+        self._audio = bytearray()
+
+    def accept(self, frame: bytes) -> Optional[str]:
+        self._audio += frame
+        return None
+
+    def finish(self) -> str:
+        try:
+            return self._recognizer.recognize_google(
+                self._sr.AudioData(bytes(self._audio), SAMPLE_RATE, 2),
+                language=self.language
+            )
+        except self._sr.UnknownValueError:
+            return ""
+
+class WhisperBackend:
+    """faster-whisper on CPU. Partial transcripts are decoded in the background while the user speaks."""
+
+    def __init__(self, model: str = WHISPER_MODEL, language: str = STT_LANGUAGE, compute_type: str = "int8"):
+        self._model = load_whisper_model(model, compute_type)
+        self.language = language
+        self._audio = bytearray()
+        self._partial = None
+        self._partial_thread = None
+        self._partial_at = 0
+
+    def _transcribe(self, pcm: bytes) -> str:
+        import numpy as np
+
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        # Utterances are already cut by our VAD, greedy decoding keeps latency low
+        segments, _ = self._model.transcribe(samples, language=self.language, beam_size=1, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def _decode_partial(self, pcm: bytes):
+        self._partial = self._transcribe(pcm)
+
+    def start(self):
+        self._audio = bytearray()
+        self._partial = None
+        self._partial_at = 0
+
+    def accept(self, frame: bytes) -> Optional[str]:
+        self._audio += frame
+        partial, self._partial = self._partial, None
+
+        # At most one partial decode at a time, so it never falls behind the speaker
+        due = len(self._audio) - self._partial_at >= PARTIAL_INTERVAL_SECONDS * SAMPLE_RATE * 2
+        if due and (self._partial_thread is None or not self._partial_thread.is_alive()):
+            self._partial_at = len(self._audio)
+            self._partial_thread = threading.Thread(target=self._decode_partial, args=(bytes(self._audio),), daemon=True)
+            self._partial_thread.start()
+        return partial
+
+    def finish(self) -> str:
+        if self._partial_thread is not None:
+            self._partial_thread.join()
+        return self._transcribe(bytes(self._audio))
+
+class VoskBackend:
+    """Vosk (Kaldi) streaming recognizer, decodes while the user speaks so the final result is immediate"""
+
+    def __init__(self, model_path: str = VOSK_MODEL_PATH):
+        from vosk import KaldiRecognizer
+
+        self._recognizer = KaldiRecognizer(load_vosk_model(model_path), SAMPLE_RATE)
+        self._segments = []
+        self._last_partial = ""
+
+    def start(self):
+        self._recognizer.Reset()
+        self._segments = []
+        self._last_partial = ""
+
+    def accept(self, frame: bytes) -> Optional[str]:
+        # Vosk finalizes segments at its own pauses, the utterance is their concatenation
+        if self._recognizer.AcceptWaveform(frame):
+            text = json.loads(self._recognizer.Result()).get("text", "")
+            if text:
+                self._segments.append(text)
+            return " ".join(self._segments) or None
+        partial = " ".join(self._segments + [json.loads(self._recognizer.PartialResult()).get("partial", "")]).strip()
+        if partial and partial != self._last_partial:
+            self._last_partial = partial
+            return partial
+        return None
+
+    def finish(self) -> str:
+        final = json.loads(self._recognizer.FinalResult()).get("text", "")
+        return " ".join(self._segments + [final]).strip()
+
+STT_BACKENDS = {
+    "google": GoogleBackend,
+    "whisper": WhisperBackend,
+    "vosk": VoskBackend
+}
+
+def create_backend(name: str = STT_BACKEND):
+    if name not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}', expected one of {list(STT_BACKENDS)}")
+    return STT_BACKENDS[name]()
+
+class SpeechRecognizer:
+    """Cuts utterances out of an audio source with a VAD and transcribes them.
+
+    Frames are fed to the backend while the user is still speaking, so only
+    the tail of the decoding happens after they stop. ``last_latency`` is the
+    time from the end of the utterance to its transcript.
+    """
+
+    def __init__(self, backend, source, vad=None):
+        self.backend = backend
+        self.source = source
+        self.vad = vad or create_vad()
+        self.last_latency = None
+
+    def listen(self, on_partial: Optional[Callable[[str], None]] = None) -> str:
+        """Block until one utterance has been spoken and return its transcript"""
+        pre_roll = collections.deque(maxlen=PRE_ROLL_MS // FRAME_MS)
+        end_frames = END_SILENCE_MS // FRAME_MS
+        max_frames = MAX_UTTERANCE_SECONDS * 1000 // FRAME_MS
+        speaking = False
+        speech_run = silence_run = frames_in_utterance = 0
+
+        frames = self.source.frames()
+        for frame in frames:
+            speech = self.vad.is_speech(frame)
+            if not speaking:
+                pre_roll.append(frame)
+                speech_run = speech_run + 1 if speech else 0
+                if speech_run < START_FRAMES:
+                    continue
+                speaking = True
+                self.backend.start()
+                frames_in_utterance = len(pre_roll)
+                for buffered in pre_roll:
+                    self._accept(buffered, on_partial)
+                continue
+
+            frames_in_utterance += 1
+            self._accept(frame, on_partial)
+            silence_run = 0 if speech else silence_run + 1
+            if silence_run >= end_frames or frames_in_utterance >= max_frames:
+                break
+        # Stops the microphone until the next turn
+        frames.close()
+
+        if not speaking:
+            raise NoSpeechRecognized("Audio source ended without speech")
+
+        started = time.perf_counter()
+        text = self.backend.finish().strip()
+        self.last_latency = time.perf_counter() - started
+        if not text:
+            raise NoSpeechRecognized("No words recognized")
+        return text
+
+    def _accept(self, frame: bytes, on_partial: Optional[Callable[[str], None]]):
+        partial = self.backend.accept(frame)
+        if partial and on_partial is not None:
+            on_partial(partial)
+
+    def close(self):
+        self.source.close()
+
+def create_recognizer(backend: str = STT_BACKEND) -> SpeechRecognizer:
+    """Return a recognizer on the default microphone, created once and reused across turns"""
+    return SpeechRecognizer(create_backend(backend), MicrophoneSource())
@@ -0,0 +1,217 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import urlparse
+
+# Canned responses shaped like the real APIs used by tools.py
+WEATHER = {
+    "current": {"temperature_2m": 18.4, "precipitation": 0.0, "weathercode": 2, "windspeed_10m": 11.2},
+    "current_units": {"temperature_2m": "°C", "precipitation": "mm", "windspeed_10m": "km/h"}
+}
+PUBLIC_IP = "203.0.113.7"
+LOCATION = {
+    "city": "Berlin",
+    "region": "Land Berlin",
+    "country_name": "Germany",
+    "latitude": 52.52,
+    "longitude": 13.405,
+    "timezone": "Europe/Berlin"
+}
+DUCKDUCKGO = {
+    "AbstractText": "Berlin is the capital and largest city of Germany.",
+    "AbstractSource": "Wikipedia",
+    "Image": "/i/berlin.jpg"
+}
+# Chat completions: weather questions get a get_weather tool call, everything else a fixed answer
+CHAT_MODEL = "stub"
+CHAT_ANSWER = "Das ist eine Antwort vom Stub-Server. Sie kommt ohne Netzwerk und ohne Modell aus."
+CHAT_TOOL_ANSWER = "In Berlin sind es gerade 18,4 Grad und es ist teilweise bewölkt."
+WEATHER_TOOL_CALL = {
+    "id": "call_stub_weather",
+    "type": "function",
+    "function": {"name": "get_weather", "arguments": json.dumps({"latitude": 52.52, "longitude": 13.405})}
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves the canned responses, optionally with added latency and injected 503s"""
+
+    # HTTP/1.1 so clients can keep connections alive like against the real APIs
+    protocol_version = "HTTP/1.1"
+    # Streamed chunks go out immediately instead of waiting for the previous ACK
+    disable_nagle_algorithm = True
+    latency = 0.0
+    # Delay between streamed chat completion chunks, like a model generating tokens
+    token_latency = 0.0
+    fail_rate = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self._should_fail():
+            return self._send(503, {"error": "Injected failure"})
+
+        path = urlparse(self.path).path
+        if path == "/v1/forecast":
+            self._send(200, WEATHER)
+        elif path == "/ipify":
+            self._send(200, {"ip": PUBLIC_IP})
+        elif path.startswith("/ipapi/"):
+            self._send(200, LOCATION)
+        elif path == "/duckduckgo":
+            self._send(200, DUCKDUCKGO)
+        else:
+            self._send(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        if self._should_fail():
+            return self._send(503, {"error": "Injected failure"})
+
+        path = urlparse(self.path).path
+        if path != "/v1/chat/completions":
+            return self._send(404, {"error": f"Unknown path {path}"})
+
+        content, tool_calls = self._chat_reply(body)
+        if body.get("stream"):
+            return self._stream_chat(content, tool_calls)
+        self._send(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": CHAT_MODEL,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "tool_calls": tool_calls},
+                "finish_reason": "tool_calls" if tool_calls else "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    def _should_fail(self) -> bool:
+        # The first fail_first requests fail for sure, so retries can be tested deterministically
+        with self.server.fail_lock:
+            if self.server.fail_first > 0:
+                self.server.fail_first -= 1
+                return True
+        return random.random() < self.fail_rate
+
+    def _chat_reply(self, body: dict):
+        """Return the answer text and tool calls for a chat completion request"""
+        messages = body.get("messages") or [{}]
+        last = messages[-1]
+        if last.get("role") == "tool":
+            return CHAT_TOOL_ANSWER, None
+        wants_tools = body.get("tools") and body.get("tool_choice") != "none"
+        if wants_tools and "wetter" in (last.get("content") or "").lower():
+            return None, [WEATHER_TOOL_CALL]
+        return CHAT_ANSWER, None
+
+    def _stream_chat(self, content, tool_calls):
+        """Send the reply as server-sent events, word by word, in a chunked response"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        deltas = [{"role": "assistant", "content": ""}]
+        if tool_calls:
+            deltas.append({"tool_calls": [{"index": index, **call} for index, call in enumerate(tool_calls)]})
+        else:
+            words = content.split(" ")
+            deltas.extend({"content": word if index == 0 else f" {word}"} for index, word in enumerate(words))
+
+        for index, delta in enumerate(deltas):
+            if index > 1:
+                time.sleep(self.token_latency)
+            self._write_event({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": CHAT_MODEL,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+            })
+        self._write_event({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": CHAT_MODEL,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls" if tool_calls else "stop"}]
+        })
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, event: dict):
+        self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    fail_rate: float = 0.0,
+    token_latency: float = 0.0,
+    fail_first: int = 0
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub server in a background thread and return it with its base URL"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"latency": latency, "fail_rate": fail_rate, "token_latency": token_latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.fail_first = fail_first
+    server.fail_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def stub_env(base_url: str) -> dict:
+    """Environment variables that point tools.py and the LLM client at the stub server.
+
+    Persistent tool caches are turned off, or the stub's IP and location would
+    be served to real runs afterwards.
+    """
+    return {
+        "tool_cache_persist": "0",
+        "api_endpoint": f"{base_url}/v1",
+        "api_key": "stub",
+        "weather_api_url": f"{base_url}/v1/forecast",
+        "ipify_url": f"{base_url}/ipify",
+        "ipapi_url": f"{base_url}/ipapi",
+        "duckduckgo_api_url": f"{base_url}/duckduckgo"
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the APIs used by tools.py and the chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Delay between streamed chat completion chunks")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency_ms / 1000, args.fail_rate, args.token_latency_ms / 1000)
+    print(f"Stub server running at {base_url}, point the tools and the assistant at it with:")
+    for name, value in stub_env(base_url).items():
+        print(f"export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,455 @@ def test_sdxl_onnx():
     image_path = generate_image(prompt)
     print(f"Image generated at: {image_path}")
 
+def test_generate_stream():
+    import time
+    import torch
+    from fastapi.testclient import TestClient
+    from PIL import Image
+    import api
+
+    class StubGenerator:
+        """Stands in for the pipeline: runs the step callback on blank latents and returns blank images"""
+
+        def generate_images(self, prompts, seeds=None, num_inference_steps=1, callback_on_step_end=None, **kwargs):
+            for step in range(num_inference_steps):
+                if callback_on_step_end is not None:
+                    callback_on_step_end(self, step, None, {"latents": torch.zeros(len(prompts), 4, 8, 8)})
+            return [Image.new("RGB", (64, 64)) for _ in prompts]
+
+    api.scheduler.executor.factory = StubGenerator
+    api.scheduler.executor.warmup = None
+    steps, api.INFERENCE_STEPS = api.INFERENCE_STEPS, 2
+    try:
+        with TestClient(api.app) as client:
+            while client.get("/ready").status_code != 200:
+                time.sleep(0.05)
+            response = client.get("/generate/stream", params={"prompt": "a cat"})
+    finally:
+        api.INFERENCE_STEPS = steps
+    events = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+    # One preview for the first of two steps, none for the last
+    assert events[-3:] == ["started", "preview", "image"], events
+    print(f"Stream sent {events}")
+
+def test_scheduler():
+    import asyncio
+    import threading
+    import time
+    from inference import ExecutorBusy, ExecutorUnavailable, InferenceExecutor
+    from scheduler import BatchScheduler
+
+    try:
+        BatchScheduler(lambda pipeline, items: items, InferenceExecutor(lambda: None, num_workers=1), max_batch_size=4, max_queue=2)
+        raise AssertionError("max_queue < max_batch_size was accepted")
+    except ValueError:
+        pass
+
+    batches = []
+    loaded = threading.Event()
+    gate = threading.Event()
+    gate.set()
+
+    def run_batch(pipeline, items):
+        # Stands in for the model: records each batch and blocks while the gate is closed
+        batches.append(list(items))
+        gate.wait()
+        return [item * 2 for item in items]
+
+    async def run():
+        executor = InferenceExecutor(lambda: loaded.wait(), num_workers=1)
+        scheduler = BatchScheduler(run_batch, executor, max_batch_size=4, max_wait_ms=200, max_queue=4)
+        await scheduler.start()
+
+        # 503 with Retry-After while the model is still loading
+        try:
+            scheduler.enqueue(0)
+            raise AssertionError("Request accepted before the model was loaded")
+        except ExecutorUnavailable as e:
+            assert e.status_code == 503 and e.retry_after > 0
+        loaded.set()
+        while executor.status != "ready":
+            await asyncio.sleep(0.01)
+
+        # Concurrent requests are fanned into one batch and their results fanned back out
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(4)))
+        assert results == [0, 2, 4, 6] and batches == [[0, 1, 2, 3]], (results, batches)
+
+        # Keep the only worker busy, then fill the queue
+        gate.clear()
+        running = scheduler.enqueue(10)
+        while len(batches) < 2:
+            await asyncio.sleep(0.01)
+        queued = [scheduler.enqueue(i) for i in range(20, 24)]
+        try:
+            scheduler.enqueue(99)
+            raise AssertionError("Request accepted with a full queue")
+        except ExecutorBusy as e:
+            assert e.status_code == 429 and e.retry_after >= 1
+
+        # A cancelled request never reaches the model
+        scheduler.cancel(queued[1])
+        gate.set()
+        assert await running == 20
+        assert await asyncio.gather(queued[0], queued[2], queued[3]) == [40, 44, 46]
+        assert batches[2] == [20, 22, 23], batches
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+    # Workers don't build pipelines concurrently before the first one is ready, it may write shared files
+    active = []
+    overlaps = []
+
+    def factory():
+        active.append(1)
+        overlaps.append(len(active))
+        time.sleep(0.05)
+        active.pop()
+
+    executor = InferenceExecutor(factory, num_workers=3)
+    executor.start()
+    while executor.status != "ready" or "loading" in executor.readiness()["workers"]:
+        time.sleep(0.01)
+    executor.shutdown()
+    assert max(overlaps) == 1 and len(overlaps) == 3, overlaps
+    print(f"Scheduler batched {len(batches)} batches: {batches}")
+
+def test_image_cache():
+    import tempfile
+    from image_cache import ImageCache
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ImageCache(cache_dir, max_memory_bytes=16, max_disk_bytes=20)
+        cache.put("a", b"aaaaaaaa")
+        cache.put("b", b"bbbbbbbb")
+        # Reading "a" makes "b" the least recently used entry in both tiers
+        assert cache.get("a") == b"aaaaaaaa"
+        cache.put("c", b"cccccccc")
+        assert cache.get("b") is None
+        assert cache.stats()["memory_entries"] == 2 and cache.stats()["disk_entries"] == 2, cache.stats()
+
+        # A new instance on the same directory (e.g. after a restart) serves from disk
+        reopened = ImageCache(cache_dir, max_memory_bytes=16, max_disk_bytes=20)
+        assert reopened.get("a") == b"aaaaaaaa" and reopened.get("c") == b"cccccccc"
+        assert reopened.get("b") is None
+        assert reopened.stats()["hits_disk"] == 2 and reopened.stats()["misses"] == 1, reopened.stats()
+
+    # Encoder settings change the bytes, so they are part of the key
+    key = ImageCache.make_key("model", "a cat", None, 512, 512, 4, 0.0, 42, "webp", png_compress_level=1, webp_quality=80)
+    assert key != ImageCache.make_key("model", "a cat", None, 512, 512, 4, 0.0, 42, "webp", png_compress_level=1, webp_quality=90)
+    assert key == ImageCache.make_key("model", "a cat", None, 512, 512, 4, 0.0, 42, "webp", png_compress_level=6, webp_quality=80)
+    print("Image cache evicts least recently used entries and hits across instances")
+
+def test_embedding_cache():
+    from types import SimpleNamespace
+    import numpy as np
+    from embedding_cache import PromptEmbeddingCache
+
+    class WordTokenizer:
+        """Stands in for a CLIP tokenizer: one id per word, truncated like the real one"""
+        model_max_length = 4
+
+        def __call__(self, prompt, truncation=True, max_length=None):
+            return SimpleNamespace(input_ids=[sum(map(ord, word)) for word in prompt.split()][:max_length])
+
+    batches = []
+
+    def encode(prompts):
+        batches.append(prompts)
+        return np.ones((len(prompts), 2, 3)) * len(batches), np.ones((len(prompts), 3))
+
+    cache = PromptEmbeddingCache([WordTokenizer(), WordTokenizer()], encode, max_entries=2)
+    # Prompts with the same token ids share one entry, misses are encoded in one batch
+    embeds, pooled = cache.encode(["a cat", "a  cat", "a dog"])
+    assert batches == [["a cat", "a dog"]] and embeds.shape == (3, 2, 3) and pooled.shape == (3, 3), batches
+    assert cache.stats() == {"entries": 2, "hits": 0, "misses": 2}, cache.stats()
+    # Text past the token limit doesn't change the key
+    cache.encode(["a cat sat on", "a cat sat on the mat"])
+    assert batches[1:] == [["a cat sat on"]], batches
+    # That evicted the least recently used entry, "a cat"
+    cache.encode(["a dog"])
+    assert len(batches) == 2 and cache.stats()["hits"] == 1, (batches, cache.stats())
+    cache.encode(["a cat"])
+    assert batches[2:] == [["a cat"]] and cache.stats()["entries"] == 2, (batches, cache.stats())
+    print(f"Embedding cache encoded {len(batches)} batches: {cache.stats()}")
+
+def test_save_image_bytes():
+    import os
+    import tempfile
+    from image_io import save_image_bytes
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        path = save_image_bytes(b"image", output_dir, "a cat: neon/rain", "webp")
+        # Two levels of shards from the content hash, the prompt cleaned for the file name
+        relative = os.path.relpath(path, output_dir).split(os.sep)
+        assert len(relative) == 3 and relative[2].startswith(relative[0] + relative[1]), relative
+        assert relative[2].endswith("_a cat neonrain.webp"), relative
+        with open(path, "rb") as f:
+            assert f.read() == b"image"
+
+        # Identical bytes map to the same file, different bytes to another one
+        assert save_image_bytes(b"image", output_dir, "a cat: neon/rain", "webp") == path
+        assert save_image_bytes(b"other", output_dir, "a cat: neon/rain", "webp") != path
+        files = [name for _, _, names in os.walk(output_dir) for name in names]
+        assert len(files) == 2 and not any(name.endswith(".tmp") for name in files), files
+    print("Images saved under content-addressed paths")
+
+def test_energy_vad():
+    import math
+    import struct
+    from stt import FRAME_SAMPLES, SAMPLE_RATE, EnergyVAD
+
+    def frame(amplitude):
+        samples = [int(amplitude * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE)) for i in range(FRAME_SAMPLES)]
+        return struct.pack(f"<{FRAME_SAMPLES}h", *samples)
+
+    vad = EnergyVAD()
+    assert not any(vad.is_speech(frame(100)) for _ in range(20))
+    assert vad.is_speech(frame(8000))
+    # Quiet speech counts in a silent room, but not over louder background noise
+    assert EnergyVAD().is_speech(frame(700))
+    for _ in range(200):
+        assert not vad.is_speech(frame(350))
+    assert not vad.is_speech(frame(700)) and vad.noise_floor > 200, vad.noise_floor
+    print(f"VAD noise floor adapted to {vad.noise_floor:.0f}")
+
+def test_tools_stub():
+    import asyncio
+    import os
+    from stub_server import start_stub_server, stub_env
+
+    # Point the network tools at the local stub before tools.py reads its endpoints
+    server, base_url = start_stub_server()
+    # Also turns off persisted results, which would hide the stub
+    os.environ.update(stub_env(base_url))
+    import tools
+    from tool_cache import cache_stats
+
+    async def run():
+        return await asyncio.gather(tools.get_weather(52.52, 13.405), tools.location(), tools.search_duckduckgo("Berlin"))
+
+    weather, location, search = asyncio.run(run())
+    # The second round is served from the tool caches
+    assert asyncio.run(run())[1] == location
+    server.shutdown()
+    assert cache_stats()["location"]["hits"] >= 1, cache_stats()
+    assert weather["temperature"] == "18.4°C", weather
+    assert location["city"] == "Berlin", location
+    assert search["source"] == "Wikipedia", search
+    print(f"Tools answered from stub: {weather['condition']}, {location['city']}")
+
+def test_tool_cache_persist():
+    import os
+    import tempfile
+    from tool_cache import TTLCache
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TTLCache("location", ttl=60, persist=True, cache_dir=cache_dir)
+        cache.put("ip", {"city": "Berlin"})
+        # Written later on a timer thread, not by the put
+        assert not os.path.exists(cache.path)
+        cache.flush()
+        assert TTLCache("location", ttl=60, persist=True, cache_dir=cache_dir).get("ip") == {"city": "Berlin"}
+    print("Tool cache saved in the background and reloaded")
+
+def test_http_retries():
+    import asyncio
+    import time
+    import httpx
+    from http_client import RETRY_BACKOFF, create_client, get_json
+    from stub_server import PUBLIC_IP, start_stub_server
+
+    async def fetch(base_url: str, retries: int):
+        async with create_client() as client:
+            return await get_json(f"{base_url}/ipify", retries=retries, client=client)
+
+    # Two 503s, then the third attempt succeeds after two backoffs
+    server, base_url = start_stub_server(fail_first=2)
+    started = time.perf_counter()
+    assert asyncio.run(fetch(base_url, retries=2)) == {"ip": PUBLIC_IP}
+    elapsed = time.perf_counter() - started
+    assert server.fail_first == 0
+    # Backoff is RETRY_BACKOFF, then doubled, each with 0.5-1.5x jitter
+    assert elapsed >= RETRY_BACKOFF * 3 * 0.5, elapsed
+
+    # One failure more than there are retries surfaces the last 503
+    server.fail_first = 3
+    try:
+        asyncio.run(fetch(base_url, retries=2))
+        assert False, "Expected the 503 to be raised"
+    except httpx.HTTPStatusError as e:
+        assert e.response.status_code == 503
+    server.shutdown()
+    print(f"Retried through two failures in {elapsed:.2f}s")
+
+def test_import_budget():
+    from bench_import import check_startup
+
+    # Network, speech and LLM packages must only load on first use
+    problems = check_startup()
+    assert not problems, problems
+    print("sprachassistent starts within its import budget")
+
+def test_router():
+    from router import TurnMetrics, match_intent, route
+
+    assert match_intent("Wie spät ist es?").name == "time"
+    assert match_intent("Hey, sag mir bitte welcher Tag heute ist").name == "date"
+    # Anything beyond the plain question needs the model
+    assert match_intent("Wie viele Tage sind es noch bis Weihnachten?") is None
+    assert match_intent("Wie spät ist es in Tokio?") is None
+
+    metrics = TurnMetrics()
+    answer = route("Welches Datum haben wir heute?", metrics)
+    assert answer.startswith("Heute ist"), answer
+    assert metrics.llm_calls == 0 and metrics.route == "template:date", metrics
+    print(f"Router answered without the model: {answer}")
+
+def test_llm_stub():
+    from llm_backend import create_llm_client
+    from router import TurnMetrics
+    from sprachassistent import stream_ai_response
+    from stub_server import CHAT_ANSWER, CHAT_TOOL_ANSWER, start_stub_server
+
+    server, base_url = start_stub_server()
+    client = create_llm_client("remote", base_url=f"{base_url}/v1", api_key="stub")
+
+    metrics = TurnMetrics()
+    answer = "".join(stream_ai_response(client, "Erzähl mir etwas", metrics=metrics))
+    assert answer == CHAT_ANSWER and metrics.llm_calls == 1, (answer, metrics)
+
+    # The stub asks for get_weather, so the answer needs a second completion
+    metrics = TurnMetrics()
+    answer = "".join(stream_ai_response(client, "Wie ist das Wetter?", metrics=metrics))
+    server.shutdown()
+    assert answer == CHAT_TOOL_ANSWER and metrics.llm_calls == 2, (answer, metrics)
+    print(f"LLM stub answered: {answer}")
+
+def test_sandbox_pool():
+    import tempfile
+    import docker
+    from autogen.coding import CodeBlock
+    from sandbox import PooledDockerCodeExecutor, SandboxPool, build_sandbox_image
+
+    client = docker.from_env()
+    pool = SandboxPool(client, build_sandbox_image(client, "python:3.9-slim"), tempfile.mkdtemp(), size=1, keep_warm=False)
+    with PooledDockerCodeExecutor(pool, timeout=30) as executor:
+        result = executor.execute_code_blocks([CodeBlock(code="import numpy; print(numpy.__name__)", language="python")])
+        first = executor.sandbox.id
+    assert result.exit_code == 0 and result.output.strip() == "numpy", result
+    # The next session gets the same warm container back
+    with PooledDockerCodeExecutor(pool, timeout=30) as executor:
+        executor.execute_code_blocks([CodeBlock(code="echo ok", language="sh")])
+        assert executor.sandbox.id == first
+    pool.close()
+    print(f"Sandbox {first} reused across sessions")
+
+def test_exec_cache_and_kernel():
+    import os
+    import tempfile
+    import docker
+    from autogen.coding import CodeBlock
+    from exec_cache import CachingCodeExecutor
+    from sandbox import PooledDockerCodeExecutor, SandboxPool, build_sandbox_image
+
+    client = docker.from_env()
+    pool = SandboxPool(client, build_sandbox_image(client, "python:3.9-slim"), tempfile.mkdtemp(), size=1, keep_warm=False)
+    block = CodeBlock(code="open('result.txt', 'w').write('42'); print('done')", language="python")
+    cache_dir = tempfile.mkdtemp()
+    image_id = client.images.get(pool.image).id
+    with CachingCodeExecutor(PooledDockerCodeExecutor(pool, timeout=30), image_id, cache_dir=cache_dir) as executor:
+        first = executor.execute_code_blocks([block])
+        second = executor.execute_code_blocks([block])
+        # An install changes the environment, so the same code runs again afterwards
+        executor.execute_code_blocks([CodeBlock(code="pip install --quiet six", language="sh")])
+        third = executor.execute_code_blocks([block])
+    assert first.output == second.output == third.output == "done\n", (first, second, third)
+    assert executor.stats() == {"hits": 1, "misses": 2}, executor.stats()
+
+    # A new session on a fresh container hits again, expired entries and their files are removed
+    with CachingCodeExecutor(PooledDockerCodeExecutor(pool, timeout=30), image_id, cache_dir=cache_dir) as executor:
+        executor.execute_code_blocks([block])
+        assert executor.stats() == {"hits": 1, "misses": 0}, executor.stats()
+        executor.collect_garbage(max_age=-1)
+    assert not any(files for _, _, files in os.walk(cache_dir)), list(os.walk(cache_dir))
+
+    # In kernel mode the second block sees the first block's variables
+    with PooledDockerCodeExecutor(pool, timeout=30, kernel=True) as executor:
+        executor.execute_code_blocks([CodeBlock(code="data = list(range(10))", language="python")])
+        result = executor.execute_code_blocks([CodeBlock(code="print(sum(data))", language="python")])
+    pool.close()
+    assert result.exit_code == 0 and result.output == "45\n", result
+    print("Execution cache hit and kernel state kept")
+
+def test_conversation_budget():
+    import time
+    from types import SimpleNamespace
+    from conversation import Conversation
+
+    class StubSummarizer:
+        """Answers summary requests with a fixed short text and counts them"""
+
+        def __init__(self, local=False):
+            self.local = local
+            self.calls = 0
+            self.chat = SimpleNamespace(completions=self)
+
+        def create(self, **kwargs):
+            self.calls += 1
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Der Nutzer heißt Anna."))])
+
+    def fill(conversation):
+        for i in range(8):
+            conversation.add_turn(f"Frage {i} " + "wort " * 40, f"Antwort {i} " + "wort " * 40)
+            # Let each background compaction finish before the next turn
+            while conversation._summarizing:
+                time.sleep(0.01)
+
+    client = StubSummarizer()
+    conversation = Conversation(client, "stub", "System", max_history_tokens=200, keep_recent_turns=2)
+    fill(conversation)
+    assert client.calls > 0 and conversation.summary == "Der Nutzer heißt Anna."
+    assert conversation.history_tokens() <= 200, conversation.history_tokens()
+    # The most recent turn is always kept verbatim
+    assert conversation.turns[-1][0]["content"].startswith("Frage 7"), conversation.turns
+
+    # A local model isn't asked for summaries, old turns are dropped instead
+    local = StubSummarizer(local=True)
+    conversation = Conversation(local, "stub", "System", max_history_tokens=200, keep_recent_turns=2)
+    fill(conversation)
+    assert local.calls == 0 and conversation.summary is None
+    assert conversation.history_tokens() <= 200 and conversation.turns[-1][0]["content"].startswith("Frage 7")
+    print(f"Conversation kept {len(conversation.turns)} turn(s) within the token budget")
+
+def test_sentence_splitter():
+    from speech_stream import split_sentences
+
+    text = "Heute ist Montag, der 3. Mai 2024. Das Wetter ist heute sonnig und warm. Am 4. wird es regnen, sagt der Bericht."
+    expected = ["Heute ist Montag, der 3. Mai 2024.", "Das Wetter ist heute sonnig und warm.", "Am 4. wird es regnen, sagt der Bericht."]
+    # Same sentences however the stream happens to be chunked
+    for size in (1, 4, len(text)):
+        sentences = list(split_sentences(text[i:i + size] for i in range(0, len(text), size)))
+        assert sentences == expected, (size, sentences)
+    print("Sentence splitter keeps ordinals and splits after years")
+
 test_sdxl()
 test_sdxl_onnx()
+test_generate_stream()
+test_scheduler()
+test_image_cache()
+test_embedding_cache()
+test_save_image_bytes()
+test_energy_vad()
+test_tools_stub()
+test_tool_cache_persist()
+test_http_retries()
+test_import_budget()
+test_router()
+test_conversation_budget()
+test_sentence_splitter()
+test_llm_stub()
+test_sandbox_pool()
+test_exec_cache_and_kernel()
 
 print("All tests passed!")
\ No newline at end of file
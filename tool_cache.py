@@ -0,0 +1,237 @@
+import asyncio
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Constants
+CACHE_DIR = "output/cache/tools"
+MAX_ENTRIES = 256
+# Persisted caches are written at most this often, on a timer thread instead of the caller's
+SAVE_DELAY = 1.0
+
+_MISSING = object()
+_caches: Dict[str, "TTLCache"] = {}
+
+def is_cacheable(result: Any) -> bool:
+    """Tools report failures as {"error": ...}, which must not be cached"""
+    return not (isinstance(result, dict) and "error" in result)
+
+class TTLCache:
+    """Bounded LRU of tool results that expire after ``ttl`` seconds.
+
+    With ``persist`` the entries are written to ``cache_dir/<name>.json`` and
+    reloaded on startup, so e.g. the location survives restarts. Expiry uses
+    wall clock time for the same reason. Changes are written in the background
+    ``SAVE_DELAY`` seconds after the first one and on exit, so a put never
+    waits for the disk.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = MAX_ENTRIES, persist: bool = False, cache_dir: str = CACHE_DIR):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = os.path.join(cache_dir, f"{name}.json") if persist else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Keeps writes in order, so an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._load()
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable tool cache {self.path}: {str(e)}")
+            return
+        now = time.time()
+        for key, (expires_at, value) in entries.items():
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+
+    def _schedule_save(self):
+        """Mark the entries as changed, call with the lock held"""
+        if self.path is None:
+            return
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending changes to disk now"""
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if self.path is None or not self._dirty:
+                    return
+                entries = dict(self._entries)
+                self._dirty = False
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Error saving tool cache {self.path}: {str(e)}")
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or _MISSING if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._schedule_save()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+def ttl_cache(
+    ttl: float,
+    name: Optional[str] = None,
+    persist: bool = False,
+    max_entries: int = MAX_ENTRIES,
+    key: Optional[Callable[..., Any]] = None
+):
+    """Cache a tool's results for ``ttl`` seconds, for sync and async tools alike.
+
+    Concurrent calls with the same arguments share one in-flight call instead
+    of each hitting the API. ``key`` maps the call arguments to what identifies
+    a result, e.g. rounded coordinates; by default all arguments do.
+    """
+    def decorator(fn):
+        cache = TTLCache(name or fn.__name__, ttl, max_entries=max_entries, persist=persist)
+        _caches[cache.name] = cache
+        signature = inspect.signature(fn)
+
+        def make_key(*args, **kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            identity = key(**bound.arguments) if key is not None else bound.arguments
+            return json.dumps(identity, sort_keys=True, default=str)
+
+        if inspect.iscoroutinefunction(fn):
+            in_flight: Dict[str, asyncio.Future] = {}
+
+            async def call_and_store(cache_key, args, kwargs):
+                try:
+                    result = await fn(*args, **kwargs)
+                    if is_cacheable(result):
+                        cache.put(cache_key, result)
+                    return result
+                finally:
+                    in_flight.pop(cache_key, None)
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                cache_key = make_key(*args, **kwargs)
+                result = cache.get(cache_key)
+                if result is not _MISSING:
+                    return result
+
+                task = in_flight.get(cache_key)
+                if task is None:
+                    task = in_flight[cache_key] = asyncio.ensure_future(call_and_store(cache_key, args, kwargs))
+                else:
+                    cache.coalesced += 1
+                # A caller timing out must not cancel the call others are waiting on
+                return await asyncio.shield(task)
+        else:
+            in_flight: Dict[str, dict] = {}
+            in_flight_lock = threading.Lock()
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                cache_key = make_key(*args, **kwargs)
+                result = cache.get(cache_key)
+                if result is not _MISSING:
+                    return result
+
+                with in_flight_lock:
+                    call = in_flight.get(cache_key)
+                    owner = call is None
+                    if owner:
+                        call = in_flight[cache_key] = {"done": threading.Event(), "result": None, "error": None}
+                    else:
+                        cache.coalesced += 1
+
+                if not owner:
+                    call["done"].wait()
+                    if call["error"] is not None:
+                        raise call["error"]
+                    return call["result"]
+
+                try:
+                    call["result"] = result = fn(*args, **kwargs)
+                    if is_cacheable(result):
+                        cache.put(cache_key, result)
+                    return result
+                except Exception as e:
+                    call["error"] = e
+                    raise
+                finally:
+                    with in_flight_lock:
+                        in_flight.pop(cache_key, None)
+                    call["done"].set()
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def cache_stats() -> Dict[str, dict]:
+    """Return hit/miss counters for every tool cache"""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+def clear_caches():
+    """Empty every tool cache, e.g. between benchmark rounds"""
+    for cache in _caches.values():
+        cache.clear()
+
+@atexit.register
+def flush_caches():
+    """Write the pending changes of every persisted tool cache"""
+    for cache in _caches.values():
+        cache.flush()
@@ -0,0 +1,119 @@
+import asyncio
+import inspect
+import json
+import threading
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+import tools as tool_module
+
+# Constants
+DEFAULT_TIMEOUT = 10.0  # seconds
+# Tools that are slower than a plain API request
+TOOL_TIMEOUTS = {
+    "crawl4ai": 30.0,
+    "crawl_many": 60.0,
+    "search_wikipedia": 15.0
+}
+
+def build_registry(schemas: List[dict], namespace: ModuleType = tool_module) -> Dict[str, dict]:
+    """Map every function in an OpenAI tools schema list to its implementation in namespace"""
+    registry = {}
+    for schema in schemas:
+        function = schema["function"]
+        implementation = getattr(namespace, function["name"], None)
+        if not callable(implementation):
+            raise ValueError(f"Tool '{function['name']}' has no implementation in {namespace.__name__}")
+        registry[function["name"]] = {
+            "function": implementation,
+            "required": function.get("parameters", {}).get("required", [])
+        }
+    return registry
+
+class ToolDispatcher:
+    """Runs the tool calls of a model response concurrently.
+
+    Coroutine tools run on a persistent event loop owned by the dispatcher, so
+    they can keep clients and browsers open across calls; blocking tools run in
+    the loop's thread pool. Every call has its own timeout, and failures are
+    returned as ``{"error": ...}`` results like the tools themselves do.
+    """
+
+    def __init__(
+        self,
+        schemas: List[dict],
+        namespace: ModuleType = tool_module,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = DEFAULT_TIMEOUT
+    ):
+        self.registry = build_registry(schemas, namespace)
+        self.timeouts = TOOL_TIMEOUTS if timeouts is None else timeouts
+        self.default_timeout = default_timeout
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="tool-dispatcher", daemon=True)
+        self._thread.start()
+
+    async def call(self, name: str, arguments: Any) -> dict:
+        """Run one tool with JSON (or already parsed) arguments"""
+        entry = self.registry.get(name)
+        if entry is None:
+            return {"error": f"Unknown tool '{name}'"}
+
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments) if arguments else {}
+            except json.JSONDecodeError:
+                arguments = {}
+
+        missing = [param for param in entry["required"] if param not in arguments]
+        if missing:
+            return {"error": f"Missing required parameter(s): {', '.join(missing)}"}
+
+        function = entry["function"]
+        timeout = self.timeouts.get(name, self.default_timeout)
+        try:
+            if inspect.iscoroutinefunction(function):
+                return await asyncio.wait_for(function(**arguments), timeout)
+            return await asyncio.wait_for(asyncio.to_thread(function, **arguments), timeout)
+        except asyncio.TimeoutError:
+            return {"error": f"Tool '{name}' timed out after {timeout}s"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def run_tool_calls(self, tool_calls: list) -> List[dict]:
+        """Run all tool calls at once and return them as tool messages, in call order"""
+        results = await asyncio.gather(*(
+            self.call(tool_call.function.name, tool_call.function.arguments)
+            for tool_call in tool_calls
+        ))
+        return [
+            {
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": tool_call.function.name,
+                "content": json.dumps(result)
+            }
+            for tool_call, result in zip(tool_calls, results)
+        ]
+
+    def dispatch(self, tool_calls: list) -> List[dict]:
+        """Blocking entry point for synchronous callers"""
+        return asyncio.run_coroutine_threadsafe(self.run_tool_calls(tool_calls), self.loop).result()
+
+    def run(self, coroutine) -> Any:
+        """Run a coroutine on the dispatcher loop from synchronous code"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+_default_dispatcher = None
+_default_dispatcher_lock = threading.Lock()
+
+def get_tool_dispatcher() -> ToolDispatcher:
+    """Return the dispatcher for the tools schema list, created on first use"""
+    global _default_dispatcher
+    with _default_dispatcher_lock:
+        if _default_dispatcher is None:
+            _default_dispatcher = ToolDispatcher(tool_module.tools)
+        return _default_dispatcher
@@ -1,5 +1,23 @@
 from datetime import datetime
 import os
+from tool_cache import ttl_cache
+
+# Only the schemas below are needed at import time. Heavy dependencies (httpx,
+# crawl4ai/Playwright, wikipedia) are imported inside the tools on first call.
+
+# API endpoints, overridable e.g. to run the tools against stub_server.py
+WEATHER_API_URL = os.getenv("weather_api_url", "https://api.open-meteo.com/v1/forecast")
+IPIFY_URL = os.getenv("ipify_url", "https://api.ipify.org")
+IPAPI_URL = os.getenv("ipapi_url", "https://ipapi.co")
+DUCKDUCKGO_API_URL = os.getenv("duckduckgo_api_url", "https://api.duckduckgo.com/")
+
+# How long tool results stay valid, in seconds
+IP_CACHE_TTL = float(os.getenv("ip_cache_ttl", 6 * 3600))
+LOCATION_CACHE_TTL = float(os.getenv("location_cache_ttl", 6 * 3600))
+WEATHER_CACHE_TTL = float(os.getenv("weather_cache_ttl", 10 * 60))
+WIKIPEDIA_CACHE_TTL = float(os.getenv("wikipedia_cache_ttl", 3 * 24 * 3600))
+# Keep cached tool results in output/cache/tools across restarts
+TOOL_CACHE_PERSIST = os.getenv("tool_cache_persist", "1") == "1"
 
 def get_current_date():
     """Get the current date and time."""
@@ -10,17 +28,19 @@ def get_current_date():
         "weekday": current_datetime.strftime("%A")
     }
 
-def get_weather(latitude: float, longitude: float):
+# Coordinates rounded to about 1 km share one forecast
+@ttl_cache(WEATHER_CACHE_TTL, key=lambda latitude, longitude: [round(latitude, 2), round(longitude, 2)])
+async def get_weather(latitude: float, longitude: float):
     """Get weather information for given coordinates using open-meteo.com API."""
-    import requests
+    from http_client import get_json
 
     try:
-        # Build API URL with parameters
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m,precipitation,weathercode,windspeed_10m"
-        
         # Make API request
-        response = requests.get(url)
-        data = response.json()
+        data = await get_json(WEATHER_API_URL, params={
+            "latitude": latitude,
+            "longitude": longitude,
+            "current": "temperature_2m,precipitation,weathercode,windspeed_10m"
+        })
         current = data.get('current', {})
         
         # Map weather codes to conditions
@@ -54,10 +74,11 @@ def get_weather(latitude: float, longitude: float):
             "error": str(e)
         }
 
-def get_ip():
+@ttl_cache(IP_CACHE_TTL, persist=TOOL_CACHE_PERSIST)
+async def get_ip():
     """Get both local and public IP addresses."""
     import socket
-    import requests
+    from http_client import get_json
 
     try:
         # Get local IP
@@ -67,8 +88,7 @@ def get_ip():
         s.close()
 
         # Get public IP
-        response = requests.get("https://api.ipify.org?format=json")
-        public_ip = response.json()["ip"]
+        public_ip = (await get_json(IPIFY_URL, params={"format": "json"}))["ip"]
 
         return {
             "local_ip": local_ip,
@@ -79,19 +99,19 @@ def get_ip():
             "error": str(e)
         }
 
-def location():
+@ttl_cache(LOCATION_CACHE_TTL, persist=TOOL_CACHE_PERSIST)
+async def location():
     """Get location information based on IP address."""
-    import requests
-    
+    from http_client import get_json
+
     try:
         # Get IP addresses using existing function
-        ip_info = get_ip()
+        ip_info = await get_ip()
         if "error" in ip_info:
             return {"error": ip_info["error"]}
             
         # Use public IP to get location data
-        response = requests.get(f"https://ipapi.co/{ip_info['public_ip']}/json/")
-        location_data = response.json()
+        location_data = await get_json(f"{IPAPI_URL}/{ip_info['public_ip']}/json/")
         
         # Return relevant location information
         return {
@@ -107,6 +127,7 @@ def location():
             "error": str(e)
         }
 
+@ttl_cache(WIKIPEDIA_CACHE_TTL, persist=TOOL_CACHE_PERSIST)
 def search_wikipedia(query):
     """Search Wikipedia for a given query."""
     import wikipedia
@@ -126,17 +147,13 @@ def search_wikipedia(query):
     except Exception as e:
         return {"error": str(e)}
 
-def search_duckduckgo(query):
+async def search_duckduckgo(query):
     """Search DuckDuckGo for a given query."""
-    import requests
+    from http_client import get_json
 
     try:
-        # Build search URL
-        url = f"https://api.duckduckgo.com/?q={query}&format=json"
-        
-        # Make API request
-        response = requests.get(url)
-        data = response.json()
+        # Make API request, the query is URL-encoded by the client
+        data = await get_json(DUCKDUCKGO_API_URL, params={"q": query, "format": "json"})
         
         # Extract relevant information
         abstract = data.get("AbstractText")
@@ -153,30 +170,25 @@ def search_duckduckgo(query):
             "error": str(e)
         }
 
-import asyncio
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+# Upper bound on pages in one crawl_many call
+MAX_CRAWL_URLS = 8
 
 async def crawl4ai(url: str):
     """Crawl a webpage and extract content using crawl4ai."""
-    try:
-        browser_config = BrowserConfig(
-            headless=True,
-            verbose=True
-        )
-        
-        run_config = CrawlerRunConfig(
-            cache_mode=CacheMode.ENABLED
-        )
-        
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            result = await crawler.arun(
-                url=url,
-                config=run_config
-            )
-            return {"content": result.markdown}
-            
-    except Exception as e:
-        return {"error": str(e)}
+    from crawler_pool import get_crawler_pool
+
+    # Runs on the shared browser, so only the first crawl pays the startup
+    return await get_crawler_pool().crawl(url)
+
+async def crawl_many(urls: list):
+    """Crawl several webpages in parallel and extract their content."""
+    from crawler_pool import get_crawler_pool
+
+    if len(urls) > MAX_CRAWL_URLS:
+        return {"error": f"At most {MAX_CRAWL_URLS} URLs per call"}
+
+    results = await get_crawler_pool().crawl_many(urls)
+    return {"pages": [{"url": url, **result} for url, result in zip(urls, results)]}
 
 # Define available tools/functions for the model
 tools = [
@@ -284,5 +296,23 @@ tools = [
                 "required": ["url"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "crawl_many",
+            "description": "Crawl several webpages in parallel and extract their content",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "urls": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "The URLs to crawl"
+                    }
+                },
+                "required": ["urls"]
+            }
+        }
     }
 ]
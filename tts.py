@@ -0,0 +1,187 @@
+import io
+import os
+import subprocess
+import threading
+import wave
+from collections import OrderedDict
+from typing import List, NamedTuple
+
+# Constants
+# "gtts" (online, default), "piper" or "espeak" (both offline)
+TTS_BACKEND = os.getenv("tts_backend", "gtts")
+TTS_LANGUAGE = "de"
+PIPER_MODEL_PATH = os.getenv("piper_model_path", "models/de_DE-thorsten-medium.onnx")
+GTTS_SAMPLE_RATE = 24000
+# Phrase cache, only short texts are worth keeping
+CACHE_ENTRIES = 128
+MAX_CACHED_CHARS = 120
+# Phrases the assistant says often, synthesized ahead of time
+COMMON_PHRASES = [
+    "Entschuldigung, ich konnte Sie nicht verstehen",
+    "Einen Moment bitte.",
+    "Das habe ich leider nicht gefunden."
+]
+
+class Audio(NamedTuple):
+    """Mono 16-bit PCM in memory"""
+    pcm: bytes
+    sample_rate: int
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / 2 / self.sample_rate
+
+def wav_to_audio(data: bytes) -> Audio:
+    with wave.open(io.BytesIO(data), "rb") as f:
+        if f.getsampwidth() != 2 or f.getnchannels() != 1:
+            raise ValueError("Expected mono 16-bit WAV")
+        return Audio(f.readframes(f.getnframes()), f.getframerate())
+
+class GTTSBackend:
+    """Google TTS, with the MP3 decoded to PCM in memory (no file, no player process)"""
+
+    name = "gtts"
+
+    def __init__(self, language: str = TTS_LANGUAGE, sample_rate: int = GTTS_SAMPLE_RATE):
+        import miniaudio
+        from gtts import gTTS
+
+        self._miniaudio = miniaudio
+        self._gtts = gTTS
+        self.language = language
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text: str) -> Audio:
+        mp3 = io.BytesIO()
+        self._gtts(text=text, lang=self.language).write_to_fp(mp3)
+        decoded = self._miniaudio.decode(
+            mp3.getvalue(),
+            output_format=self._miniaudio.SampleFormat.SIGNED16,
+            nchannels=1,
+            sample_rate=self.sample_rate
+        )
+        return Audio(decoded.samples.tobytes(), decoded.sample_rate)
+
+class PiperBackend:
+    """Piper neural TTS on CPU, the voice model is loaded once"""
+
+    name = "piper"
+
+    def __init__(self, model_path: str = PIPER_MODEL_PATH):
+        from piper import PiperVoice
+
+        print(f"Loading Piper voice from {model_path}...")
+        self._voice = PiperVoice.load(model_path)
+        self.sample_rate = self._voice.config.sample_rate
+
+    def synthesize(self, text: str) -> Audio:
+        if hasattr(self._voice, "synthesize_stream_raw"):
+            pcm = b"".join(self._voice.synthesize_stream_raw(text))
+        else:
+            # piper-tts >= 1.3 yields audio chunks per sentence
+            pcm = b"".join(chunk.audio_int16_bytes for chunk in self._voice.synthesize(text))
+        return Audio(pcm, self.sample_rate)
+
+class EspeakBackend:
+    """espeak-ng, robotic but tiny and always available offline"""
+
+    name = "espeak"
+
+    def __init__(self, voice: str = TTS_LANGUAGE):
+        self.voice = voice
+
+    def synthesize(self, text: str) -> Audio:
+        result = subprocess.run(["espeak-ng", "-v", self.voice, "--stdout", text], capture_output=True, check=True)
+        return wav_to_audio(result.stdout)
+
+TTS_BACKENDS = {
+    "gtts": GTTSBackend,
+    "piper": PiperBackend,
+    "espeak": EspeakBackend
+}
+
+class CachingTTS:
+    """LRU cache of synthesized short phrases in front of a backend"""
+
+    def __init__(self, backend, max_entries: int = CACHE_ENTRIES, max_chars: int = MAX_CACHED_CHARS):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def synthesize(self, text: str) -> Audio:
+        key = " ".join(text.split())
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+            self.misses += 1
+
+        audio = self.backend.synthesize(text)
+        if len(key) <= self.max_chars:
+            with self._lock:
+                self._entries[key] = audio
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return audio
+
+    def pre_synthesize(self, phrases: List[str]):
+        """Synthesize phrases into the cache, e.g. greetings and error messages at startup"""
+        for phrase in phrases:
+            try:
+                self.synthesize(phrase)
+            except Exception as e:
+                print(f"Error pre-synthesizing '{phrase}': {str(e)}")
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+def create_tts(name: str = TTS_BACKEND) -> CachingTTS:
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}', expected one of {list(TTS_BACKENDS)}")
+    return CachingTTS(TTS_BACKENDS[name]())
+
+class AudioOutput:
+    """Plays PCM through one PyAudio output stream that stays open between sentences.
+
+    The stream is only reopened when the sample rate changes, e.g. when
+    switching backends.
+    """
+
+    def __init__(self, device_index=None):
+        import pyaudio
+
+        self._pyaudio = pyaudio
+        self._audio = pyaudio.PyAudio()
+        self.device_index = device_index
+        self._stream = None
+        self._sample_rate = None
+        self._lock = threading.Lock()
+
+    def play(self, audio: Audio):
+        """Play audio, blocking until it has been handed to the device"""
+        with self._lock:
+            if self._stream is None or audio.sample_rate != self._sample_rate:
+                if self._stream is not None:
+                    self._stream.close()
+                self._stream = self._audio.open(
+                    format=self._pyaudio.paInt16,
+                    channels=1,
+                    rate=audio.sample_rate,
+                    output=True,
+                    output_device_index=self.device_index
+                )
+                self._sample_rate = audio.sample_rate
+            self._stream.write(audio.pcm)
+
+    def close(self):
+        with self._lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            self._audio.terminate()
@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import websockets
+from conversation import Conversation
+from llm_backend import warm_up
+from router import TurnMetrics
+from speech_stream import split_sentences
+from sprachassistent import MODEL, SYSTEM_PROMPT, init_openai_client, stream_ai_response
+from stt import STT_BACKEND, NoSpeechRecognized, QueueSource, SpeechRecognizer, create_backend, create_vad
+from tools import tools
+from tts import COMMON_PHRASES, create_tts
+
+# Constants
+HOST = os.getenv("voice_server_host", "0.0.0.0")
+# stub_server.py listens on 8765 by default
+PORT = int(os.getenv("voice_server_port", 8770))
+# Threads for STT decoding, LLM streaming and TTS across all sessions
+WORKER_THREADS = int(os.getenv("voice_server_threads", (os.cpu_count() or 1) * 4))
+MAX_SESSIONS = int(os.getenv("voice_server_max_sessions", 64))
+SESSIONS_DIR = "output/sessions"
+# Also write each answer as a WAV file into the session directory
+SAVE_SESSION_AUDIO = os.getenv("save_session_audio", "0") == "1"
+
+class SharedServices:
+    """Everything that is expensive to create and safe to share between sessions.
+
+    The OpenAI client pools its connections, the TTS phrase cache and the STT
+    models are shared, and tools run on the process-wide tool dispatcher with
+    its HTTP pool, result caches and browser.
+    """
+
+    def __init__(self):
+        self.client = init_openai_client()
+        self.tts = create_tts()
+        self.sessions = 0
+
+class VoiceSession:
+    """One connected client: its own conversation, recognizer and output directory.
+
+    Protocol: the client sends 16 kHz mono 16-bit PCM as binary messages and
+    optionally JSON control messages, ``{"type": "end"}`` to end the current
+    utterance without waiting for silence or ``{"type": "text", "text": ...}``
+    for typed input. The server answers with JSON events (``partial``,
+    ``transcript``, ``sentence``, ``audio``, ``done``, ``error``, and
+    ``no_speech`` when an utterance had no recognizable words) and sends
+    each sentence's PCM as a binary message right after its ``audio`` event.
+    """
+
+    def __init__(self, websocket, services: SharedServices, loop: asyncio.AbstractEventLoop):
+        self.id = uuid.uuid4().hex[:12]
+        self.websocket = websocket
+        self.services = services
+        self.loop = loop
+        self.output_dir = os.path.join(SESSIONS_DIR, self.id)
+        self.conversation = Conversation(services.client, MODEL, SYSTEM_PROMPT)
+        self.source = QueueSource()
+        self.recognizer = SpeechRecognizer(create_backend(STT_BACKEND), self.source, create_vad())
+        self.inputs = asyncio.Queue()
+        self.turns = 0
+        self._listening = threading.Event()
+        self._closed = False
+
+    async def send_json(self, event: dict):
+        await self.websocket.send(json.dumps(event))
+
+    def _send_from_thread(self, event: dict):
+        asyncio.run_coroutine_threadsafe(self.send_json(event), self.loop)
+
+    def _listen_loop(self):
+        """Runs on its own thread: cut utterances out of the incoming audio"""
+        while not self._closed:
+            self._listening.wait()
+            if self._closed:
+                return
+            try:
+                text = self.recognizer.listen(on_partial=lambda partial: self._send_from_thread({"type": "partial", "text": partial}))
+            except NoSpeechRecognized:
+                # Tell the client the utterance was dropped, it would otherwise wait for an answer
+                if not self._closed:
+                    self._send_from_thread({"type": "no_speech"})
+                continue
+            except Exception as e:
+                self._send_from_thread({"type": "error", "detail": f"Speech recognition failed: {str(e)}"})
+                continue
+            # Stop listening until the answer is complete, so the answer isn't heard as input
+            self._listening.clear()
+            self.loop.call_soon_threadsafe(self.inputs.put_nowait, (text, self.recognizer.last_latency))
+
+    async def run(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        listener = threading.Thread(target=self._listen_loop, name=f"listen-{self.id}", daemon=True)
+        self._listening.set()
+        listener.start()
+        turns = asyncio.create_task(self._turn_loop())
+        try:
+            await self.send_json({"type": "session", "id": self.id})
+            async for message in self.websocket:
+                if isinstance(message, bytes):
+                    self.source.feed(message)
+                    continue
+                try:
+                    control = json.loads(message)
+                except ValueError:
+                    control = None
+                if not isinstance(control, dict):
+                    await self.send_json({"type": "error", "detail": "Control messages must be JSON objects"})
+                    continue
+                if control.get("type") == "end":
+                    self.source.end_utterance()
+                elif control.get("type") == "text" and control.get("text"):
+                    self.inputs.put_nowait((control["text"], None))
+        finally:
+            self._closed = True
+            self._listening.set()
+            self.source.close()
+            turns.cancel()
+
+    async def _turn_loop(self):
+        while True:
+            user_input, stt_latency = await self.inputs.get()
+            try:
+                await self.respond(user_input, stt_latency)
+            except websockets.ConnectionClosed:
+                return
+            except Exception as e:
+                await self.send_json({"type": "error", "detail": str(e)})
+            finally:
+                # The listener pauses after each utterance; audio that arrived while answering is stale
+                if not self._listening.is_set():
+                    self.source.clear()
+                    self._listening.set()
+
+    async def respond(self, user_input: str, stt_latency: Optional[float] = None):
+        """Stream the answer sentence by sentence, synthesizing while the model keeps generating"""
+        started = time.perf_counter()
+        self.turns += 1
+        await self.send_json({"type": "transcript", "text": user_input})
+
+        sentences = asyncio.Queue()
+        turn_metrics = TurnMetrics()
+
+        def produce():
+            stream = split_sentences(stream_ai_response(self.services.client, user_input, self.conversation, turn_metrics))
+            try:
+                for sentence in stream:
+                    # The client is gone, stop generating an answer no one hears
+                    if self._closed:
+                        break
+                    self.loop.call_soon_threadsafe(sentences.put_nowait, sentence)
+            finally:
+                stream.close()
+                self.loop.call_soon_threadsafe(sentences.put_nowait, None)
+
+        producer = self.loop.run_in_executor(None, produce)
+        answer = []
+        audio_parts = []
+        first_audio = None
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                break
+            answer.append(sentence)
+            await self.send_json({"type": "sentence", "text": sentence})
+            audio = await self.loop.run_in_executor(None, self.services.tts.synthesize, sentence)
+            if first_audio is None:
+                first_audio = time.perf_counter() - started
+            await self.send_json({"type": "audio", "sample_rate": audio.sample_rate, "bytes": len(audio.pcm)})
+            await self.websocket.send(audio.pcm)
+            audio_parts.append(audio)
+        await producer
+
+        metrics = {
+            "stt_ms": round(stt_latency * 1000) if stt_latency is not None else None,
+            "first_audio_ms": round(first_audio * 1000) if first_audio is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000),
+            "route": turn_metrics.route,
+            "llm_calls": turn_metrics.llm_calls,
+            "llm_ms": round(turn_metrics.llm_seconds * 1000)
+        }
+        await self.loop.run_in_executor(None, self._record_turn, user_input, " ".join(answer), metrics, audio_parts)
+        await self.send_json({"type": "done", **metrics})
+
+    def _record_turn(self, user_input: str, answer: str, metrics: dict, audio_parts: list):
+        """Append the turn to this session's log, and optionally its audio"""
+        with open(os.path.join(self.output_dir, "turns.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"turn": self.turns, "user": user_input, "answer": answer, **metrics}, ensure_ascii=False) + "\n")
+
+        if SAVE_SESSION_AUDIO and audio_parts:
+            with wave.open(os.path.join(self.output_dir, f"turn_{self.turns:03d}.wav"), "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(audio_parts[0].sample_rate)
+                for audio in audio_parts:
+                    f.writeframes(audio.pcm)
+
+async def serve(host: str = HOST, port: int = PORT):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="voice"))
+    services = SharedServices()
+    await loop.run_in_executor(None, services.tts.pre_synthesize, COMMON_PHRASES)
+    await loop.run_in_executor(None, warm_up, services.client, SYSTEM_PROMPT, tools)
+
+    async def handle(websocket):
+        if services.sessions >= MAX_SESSIONS:
+            await websocket.close(code=1013, reason="Too many sessions")
+            return
+        services.sessions += 1
+        session = VoiceSession(websocket, services, loop)
+        print(f"Session {session.id} connected ({services.sessions} active)")
+        try:
+            await session.run()
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            services.sessions -= 1
+            print(f"Session {session.id} closed after {session.turns} turns")
+
+    async with websockets.serve(handle, host, port, max_size=2 ** 22):
+        print(f"Voice server listening on ws://{host}:{port}")
+        await asyncio.Future()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the voice assistant to many clients over WebSockets")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ import {
     CornerRightDown,
     Image,
 } from "lucide-react";
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { Textarea } from "./textarea";
 import { cn } from "../../lib/utils";
 import { useAutoResizeTextarea } from "../hooks/use-auto-resize-textarea";
@@ -37,10 +37,6 @@ interface AIInputWithSuggestionsProps {
     className?: string;
 }
 
-interface GenerateResponse {
-    image: string;
-}
-
 const DEFAULT_ACTIONS: ActionItem[] = [
     {
         text: "Summary",
@@ -95,15 +91,33 @@ export function AIInputWithSuggestions({
     const [generatedImage, setGeneratedImage] = useState<string | null>(null);
     const [isGenerating, setIsGenerating] = useState(false);
     const [error, setError] = useState<string | null>(null);
+    const [progressText, setProgressText] = useState("Creating your image...");
+    const [isPreview, setIsPreview] = useState(false);
+    const streamRef = useRef<EventSource | null>(null);
 
     const { textareaRef, adjustHeight } = useAutoResizeTextarea({
         minHeight,
         maxHeight,
     });
 
+    // Closing the stream tells the server to drop the request and free the pipeline
+    const closeStream = () => {
+        streamRef.current?.close();
+        streamRef.current = null;
+    };
+
+    useEffect(() => closeStream, []);
+
+    const clearGeneratedImage = () => {
+        setGeneratedImage(null);
+        setIsPreview(false);
+    };
+
     const toggleItem = (itemText: string) => {
         setSelectedItem((prev) => (prev === itemText ? null : itemText));
-        setGeneratedImage(null);
+        closeStream();
+        setIsGenerating(false);
+        clearGeneratedImage();
         setError(null);
     };
 
@@ -111,43 +125,58 @@ export function AIInputWithSuggestions({
         ? actions.find((item) => item.text === selectedItem)
         : null;
 
-    const handleImageGeneration = async (text: string) => {
+    const handleImageGeneration = (text: string) => {
+        closeStream();
         setIsGenerating(true);
         setError(null);
-        setGeneratedImage(null);
-        try {
-            console.log('Sending request with prompt:', text);
-            const response = await fetch('http://localhost:8000/generate', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ prompt: text }),
-            });
-            
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.detail || 'Failed to generate image');
-            }
+        setProgressText("Creating your image...");
+        clearGeneratedImage();
 
-            const data: GenerateResponse = await response.json();
-            setGeneratedImage(data.image);
-        } catch (error) {
-            console.error('Error generating image:', error);
-            let errorMessage = 'Failed to generate image. Please try again.';
-            if (error instanceof Error) {
-                errorMessage += ` (${error.message})`;
-            }
-            setError(errorMessage);
-        } finally {
+        console.log('Opening stream with prompt:', text);
+        const params = new URLSearchParams({ prompt: text });
+        const stream = new EventSource(`http://localhost:8000/generate/stream?${params}`);
+        streamRef.current = stream;
+
+        const finish = (errorMessage?: string) => {
+            if (streamRef.current !== stream) return;
+            closeStream();
             setIsGenerating(false);
-        }
+            if (errorMessage) {
+                console.error('Error generating image:', errorMessage);
+                setError(`Failed to generate image. Please try again. (${errorMessage})`);
+            }
+        };
+
+        stream.addEventListener('queued', (event) => {
+            const { position } = JSON.parse((event as MessageEvent).data);
+            setProgressText(position > 0 ? `Waiting in queue (${position} ahead)...` : "Starting shortly...");
+        });
+        stream.addEventListener('started', () => {
+            setProgressText("Creating your image...");
+        });
+        stream.addEventListener('preview', (event) => {
+            // Low resolution approximation of the image while it is still being generated
+            const { images } = JSON.parse((event as MessageEvent).data);
+            setGeneratedImage(`data:image/png;base64,${images[0]}`);
+            setIsPreview(true);
+        });
+        stream.addEventListener('image', (event) => {
+            const { image, media_type } = JSON.parse((event as MessageEvent).data);
+            setGeneratedImage(`data:${media_type};base64,${image}`);
+            setIsPreview(false);
+            finish();
+        });
+        stream.addEventListener('error', (event) => {
+            // Server sent errors carry a detail, connection errors (e.g. a full queue) don't
+            const data = (event as MessageEvent).data;
+            finish(data ? JSON.parse(data).detail : 'Connection to the image server failed');
+        });
     };
 
     const handleSubmit = async () => {
         if (inputValue.trim()) {
             if (selectedItem === "Generate Image") {
-                await handleImageGeneration(inputValue);
+                handleImageGeneration(inputValue);
             } else {
                 onSubmit?.(inputValue, selectedItem ?? undefined);
                 setInputValue("");
@@ -185,7 +214,7 @@ export function AIInputWithSuggestions({
                             scaleDistance={1.1}
                             rotateYDistance={20}
                         >
-                            Creating your image...
+                            {progressText}
                         </TextShimmerWave>
                     </div>
                 )}
@@ -206,9 +235,12 @@ export function AIInputWithSuggestions({
                 {generatedImage && (
                     <div className="relative z-50">
                         <img
-                            src={`data:image/png;base64,${generatedImage}`}
-                            alt="Generated image"
-                            className="w-full rounded-lg shadow-lg"
+                            src={generatedImage}
+                            alt={isPreview ? "Image preview" : "Generated image"}
+                            className={cn(
+                                "w-full rounded-lg shadow-lg",
+                                isPreview && "blur-sm [image-rendering:pixelated]"
+                            )}
                         />
                     </div>
                 )}